@@ -0,0 +1,61 @@
+"""
+Benchmark of Stream.chunk() throughput and memory against the previous list accumulator.
+
+Run from the repository root: python -m benchmarks.bench_chunk [n_items] [chunk_size]
+"""
+
+import sys
+import time
+import tracemalloc
+
+from stream import Chunk, Stream
+
+
+def list_chunker(items, n: int):
+    """
+    The previous accumulator which appended to a list and unpacked it into a Chunk.
+    :param items: The items to chunk.
+    :param int n: Accumulate this many items before returning.
+    :return: An iterator of chunks.
+    """
+    acc = []
+    cnt = 0
+
+    for item in items:
+        acc.append(item)
+        cnt += 1
+        if cnt >= n:
+            yield Chunk(*acc)
+            cnt = 0
+            acc = []
+    yield Chunk(*acc)
+
+
+def measure(name: str, factory, n_items: int):
+    """
+    Exhaust the chunks of a factory, printing items per second and peak traced memory of a shorter run.
+    :param str name: The label of the measurement.
+    :param factory: A callable creating an iterator of chunks from a number of items.
+    :param int n_items: The number of items to chunk.
+    :return: None.
+    """
+    start = time.perf_counter()
+    for _ in factory(n_items):
+        pass
+    rate = n_items / (time.perf_counter() - start)
+
+    tracemalloc.start()
+    for _ in factory(min(n_items, 1_000_000)):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<10} {rate:>14,.0f} items/sec {peak / 2**20:>8.2f} MiB peak")
+
+
+if __name__ == "__main__":
+    N_ITEMS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000_000
+    CHUNK_SIZE = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+
+    measure("list", lambda n: list_chunker(range(n), CHUNK_SIZE), N_ITEMS)
+    measure("islice", lambda n: Stream(range(n)).chunk(CHUNK_SIZE), N_ITEMS)
+    measure("array", lambda n: Stream(range(n)).chunk(CHUNK_SIZE, dtype="q"), N_ITEMS)
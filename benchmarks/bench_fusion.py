@@ -0,0 +1,74 @@
+"""
+Benchmark of fused Stream pipelines against the previous nested-generator implementation.
+
+Run from the repository root: python -m benchmarks.bench_fusion [n_items] [n_stages]
+"""
+
+import sys
+import time
+
+from stream import Stream
+
+
+class NestedStream:
+    """
+    The previous Stream execution model where every operation wraps the stream in another generator.
+    """
+
+    def __init__(self, items):
+        self.__items = (i for i in items)
+
+    def __iter__(self):
+        for item in self.__items:
+            yield item
+
+    def through(self, action):
+        return NestedStream(action(item) for item in self)
+
+    def filter(self, condition):
+        return NestedStream(item for item in self if condition(item))
+
+    def to_list(self):
+        return list(self.__items)
+
+
+def build(stream, n_stages: int):
+    """
+    Chain alternating map and filter stages onto a stream.
+    :param stream: The stream to build on.
+    :param int n_stages: The number of stages to chain.
+    :return: The built stream.
+    """
+    for i in range(n_stages):
+        if i % 5 == 4:
+            stream = stream.filter(lambda x: x >= 0)
+        else:
+            stream = stream.through(lambda x: x + 1)
+    return stream
+
+
+def measure(name: str, factory, n_items: int, n_stages: int):
+    """
+    Time a terminal to_list() over a built pipeline and print items per second.
+    :param str name: The label of the measurement.
+    :param factory: A callable creating a stream from an iterable.
+    :param int n_items: The number of items to stream.
+    :param int n_stages: The number of stages in the pipeline.
+    :return: The measured items per second.
+    """
+    stream = build(factory(range(n_items)), n_stages)
+    start = time.perf_counter()
+    stream.to_list()
+    elapsed = time.perf_counter() - start
+    rate = n_items / elapsed
+    print(f"{name:<10} {n_stages:>3} stages {rate:>14,.0f} items/sec")
+    return rate
+
+
+if __name__ == "__main__":
+    N_ITEMS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    N_STAGES = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    nested = measure("nested", NestedStream, N_ITEMS, N_STAGES)
+    fusion = measure("fused", Stream, N_ITEMS, N_STAGES)
+    print(f"speedup    {fusion / nested:.2f}x")
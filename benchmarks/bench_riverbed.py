@@ -0,0 +1,65 @@
+"""
+Benchmark of Riverbed throughput with and without a scheduler round trip per item.
+
+Run from the repository root: python -m benchmarks.bench_riverbed [n_items] [yield_every]
+"""
+
+import asyncio
+import sys
+import time
+
+from stream import Riverbed
+
+
+async def hop_every_item(items):
+    """
+    The previous source conversion that slept on the event loop before every item.
+    :param items: An iterable to convert.
+    :return: An async generator of the items.
+    """
+    for item in items:
+        await asyncio.sleep(0.0)
+        yield item
+
+
+async def consume(riverbed: Riverbed) -> int:
+    """
+    Exhaust a Riverbed through a single through() stage.
+    :param Riverbed riverbed: The Riverbed to exhaust.
+    :return: The number of items consumed.
+    """
+    count = 0
+    async for _ in riverbed.through(lambda x: x + 1):
+        count += 1
+    return count
+
+
+def measure(name: str, riverbed: Riverbed, n_items: int) -> float:
+    """
+    Time the consumption of a Riverbed and print items per second.
+    :param str name: The label of the measurement.
+    :param Riverbed riverbed: The Riverbed to consume.
+    :param int n_items: The number of items in the Riverbed.
+    :return: The measured items per second.
+    """
+    start = time.perf_counter()
+    asyncio.run(consume(riverbed))
+    rate = n_items / (time.perf_counter() - start)
+    print(f"{name:<16} {rate:>14,.0f} items/sec")
+    return rate
+
+
+if __name__ == "__main__":
+    N_ITEMS = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    YIELD_EVERY = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+
+    before = measure(
+        "hop every item", Riverbed(hop_every_item(range(N_ITEMS))), N_ITEMS
+    )
+    after = measure("fast path", Riverbed(range(N_ITEMS)), N_ITEMS)
+    every = measure(
+        f"yield every {YIELD_EVERY}",
+        Riverbed(range(N_ITEMS), yield_every=YIELD_EVERY),
+        N_ITEMS,
+    )
+    print(f"speedup          {after / before:.2f}x / {every / before:.2f}x")
@@ -1,4 +1,10 @@
-from typing import Callable, Tuple
+from array import array
+from typing import Callable, Iterable, Sequence, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 class Chunk(Tuple):
@@ -12,13 +18,145 @@ class Chunk(Tuple):
     def __init__(self, *args):
         super().__init__()
 
+    def __getnewargs__(self):
+        return tuple(self)
+
+    @classmethod
+    def from_iterable(cls, items: Iterable):
+        """
+        Create a Chunk by consuming an iterable directly into the tuple without unpacking it as arguments.
+        :param items: The items to hold.
+        :return: A Chunk.
+        """
+        return tuple.__new__(cls, items)
+
     def flat_map(self, action: Callable):
         return action(self)
 
-    def map(self, action: Callable):
+    def map(self, action: Callable, vectorized: bool = False):
         """
         Map an action onto the underlying data.
         :param action: A callable to evaluate on each item.
+        :param bool vectorized: Evaluate the action once on the whole Chunk rather than on each item.
         :return: A Chunk with the data evaluated by the action.
         """
-        return Chunk(*map(action, self))
+        if vectorized:
+            return Chunk.from_iterable(action(self))
+        return Chunk.from_iterable(map(action, self))
+
+
+class NumericChunk(Sequence):
+    """
+    A batched set of numbers held in a contiguous buffer. The buffer is an array.array, or a numpy.ndarray when
+    numpy is installed and requested.
+    """
+
+    def __init__(self, data: Iterable = (), dtype: str = "d"):
+        if isinstance(data, array) or (
+            numpy is not None and isinstance(data, numpy.ndarray)
+        ):
+            self.__data = data
+        else:
+            self.__data = array(dtype, data)
+
+    @classmethod
+    def from_iterable(cls, items: Iterable, dtype: str = "d", use_numpy: bool = False):
+        """
+        Create a NumericChunk by consuming an iterable of numbers.
+        :param items: The numbers to hold.
+        :param str dtype: An array typecode or numpy dtype for the buffer.
+        :param bool use_numpy: Back the chunk with a numpy.ndarray rather than an array.array.
+        :return: A NumericChunk.
+        """
+        # Gathering a list first gives the length up front so the buffer is allocated once at its final size
+        values = items if isinstance(items, list) else list(items)
+        if use_numpy:
+            if numpy is None:
+                raise ImportError(
+                    "numpy is required for a NumericChunk with use_numpy."
+                )
+            return cls(numpy.fromiter(values, dtype, len(values)))
+        return cls(array(dtype, values))
+
+    @property
+    def data(self):
+        """
+        The underlying buffer.
+        :return: An array.array or numpy.ndarray.
+        """
+        return self.__data
+
+    @property
+    def dtype(self):
+        """
+        The type of the numbers held.
+        :return: An array typecode or numpy dtype.
+        """
+        if isinstance(self.__data, array):
+            return self.__data.typecode
+        return self.__data.dtype
+
+    def __len__(self):
+        return len(self.__data)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return NumericChunk(self.__data[index])
+        return self.__data[index]
+
+    def __iter__(self):
+        return iter(self.__data)
+
+    def __eq__(self, other):
+        if isinstance(other, NumericChunk):
+            other = other.data
+        if not isinstance(other, Iterable):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return f"NumericChunk({list(self.__data)!r}, dtype={self.dtype!r})"
+
+    def flat_map(self, action: Callable):
+        return action(self)
+
+    def map(self, action: Callable, vectorized: bool = False):
+        """
+        Map an action onto the underlying buffer.
+        :param action: A callable to evaluate on each item.
+        :param bool vectorized: Evaluate the action once on the whole buffer, such as a numpy ufunc, rather than on
+        each item.
+        :return: A NumericChunk with the data evaluated by the action.
+        """
+        if vectorized:
+            return self.__from_results(action(self.__data))
+        return self.__from_results(map(action, self.__data))
+
+    def __from_results(self, results: Iterable):
+        """
+        Hold the results of an action in a buffer of the type they need. Integers stay in the current buffer,
+        floats widen an integer array to doubles and anything that is not numeric falls back to a Chunk.
+        :param results: The results of the action, a buffer or an iterable of them.
+        :return: A NumericChunk, or a Chunk if the results are not numeric.
+        """
+        if isinstance(results, array):
+            return NumericChunk(results)
+        if numpy is not None and isinstance(self.__data, numpy.ndarray):
+            values = numpy.asarray(
+                results if isinstance(results, numpy.ndarray) else list(results)
+            )
+            if values.ndim == 1 and values.dtype.kind in "biufc":
+                return NumericChunk(values)
+            return Chunk.from_iterable(values.tolist())
+
+        results = list(results)
+        for typecode in (self.__data.typecode, "d"):
+            try:
+                return NumericChunk(array(typecode, results))
+            except (TypeError, OverflowError):
+                continue
+        return Chunk.from_iterable(results)
+
+
+# Every type that through_map_on_chunk() maps onto.
+CHUNKS = (Chunk, NumericChunk)
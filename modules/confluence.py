@@ -2,15 +2,36 @@ import asyncio
 from typing import AsyncIterable, AsyncIterator, Iterable, Union
 
 from modules.utilities.asyncTools import to_async_generator
+from modules.utilities.queueTools import BLOCK, CLOSED, BoundedQueue
 
 
 class Confluence(AsyncIterator):
     """
     A queue that can combine many Streams and Riverbeds.
+
+    By default the queue is unbounded. Given a maxsize, fast feeds are held back by the overflow strategy: "block"
+    pauses feeds at the high watermark until the queue drains to the low watermark, "drop-oldest" and "drop-newest"
+    discard items and "spill" writes the excess to a temporary file in spill_dir.
+
+    Given a batch_size, feeds push lists of up to batch_size items into the queue at once and a partial list is
+    pushed once max_latency seconds pass. The consumer drains every available item in a single wakeup.
     """
 
-    def __init__(self):
-        self.__queue = asyncio.Queue()
+    def __init__(
+        self,
+        maxsize: int = 0,
+        high_watermark: int = None,
+        low_watermark: int = None,
+        overflow: str = BLOCK,
+        spill_dir: str = None,
+        batch_size: int = None,
+        max_latency: float = None,
+    ):
+        self.__queue = BoundedQueue(
+            maxsize, high_watermark, low_watermark, overflow, spill_dir
+        )
+        self.__batch_size = batch_size
+        self.__max_latency = max_latency
         self.__active_sources = 0
         self.__gen = None
         self.__gen_ready = asyncio.Event()
@@ -35,16 +56,69 @@ class Confluence(AsyncIterator):
         :param items: The source to enqueue.
         :return: None.
         """
+        # Hand control back after every item, or batch, so synchronous feeds interleave
         if not isinstance(items, AsyncIterable):
-            items = to_async_generator(items)
+            items = to_async_generator(items, yield_every=self.__batch_size or 1)
 
         try:
-            async for item in items:
-                await self.__queue.put(item)
+            if self.__batch_size:
+                await self.__enqueue_batches(items)
+            else:
+                async for item in items:
+                    await self.__queue.put(item)
         finally:
             self.__active_sources -= 1
             if self.__active_sources == 0:
-                await self.__queue.put(None)
+                self.__queue.close()
+
+    async def __enqueue_batches(self, items: AsyncIterable):
+        """
+        Enqueue lists of items to the underlying queue, flushing partial lists after max_latency seconds. Flushes of a
+        feed take turns on a lock, so they reach the queue in order and none is cut short when the feed ends.
+        :param items: The source to enqueue.
+        :return: None.
+        """
+        batch = []
+        lock = asyncio.Lock()
+        flusher = None
+        if self.__max_latency is not None:
+            flusher = asyncio.create_task(self.__flush_every(batch, lock))
+
+        try:
+            async for item in items:
+                batch.append(item)
+                if len(batch) >= self.__batch_size:
+                    await self.__flush(batch, lock)
+            await self.__flush(batch, lock)
+        finally:
+            if flusher is not None:
+                # Wait out a flush in progress rather than losing its items
+                async with lock:
+                    flusher.cancel()
+
+    async def __flush(self, batch: list, lock: asyncio.Lock):
+        """
+        Push the items of a batch to the queue and empty it.
+        :param list batch: The batch to flush.
+        :param asyncio.Lock lock: The lock held while flushing the batch.
+        :return: None.
+        """
+        async with lock:
+            if batch:
+                items = batch.copy()
+                batch.clear()
+                await self.__queue.put_many(items)
+
+    async def __flush_every(self, batch: list, lock: asyncio.Lock):
+        """
+        Flush a batch every max_latency seconds so items of slow feeds are not held back.
+        :param list batch: The batch to flush.
+        :param asyncio.Lock lock: The lock held while flushing the batch.
+        :return: None.
+        """
+        while True:
+            await asyncio.sleep(self.__max_latency)
+            await self.__flush(batch, lock)
 
     async def __consume(self):
         """
@@ -53,23 +127,22 @@ class Confluence(AsyncIterator):
         """
         await self.__gen_ready.wait()
 
-        try:
-            while True:
-                item = await self.__queue.get()
-                if item is None:
-                    break
+        while True:
+            items = await self.__queue.get_many(self.__batch_size)
+            if items is CLOSED:
+                break
+            for item in items:
                 yield item
-        finally:
-            pass
 
-    def feed(self, items: Union[Iterable, AsyncIterable]):
+    def feed(self, items: Union[Iterable, AsyncIterable]) -> asyncio.Task:
         """
         Add a source to be fed into the queue for evaluation asynchronously.
         :param items: The items to be fed to the queue.
-        :return: None.
+        :return: The task feeding the source, which holds any exception raised by the source.
         """
-        asyncio.create_task(self.__enqueue(items))
+        task = asyncio.create_task(self.__enqueue(items))
         self.__active_sources += 1
+        return task
 
     def start(self):
         """
@@ -78,3 +151,11 @@ class Confluence(AsyncIterator):
         """
         self.__gen = self.__consume()
         self.__gen_ready.set()
+
+    @property
+    def metrics(self) -> dict:
+        """
+        Snapshot the queue depth, drops, spills and time feeds spent waiting on backpressure.
+        :return: A dict of metrics.
+        """
+        return {**self.__queue.metrics(), "active_sources": self.__active_sources}
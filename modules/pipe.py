@@ -1,8 +1,30 @@
-from copy import copy
+from typing import NamedTuple
 
 from modules.properties.callableStream import CallableStream
 from modules.riverbed import Riverbed
 from modules.stream import Stream
+from modules.utilities.cacheTools import AsyncCachedAction, CachedAction
+from modules.utilities.metricsTools import PipelineMetrics, timed_action
+
+
+class Stage(NamedTuple):
+    """
+    A single operation recorded by a Pipe.
+    """
+
+    operation: str
+    args: tuple
+    kwargs: tuple
+
+
+def given(**kwargs) -> dict:
+    """
+    Select the keyword arguments that were set, so arguments only accepted by one of Stream or Riverbed are left out
+    of a stage unless given.
+    :param kwargs: The optional keyword arguments of an operation.
+    :return: A dict of the keyword arguments that are not None.
+    """
+    return {name: value for name, value in kwargs.items() if value is not None}
 
 
 class Pipe(CallableStream):
@@ -10,13 +32,93 @@ class Pipe(CallableStream):
     A pipeline of actions to be applied to a Stream or Riverbed.
     """
 
-    def __init__(self):
-        self.__xs = lambda x: lambda y: y(*x)
+    def __init__(self, stages: tuple = (), metrics: PipelineMetrics = None):
+        self.__stages = tuple(stages)
+        self.__metrics = metrics
+        self.__plans = {}
 
     def __call__(self, *args, asynchronous: bool = False):
-        if asynchronous:
-            return self.__xs(args)(Riverbed)
-        return self.__xs(args)(Stream)
+        target = Riverbed if asynchronous else Stream
+        xs = target(*args)
+        if self.__metrics is not None:
+            return self.__call_metered(xs, target)
+        for operation, operation_args, operation_kwargs in self.__compile(target):
+            xs = operation(xs, *operation_args, **operation_kwargs)
+        return xs
+
+    def __call_metered(self, xs, target: type):
+        """
+        Evaluate the stages of the Pipe on a Stream or Riverbed, recording each stage into the metrics of the Pipe.
+        :param xs: The Stream or Riverbed fed through the Pipe.
+        :param type target: The Stream or Riverbed type the Pipe is called on.
+        :return: A Stream or Riverbed of the output of the Pipe.
+        """
+        metrics = self.__metrics
+        xs = xs.metered(metrics, "source")
+        plan = zip(self.__stages, self.__compile(target))
+        for i, (stage, (operation, args, kwargs)) in enumerate(plan):
+            name = f"{i}:{stage.operation}"
+            if stage.operation == "dam":
+                args = (timed_action(args[0], metrics.stage(name)),) + args[1:]
+            xs = operation(xs, *args, **kwargs)
+            xs = xs.metered(metrics, name)
+        return xs
+
+    def __repr__(self):
+        return f"Pipe({', '.join(stage.operation for stage in self.__stages)})"
+
+    @property
+    def stages(self) -> tuple:
+        """
+        The operations of the Pipe in order of evaluation.
+        :return: A tuple of Stages.
+        """
+        return self.__stages
+
+    def __compile(self, target: type) -> tuple:
+        """
+        Resolve the stages of the Pipe into the operations of the target type. Plans are cached per target.
+        :param type target: The Stream or Riverbed type the Pipe is called on.
+        :return: A tuple of (operation, args, kwargs).
+        """
+        plan = self.__plans.get(target)
+        if plan is None:
+            plan = tuple(
+                (getattr(target, stage.operation), stage.args, dict(stage.kwargs))
+                for stage in self.__stages
+            )
+            self.__plans[target] = plan
+        return plan
+
+    def __append(self, operation: str, *args, **kwargs):
+        """
+        Create a new Pipe with an operation appended.
+        :param str operation: The name of the operation to append.
+        :return: A Pipe with the new stage.
+        """
+        return Pipe(
+            self.__stages + (Stage(operation, args, tuple(kwargs.items())),),
+            self.__metrics,
+        )
+
+    def instrument(self, metrics: PipelineMetrics):
+        """
+        Record every stage of the Pipe into metrics each time it is called. Stages are named by their position and
+        operation, as "0:through", after a "source" stage for the items fed in. Uninstrumented Pipes are not measured
+        at all.
+        :param PipelineMetrics metrics: The metrics to record into, or None to stop measuring.
+        :return: A Pipe measured by metrics.
+        """
+        return Pipe(self.__stages, metrics)
+
+    def flat_map(self, action):
+        """
+        Add an action on the whole iterator of the Stream or Riverbed to the pipeline. The action must return a
+        Stream or Riverbed matching the one fed through the Pipe.
+        :param action: A callable taking the iterator, or async iterator, of the items.
+        :return: A Pipe with the new action.
+        """
+        return self.__append("flat_map", action)
 
     def through(self, action):
         """
@@ -24,19 +126,69 @@ class Pipe(CallableStream):
         :param action: An executable action to append to the pipe.
         :return: A Pipe with new action.
         """
-        dup = copy(self)
-        dup.__xs = lambda x: lambda y: self.__xs(x)(y).through(action)
-        return dup
+        return self.__append("through", action)
+
+    def par_through(
+        self, action, workers: int = None, ordered: bool = True, chunksize: int = 256
+    ):
+        """
+        Append an action to the pipe that is evaluated on a pool of worker processes. Will error if Riverbed is fed
+        through the Pipe.
+        :param action: A picklable executable action to append to the pipe.
+        :param int workers: The number of worker processes. Defaults to the number of CPUs.
+        :param bool ordered: Keep the order of the Stream if True, else yield items as they complete.
+        :param int chunksize: The number of items sent to a worker at once.
+        :return: A Pipe with new action.
+        """
+        return self.__append(
+            "par_through", action, workers=workers, ordered=ordered, chunksize=chunksize
+        )
+
+    def through_threaded(
+        self,
+        action,
+        max_workers: int = 8,
+        ordered: bool = True,
+        prefetch: int = None,
+    ):
+        """
+        Append a blocking action to the pipe that is evaluated on a shared thread pool.
+        :param action: An executable action to append to the pipe.
+        :param int max_workers: The number of threads evaluating the action.
+        :param bool ordered: Keep the order of the source if True, else yield items as they complete.
+        :param int prefetch: The maximum number of items in flight. Defaults to twice max_workers.
+        :return: A Pipe with new action.
+        """
+        return self.__append(
+            "through_threaded",
+            action,
+            max_workers=max_workers,
+            ordered=ordered,
+            prefetch=prefetch,
+        )
 
-    def through_map_on_chunk(self, action):
+    def through_cached(self, action, key=None, maxsize: int = None, ttl: float = None):
+        """
+        Add a memoized action to the pipeline. The cache is built once, so every Stream fed through the Pipe shares it,
+        and is the action of the new stage, so its counters can be read with stages[-1].args[0].metrics().
+        :param action: A callable to evaluate on each item, or a CachedAction.
+        :param key: A function computing the cache key of an item. Defaults to the item.
+        :param int maxsize: The maximum number of results cached. Defaults to unbounded.
+        :param float ttl: The number of seconds a result is cached. Defaults to forever.
+        :return: A Pipe with a memoized action.
+        """
+        if not isinstance(action, CachedAction):
+            action = CachedAction(action, key, maxsize, ttl)
+        return self.__append("through_cached", action)
+
+    def through_map_on_chunk(self, action, vectorized: bool = False):
         """
         Append an action to the process. If items in stream are Chunks then map action to them.
         :param action: An executable action to append to the pipe.
+        :param bool vectorized: Evaluate the action once on the whole buffer of each Chunk.
         :return: A Pipe with new action mapped to on Chunks.
         """
-        dup = copy(self)
-        dup.__xs = lambda x: lambda y: self.__xs(x)(y).through_map_on_chunk(action)
-        return dup
+        return self.__append("through_map_on_chunk", action, vectorized=vectorized)
 
     def filter(self, condition):
         """
@@ -44,19 +196,214 @@ class Pipe(CallableStream):
         :param condition: A function that will determine True to pass and False to discard.
         :return: A filtered Pipe.
         """
-        dup = copy(self)
-        dup.__xs = lambda x: lambda y: self.__xs(x)(y).filter(condition)
-        return dup
+        return self.__append("filter", condition)
+
+    def distinct(
+        self,
+        key=None,
+        mode: str = "exact",
+        capacity: int = None,
+        ttl: float = None,
+        error_rate: float = 0.01,
+    ):
+        """
+        Add a filter of items whose key has been seen before to the pipeline.
+        :param key: A function computing the key of an item. Defaults to the item.
+        :param str mode: "exact" to remember keys in an LRU set or "bloom" to remember them in a Bloom filter.
+        :param int capacity: The number of keys remembered. Defaults to 1,000,000.
+        :param float ttl: The number of seconds a key is remembered. Only accepted by exact.
+        :param float error_rate: The rate that new items are falsely discarded. Only used by bloom.
+        :return: A Pipe with a distinct filter.
+        """
+        return self.__append(
+            "distinct",
+            key=key,
+            mode=mode,
+            capacity=capacity,
+            ttl=ttl,
+            error_rate=error_rate,
+        )
 
-    def chunk(self, n: int):
+    def chunk(
+        self,
+        n: int,
+        dtype: str = None,
+        use_numpy: bool = False,
+        max_wait: float = None,
+    ):
         """
         Add an accumulator to the pipeline.
         :param int n: Accumulate this many items before passing.
+        :param str dtype: An array typecode or numpy dtype. Defaults to accumulating into Chunks.
+        :param bool use_numpy: Back NumericChunks with numpy.ndarray rather than array.array.
+        :param float max_wait: The most seconds an item waits in the accumulator. Will error if Stream is fed through
+        the Pipe.
         :return: A Pipe with a new accumulator.
         """
-        dup = copy(self)
-        dup.__xs = lambda x: lambda y: self.__xs(x)(y).chunk(n)
-        return dup
+        return self.__append(
+            "chunk", n, dtype=dtype, use_numpy=use_numpy, **given(max_wait=max_wait)
+        )
+
+    def window(self, size: int, step: int = None, aggregate=None):
+        """
+        Add a window of the last size items to the pipeline, passed every step items. Will error if Riverbed is fed
+        through the Pipe.
+        :param int size: The number of items in a window.
+        :param int step: The number of items between windows. Defaults to size.
+        :param aggregate: One of "sum", "count", "mean", "min" or "max", or an associative function of two items.
+        Defaults to passing the contents of each window as a Chunk.
+        :return: A Pipe of windows.
+        """
+        return self.__append("window", size, step, aggregate)
+
+    def window_time(self, duration: float, slide: float = None, aggregate=None):
+        """
+        Add a window of the items that arrived in the last duration seconds to the pipeline, passed every slide
+        seconds. Will error if Stream is fed through the Pipe.
+        :param float duration: The number of seconds in a window.
+        :param float slide: The number of seconds between windows. Defaults to duration.
+        :param aggregate: One of "sum", "count", "mean", "min" or "max", or an associative function of two items.
+        Defaults to passing the contents of each window as a Chunk.
+        :return: A Pipe of windows.
+        """
+        return self.__append("window_time", duration, slide, aggregate)
+
+    def reduce_by_key(
+        self,
+        key,
+        combine,
+        flush_every: int = None,
+        max_keys: int = None,
+        flush_interval: float = None,
+    ):
+        """
+        Add a reduction of the items sharing a key to the pipeline, passed as (key, value) pairs. The flush_interval
+        is only accepted by Riverbed.
+        :param key: A function computing the key of an item.
+        :param combine: A function of the current value of a key and an item returning the new value.
+        :param int flush_every: The number of items between passing every reduction. Defaults to never.
+        :param int max_keys: The maximum number of keys held at once. Defaults to unbounded.
+        :param float flush_interval: The number of seconds between passing every reduction. Defaults to never.
+        :return: A Pipe of (key, value) pairs.
+        """
+        return self.__append(
+            "reduce_by_key",
+            key,
+            combine,
+            flush_every=flush_every,
+            max_keys=max_keys,
+            **given(flush_interval=flush_interval),
+        )
+
+    def group_by(
+        self,
+        key,
+        flush_every: int = None,
+        max_keys: int = None,
+        flush_interval: float = None,
+    ):
+        """
+        Add a grouping of the items sharing a key to the pipeline, passed as (key, Chunk) pairs. The flush_interval
+        is only accepted by Riverbed.
+        :param key: A function computing the key of an item.
+        :param int flush_every: The number of items between passing every group. Defaults to never.
+        :param int max_keys: The maximum number of keys held at once. Defaults to unbounded.
+        :param float flush_interval: The number of seconds between passing every group. Defaults to never.
+        :return: A Pipe of (key, Chunk) pairs.
+        """
+        return self.__append(
+            "group_by",
+            key,
+            flush_every=flush_every,
+            max_keys=max_keys,
+            **given(flush_interval=flush_interval),
+        )
+
+    def sorted(
+        self,
+        key=None,
+        reverse: bool = False,
+        memory_limit: int = None,
+        spill_dir: str = None,
+    ):
+        """
+        Add a sort to the pipeline, spilling sorted runs to disk past memory_limit bytes. Will error if Riverbed is fed
+        through the Pipe.
+        :param key: A function computing the sort key of an item. Defaults to the item.
+        :param bool reverse: Sort in descending order.
+        :param int memory_limit: The approximate number of bytes of items held in memory. Defaults to unbounded.
+        :param str spill_dir: The directory to write runs in. Defaults to the system temporary directory.
+        :return: A Pipe with a sort.
+        """
+        return self.__append(
+            "sorted",
+            key=key,
+            reverse=reverse,
+            memory_limit=memory_limit,
+            spill_dir=spill_dir,
+        )
+
+    def top_k(
+        self,
+        k: int,
+        key=None,
+        snapshot_every: int = None,
+        snapshot_interval: float = None,
+    ):
+        """
+        Add a selection of the k largest items to the pipeline. The snapshot arguments are only accepted by Riverbed.
+        :param int k: The number of items to keep.
+        :param key: A function computing the value to rank an item by. Defaults to the item.
+        :param int snapshot_every: The number of items between snapshots. Defaults to never.
+        :param float snapshot_interval: The number of seconds between snapshots. Defaults to never.
+        :return: A Pipe with a top k selection.
+        """
+        kwargs = given(
+            snapshot_every=snapshot_every, snapshot_interval=snapshot_interval
+        )
+        return self.__append("top_k", k, key, **kwargs)
+
+    def sample(
+        self,
+        n: int,
+        seed=None,
+        snapshot_every: int = None,
+        snapshot_interval: float = None,
+    ):
+        """
+        Add a uniform random sample of n items to the pipeline. The snapshot arguments are only accepted by
+        Riverbed.
+        :param int n: The number of items to sample.
+        :param seed: A seed for the random number generator.
+        :param int snapshot_every: The number of items between snapshots. Defaults to never.
+        :param float snapshot_interval: The number of seconds between snapshots. Defaults to never.
+        :return: A Pipe with a sample.
+        """
+        kwargs = given(
+            snapshot_every=snapshot_every, snapshot_interval=snapshot_interval
+        )
+        return self.__append("sample", n, seed, **kwargs)
+
+    def approx_distinct(
+        self,
+        precision: int = 12,
+        key=None,
+        snapshot_every: int = None,
+        snapshot_interval: float = None,
+    ):
+        """
+        Add an estimate of the number of distinct items to the pipeline. The snapshot arguments are only accepted by
+        Riverbed.
+        :param int precision: The number of index bits, between 4 and 18.
+        :param key: A function computing the value to count an item by. Defaults to the item.
+        :param int snapshot_every: The number of items between snapshots. Defaults to never.
+        :param float snapshot_interval: The number of seconds between snapshots. Defaults to never.
+        :return: A Pipe with a distinct count estimate.
+        """
+        kwargs = given(
+            snapshot_every=snapshot_every, snapshot_interval=snapshot_interval
+        )
+        return self.__append("approx_distinct", precision, key, **kwargs)
 
     def fork(self, condition, action, *args):
         """
@@ -70,19 +417,55 @@ class Pipe(CallableStream):
         :param action: An executable action to append to the pipe if condition is True.
         :returns: A Stream with a new fork.
         """
-        dup = copy(self)
-        dup.__xs = lambda x: lambda y: self.__xs(x)(y).fork(condition, action, *args)
-        return dup
+        return self.__append("fork", condition, action, *args)
 
-    def dam(self, action):
+    def fork_by(self, key, branches: dict, default=None):
+        """
+        Will create a branch of the Stream that picks the action for each item with a single dictionary lookup of its
+        key, rather than testing a condition per branch as fork() does.
+        :param key: A function computing the key of an item.
+        :param dict branches: A mapping of keys to the action to execute for items with that key.
+        :param default: The action for keys not in branches. Defaults to passing the item unchanged.
+        :returns: A Stream with a new fork.
+        """
+        return self.__append("fork_by", key, branches, default)
+
+    def dam(self, action, concurrency: int = 1, ordered: bool = True):
         """
         Append an asynchronous action to the process. Will error if Steam is fed through the Pipe.
         :param action: An asynchronous executable action to append to the pipe.
+        :param int concurrency: The maximum number of awaitables in flight.
+        :param bool ordered: Keep the order of the Riverbed if True, else yield items as they complete.
         :return: A pipe with new action.
         """
-        dup = copy(self)
-        dup.__xs = lambda x: lambda y: self.__xs(x)(y).dam(action)
-        return dup
+        return self.__append("dam", action, concurrency=concurrency, ordered=ordered)
+
+    def dam_cached(
+        self,
+        action,
+        key=None,
+        maxsize: int = None,
+        ttl: float = None,
+        concurrency: int = 1,
+        ordered: bool = True,
+    ):
+        """
+        Add a memoized async action to the pipeline, sharing pending results between items with the same key. The
+        cache is built once, so every Riverbed fed through the Pipe shares it, and is the action of the new stage, so
+        its counters can be read with stages[-1].args[0].metrics(). Will error if Stream is fed through the Pipe.
+        :param action: An async callable to evaluate on each item, or an AsyncCachedAction.
+        :param key: A function computing the cache key of an item. Defaults to the item.
+        :param int maxsize: The maximum number of results cached. Defaults to unbounded.
+        :param float ttl: The number of seconds a result is cached. Defaults to forever.
+        :param int concurrency: The maximum number of awaitables in flight.
+        :param bool ordered: Pass results in the order of the items if True, else as they complete.
+        :return: A Pipe with a memoized async action.
+        """
+        if not isinstance(action, AsyncCachedAction):
+            action = AsyncCachedAction(action, key, maxsize, ttl)
+        return self.__append(
+            "dam_cached", action, concurrency=concurrency, ordered=ordered
+        )
 
     def meter(self, time: float):
         """
@@ -90,6 +473,4 @@ class Pipe(CallableStream):
         :param time: The amount of time to sleep in seconds.
         :return: A pipe with a delay.
         """
-        dup = copy(self)
-        dup.__xs = lambda x: lambda y: self.__xs(x)(y).meter(time)
-        return dup
+        return self.__append("meter", time)
@@ -10,7 +10,7 @@ class AsyncOperable(Operable):
     """
 
     @abstractmethod
-    def dam(self, action: Callable):
+    def dam(self, action: Callable, concurrency: int = 1, ordered: bool = True):
         """
         Apply an async callable to the data structure.
         """
@@ -7,7 +7,7 @@ class Chunkable:
     """
 
     @abstractmethod
-    def chunk(self, n: int):
+    def chunk(self, n: int, dtype: str = None, use_numpy: bool = False):
         """
         Chunk the data structure into chunks of n.
         """
@@ -10,7 +10,7 @@ class OperableChunkable(Operable, Chunkable):
     """
 
     @abstractmethod
-    def through_map_on_chunk(self, action):
+    def through_map_on_chunk(self, action, vectorized: bool = False):
         """
         Map a callable onto a chunk within the data structure.
         """
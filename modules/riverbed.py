@@ -1,27 +1,42 @@
+import asyncio
+from collections import deque
+from functools import partial
 from typing import (AsyncGenerator, AsyncIterable, AsyncIterator, Callable,
                     Generator, Iterable, Iterator)
 
+from modules.chunk import CHUNKS, Chunk, NumericChunk
 from modules.properties.asyncOperable import AsyncOperable
 from modules.properties.callableStream import CallableStream
-from modules.utilities.asyncTools import (afilter, amap, async_amap,
+from modules.properties.operableChunkable import OperableChunkable
+from modules.utilities.aggregateTools import KeyedReducer, aggregator, grouper
+from modules.utilities.asyncTools import (TIMEOUT, TimedIterator, achunk,
+                                          afilter, amap, async_amap,
                                           async_to_async_generator,
-                                          to_async_generator)
+                                          executor_amap, to_async_generator)
+from modules.utilities.cacheTools import (EXACT, AsyncCachedAction,
+                                          CachedAction, first_seen)
+from modules.utilities.fusionTools import (compile_step, fork_action,
+                                           fork_by_stage, fork_stage)
+from modules.utilities.metricsTools import (AsyncMeteredIterator,
+                                            PipelineMetrics)
+from modules.utilities.poolTools import shared_thread_pool
+from modules.utilities.summaryTools import HyperLogLog, Reservoir, TopK
 
 
-class Riverbed(AsyncOperable):
+class Riverbed(AsyncOperable, OperableChunkable):
     """
     An asynchronous Stream.
     """
 
-    def __init__(self, *args):
+    def __init__(self, *args, yield_every: int = None):
         if len(args) == 1 and isinstance(args[0], (Generator, Iterator, Iterable)):
-            self.__items = to_async_generator(args[0])
+            self.__items = to_async_generator(args[0], yield_every=yield_every)
         elif len(args) == 1 and isinstance(
             args[0], (AsyncGenerator, AsyncIterator, AsyncIterable)
         ):
-            self.__items = async_to_async_generator(args[0])
+            self.__items = async_to_async_generator(args[0], yield_every=yield_every)
         else:
-            self.__items = to_async_generator((i for i in args))
+            self.__items = to_async_generator(args, yield_every=yield_every)
 
     async def __anext__(self):
         try:
@@ -45,6 +60,53 @@ class Riverbed(AsyncOperable):
             return self.flat_map(lambda x: action(x, asynchronous=True))
         return Riverbed(amap(action, self))
 
+    def through_cached(
+        self,
+        action: Callable,
+        key: Callable = None,
+        maxsize: int = None,
+        ttl: float = None,
+    ):
+        """
+        Stream through a memoized action, evaluating it once per key until the key is evicted from the cache. Only
+        suited to pure actions. The cache built for a plain action cannot be reached afterwards, so pass a CachedAction
+        to read its counters with metrics() or to share its cache across stages.
+        :param action: A callable to evaluate on each item, or a CachedAction.
+        :param key: A function computing the cache key of an item. Defaults to the item.
+        :param int maxsize: The maximum number of results cached. Defaults to unbounded.
+        :param float ttl: The number of seconds a result is cached. Defaults to forever.
+        :return: A new Riverbed evaluated by the memoized action.
+        """
+        if not isinstance(action, CachedAction):
+            action = CachedAction(action, key, maxsize, ttl)
+        return self.through(action)
+
+    def through_threaded(
+        self,
+        action: Callable,
+        max_workers: int = 8,
+        ordered: bool = True,
+        prefetch: int = None,
+    ):
+        """
+        Append a blocking action to the process that is evaluated on a shared thread pool so the event loop is
+        never blocked.
+        :param action: An executable action to append to the pipe.
+        :param int max_workers: The number of threads evaluating the action.
+        :param bool ordered: Keep the order of the Riverbed if True, else yield items as they complete.
+        :param int prefetch: The maximum number of items in flight. Defaults to twice max_workers.
+        :return: A Riverbed with new action.
+        """
+        return Riverbed(
+            executor_amap(
+                shared_thread_pool(max_workers),
+                action,
+                self,
+                in_flight=prefetch or 2 * max_workers,
+                ordered=ordered,
+            )
+        )
+
     def filter(self, condition: Callable):
         """
         Filter a riverbed.
@@ -53,41 +115,69 @@ class Riverbed(AsyncOperable):
         """
         return Riverbed(afilter(condition, self))
 
-    async def __forker(self, condition: Callable, action: Callable, *args):
+    def distinct(
+        self,
+        key: Callable = None,
+        mode: str = EXACT,
+        capacity: int = None,
+        ttl: float = None,
+        error_rate: float = 0.01,
+    ):
         """
-        Will create a branch of the Riverbed to execute action on by emulating an if, elif, else sequence. A combination
-        of filter() and through() where will execute an action if condition is True, else nothing is done.
+        Filter out items whose key has been seen before. Exact mode remembers keys in an LRU set holding at most
+        capacity keys for at most ttl seconds, so a key forgotten by either bound is passed again. Bloom mode remembers
+        keys in a fixed bit array sized for capacity keys, using about 1.2 bytes per key at the default error_rate,
+        but may discard a new item as a duplicate.
+        :param key: A function computing the key of an item. Defaults to the item.
+        :param str mode: "exact" to remember keys in an LRU set or "bloom" to remember them in a Bloom filter.
+        :param int capacity: The number of keys remembered. Defaults to 1,000,000.
+        :param float ttl: The number of seconds a key is remembered. Only accepted by exact.
+        :param float error_rate: The rate that new items are falsely discarded. Only used by bloom.
+        :return: A Riverbed of distinct items.
+        """
+        return self.filter(first_seen(key, mode, capacity, ttl, error_rate))
 
-        This function can accept any number of conditions of actions after the first 2. It will always be parsed as
-        (condition1, action1, condition2, action2, . . ., conditionN, actionN). An odd number of arguments sets the
-        final argument as the else action.
-        :param condition: A function that will determine True to pass to action and False to skip.
-        :param action: An executable action to append to the pipe if condition is True.
-        :returns: An iterator of a fork.
+    def through_map_on_chunk(self, action: Callable, vectorized: bool = False):
         """
-        prongs = [condition, action, *args]
+        Append an action to the process. If items in riverbed are Chunks then map action to them.
+        :param action: An executable action to append to the pipe.
+        :param bool vectorized: Evaluate the action once on the whole buffer of each Chunk.
+        :return: A Riverbed with new action mapped to on Chunks.
+        """
+        if isinstance(action, CallableStream):
+            return self.flat_map(lambda x: action(x, asynchronous=True))
+        return Riverbed(
+            amap(
+                lambda item: (
+                    item.map(action, vectorized) if isinstance(item, CHUNKS) else item
+                ),
+                self,
+            )
+        )
 
-        async for item in self:
-            yielded = False
-
-            # Run loop to simulate if, elif, else
-            for i in range(0, len(prongs), 2):
-
-                # Catch if single last argument for else statement
-                if i == len(prongs) - 1:
-                    condition = lambda x: True
-                    action = prongs[i]
-                else:
-                    condition = prongs[i]
-                    action = prongs[i + 1]
-
-                if condition(item):
-                    yield action(item)
-                    yielded = True
-                    break
-            # If condition never satisfied yield item unchanged
-            if not yielded:
-                yield item
+    def chunk(
+        self,
+        n: int,
+        dtype: str = None,
+        use_numpy: bool = False,
+        max_wait: float = None,
+    ):
+        """
+        Add an accumulator to the pipeline. A Chunk is passed once n items have arrived or max_wait seconds have
+        passed since the first item of the Chunk arrived, whichever comes first.
+        :param int n: Accumulate this many items before passing.
+        :param str dtype: An array typecode or numpy dtype. Defaults to accumulating into Chunks.
+        :param bool use_numpy: Back NumericChunks with numpy.ndarray rather than array.array.
+        :param float max_wait: The most seconds an item waits in the accumulator. Defaults to waiting for n items.
+        :return: A Riverbed with a new accumulator.
+        """
+        if dtype is None:
+            build = Chunk.from_iterable
+        else:
+            build = partial(
+                NumericChunk.from_iterable, dtype=dtype, use_numpy=use_numpy
+            )
+        return Riverbed(amap(build, achunk(self, n, max_wait)))
 
     def fork(self, condition, action, *args):
         """
@@ -101,15 +191,319 @@ class Riverbed(AsyncOperable):
         :param action: An executable action to append to the pipe if condition is True.
         :returns: A Riverbed with a new fork.
         """
-        return Riverbed(self.__forker(condition, action, *args))
+        prongs = (fork_action(prong) for prong in (condition, action, *args))
+        return Riverbed(amap(compile_step(fork_stage(*prongs)), self))
 
-    def dam(self, action: Callable):
+    def fork_by(self, key: Callable, branches: dict, default: Callable = None):
+        """
+        Will create a branch of the Riverbed that picks the action for each item with a single dictionary lookup of its
+        key, rather than testing a condition per branch as fork() does.
+        :param key: A function computing the key of an item.
+        :param dict branches: A mapping of keys to the action to execute for items with that key.
+        :param default: The action for keys not in branches. Defaults to passing the item unchanged.
+        :returns: A Riverbed with a new fork.
         """
-        Append an asynchronous action to the process.
+        branches = {k: fork_action(branch) for k, branch in branches.items()}
+        default = default if default is None else fork_action(default)
+        return Riverbed(amap(compile_step(fork_by_stage(key, branches, default)), self))
+
+    async def __time_windower(self, duration: float, slide: float, aggregate):
+        """
+        Create a sliding window over the items that arrived in the last duration seconds.
+        :param float duration: The number of seconds in a window.
+        :param float slide: The number of seconds between windows.
+        :param aggregate: The aggregate to compute or None to pass window contents.
+        :return: An async iterator of windows.
+        """
+        loop = asyncio.get_running_loop()
+        reader = TimedIterator(self)
+        window = deque()
+        agg = aggregator(aggregate) if aggregate is not None else None
+        boundary = None
+        fresh = 0
+
+        def evict(cutoff: float):
+            while window and window[0][0] < cutoff:
+                _, evicted = window.popleft()
+                if agg is not None:
+                    agg.pop(evicted)
+
+        def result():
+            if agg is not None:
+                return agg.value()
+            return Chunk.from_iterable(item for _, item in window)
+
+        try:
+            while True:
+                timeout = None if boundary is None else max(boundary - loop.time(), 0.0)
+                try:
+                    item = await reader.next(timeout)
+                except StopAsyncIteration:
+                    break
+                now = loop.time()
+
+                # Pass every window that closed before now, going idle once the window empties
+                while boundary is not None and now >= boundary:
+                    evict(boundary - duration)
+                    if window:
+                        yield result()
+                        fresh = 0
+                        boundary += slide
+                    else:
+                        boundary = None
+
+                if item is not TIMEOUT:
+                    if boundary is None:
+                        boundary = now + slide
+                    window.append((now, item))
+                    if agg is not None:
+                        agg.push(item)
+                    fresh += 1
+
+            evict(loop.time() - duration)
+            if fresh and window:
+                yield result()
+        finally:
+            reader.close()
+
+    def window_time(self, duration: float, slide: float = None, aggregate=None):
+        """
+        Add a window of the items that arrived in the last duration seconds to the pipeline, passed every slide
+        seconds while it holds items. A slide equal to duration gives tumbling windows and a smaller slide gives
+        sliding windows. Aggregates are updated as items enter and leave the window rather than recomputed over it.
+        :param float duration: The number of seconds in a window.
+        :param float slide: The number of seconds between windows. Defaults to duration.
+        :param aggregate: One of "sum", "count", "mean", "min" or "max", or an associative function of two items.
+        Defaults to passing the contents of each window as a Chunk.
+        :return: A Riverbed of windows.
+        """
+        return Riverbed(self.__time_windower(duration, slide or duration, aggregate))
+
+    async def __reducer(
+        self, state: KeyedReducer, flush_every: int, flush_interval: float
+    ):
+        """
+        Reduce items by key.
+        :param KeyedReducer state: The per key state to reduce into.
+        :param int flush_every: The number of items between passing every reduction, or None.
+        :param float flush_interval: The number of seconds between passing every reduction, or None.
+        :return: An async iterator of (key, value) pairs.
+        """
+        loop = asyncio.get_running_loop()
+        reader = TimedIterator(self)
+        deadline = None if flush_interval is None else loop.time() + flush_interval
+        n = 0
+
+        try:
+            while True:
+                timeout = None if deadline is None else max(deadline - loop.time(), 0.0)
+                try:
+                    item = await reader.next(timeout)
+                except StopAsyncIteration:
+                    break
+
+                if item is not TIMEOUT:
+                    n += 1
+                    evicted = state.push(item)
+                    if evicted is not None:
+                        yield evicted
+
+                if (flush_every and item is not TIMEOUT and n % flush_every == 0) or (
+                    deadline is not None and loop.time() >= deadline
+                ):
+                    for pair in state.flush():
+                        yield pair
+                    if deadline is not None:
+                        deadline = loop.time() + flush_interval
+
+            for pair in state.flush():
+                yield pair
+        finally:
+            reader.close()
+
+    def reduce_by_key(
+        self,
+        key: Callable,
+        combine: Callable,
+        flush_every: int = None,
+        max_keys: int = None,
+        flush_interval: float = None,
+    ):
+        """
+        Add a reduction of the items sharing a key to the pipeline, passed as (key, value) pairs once the Riverbed is
+        exhausted. The first item of a key is its initial value and combine(value, item) folds in the rest.
+
+        Memory is bounded by max_keys: the least recently updated key is passed early with its partial value to make
+        room for a new key, as is every key each flush_every items or flush_interval seconds. A key passed early
+        starts over if seen again.
+        :param key: A function computing the key of an item.
+        :param combine: A function of the current value of a key and an item returning the new value.
+        :param int flush_every: The number of items between passing every reduction. Defaults to never.
+        :param int max_keys: The maximum number of keys held at once. Defaults to unbounded.
+        :param float flush_interval: The number of seconds between passing every reduction. Defaults to never.
+        :return: A Riverbed of (key, value) pairs.
+        """
+        return Riverbed(
+            self.__reducer(
+                KeyedReducer(key, combine, max_keys), flush_every, flush_interval
+            )
+        )
+
+    def group_by(
+        self,
+        key: Callable,
+        flush_every: int = None,
+        max_keys: int = None,
+        flush_interval: float = None,
+    ):
+        """
+        Add a grouping of the items sharing a key to the pipeline, passed as (key, Chunk) pairs with the bounds of
+        reduce_by_key().
+        :param key: A function computing the key of an item.
+        :param int flush_every: The number of items between passing every group. Defaults to never.
+        :param int max_keys: The maximum number of keys held at once. Defaults to unbounded.
+        :param float flush_interval: The number of seconds between passing every group. Defaults to never.
+        :return: A Riverbed of (key, Chunk) pairs.
+        """
+        groups = self.__reducer(grouper(key, max_keys), flush_every, flush_interval)
+        return Riverbed(
+            amap(lambda pair: (pair[0], Chunk.from_iterable(pair[1])), groups)
+        )
+
+    async def __snapshots(self, summary, every: int, interval: float):
+        """
+        Push items into a summary passing its value periodically and once exhausted.
+        :param summary: A summary with push() and value() methods.
+        :param int every: The number of items between snapshots, or None.
+        :param float interval: The number of seconds between snapshots, or None.
+        :return: An async iterator of snapshots.
+        """
+        loop = asyncio.get_running_loop()
+        reader = TimedIterator(self)
+        deadline = None if interval is None else loop.time() + interval
+        n = 0
+
+        try:
+            while True:
+                timeout = None if deadline is None else max(deadline - loop.time(), 0.0)
+                try:
+                    item = await reader.next(timeout)
+                except StopAsyncIteration:
+                    break
+
+                if item is not TIMEOUT:
+                    n += 1
+                    summary.push(item)
+
+                if (every and item is not TIMEOUT and n % every == 0) or (
+                    deadline is not None and loop.time() >= deadline
+                ):
+                    yield summary.value()
+                    if deadline is not None:
+                        deadline = loop.time() + interval
+
+            yield summary.value()
+        finally:
+            reader.close()
+
+    def top_k(
+        self,
+        k: int,
+        key: Callable = None,
+        snapshot_every: int = None,
+        snapshot_interval: float = None,
+    ):
+        """
+        Add a running selection of the k largest items to the pipeline, holding only k items at a time. A Chunk of the
+        items in descending order is passed every snapshot_every items and snapshot_interval seconds, and once the
+        Riverbed is exhausted.
+        :param int k: The number of items to keep.
+        :param key: A function computing the value to rank an item by. Defaults to the item.
+        :param int snapshot_every: The number of items between snapshots. Defaults to never.
+        :param float snapshot_interval: The number of seconds between snapshots. Defaults to never.
+        :return: A Riverbed of Chunks.
+        """
+        return Riverbed(
+            self.__snapshots(TopK(k, key), snapshot_every, snapshot_interval)
+        )
+
+    def sample(
+        self,
+        n: int,
+        seed=None,
+        snapshot_every: int = None,
+        snapshot_interval: float = None,
+    ):
+        """
+        Add a running uniform random sample of n items to the pipeline. A Chunk of the sample is passed every
+        snapshot_every items and snapshot_interval seconds, and once the Riverbed is exhausted.
+        :param int n: The number of items to sample.
+        :param seed: A seed for the random number generator.
+        :param int snapshot_every: The number of items between snapshots. Defaults to never.
+        :param float snapshot_interval: The number of seconds between snapshots. Defaults to never.
+        :return: A Riverbed of Chunks.
+        """
+        return Riverbed(
+            self.__snapshots(Reservoir(n, seed), snapshot_every, snapshot_interval)
+        )
+
+    def approx_distinct(
+        self,
+        precision: int = 12,
+        key: Callable = None,
+        snapshot_every: int = None,
+        snapshot_interval: float = None,
+    ):
+        """
+        Add a running estimate of the number of distinct items to the pipeline, computed with a HyperLogLog of
+        2**precision bytes. The estimate is passed every snapshot_every items and snapshot_interval seconds, and once
+        the Riverbed is exhausted.
+        :param int precision: The number of index bits, between 4 and 18.
+        :param key: A function computing the value to count an item by. Defaults to the item.
+        :param int snapshot_every: The number of items between snapshots. Defaults to never.
+        :param float snapshot_interval: The number of seconds between snapshots. Defaults to never.
+        :return: A Riverbed of estimates.
+        """
+        return Riverbed(
+            self.__snapshots(
+                HyperLogLog(precision, key), snapshot_every, snapshot_interval
+            )
+        )
+
+    def dam(self, action: Callable, concurrency: int = 1, ordered: bool = True):
+        """
+        Append an asynchronous action to the process. Up to concurrency awaitables are kept in flight at once.
         :param action: An asynchronous executable action to append to the pipe.
+        :param int concurrency: The maximum number of awaitables in flight.
+        :param bool ordered: Keep the order of the Riverbed if True, else yield items as they complete.
         :return: A Riverbed with new action.
         """
-        return Riverbed(async_amap(action, self))
+        return Riverbed(async_amap(action, self, concurrency, ordered))
+
+    def dam_cached(
+        self,
+        action: Callable,
+        key: Callable = None,
+        maxsize: int = None,
+        ttl: float = None,
+        concurrency: int = 1,
+        ordered: bool = True,
+    ):
+        """
+        Await a memoized async action on each item. Items whose key is already being awaited share the pending result
+        rather than awaiting the action again. The cache built for a plain action cannot be reached afterwards, so pass
+        an AsyncCachedAction to read its counters with metrics() or to share its cache across stages.
+        :param action: An async callable to evaluate on each item, or an AsyncCachedAction.
+        :param key: A function computing the cache key of an item. Defaults to the item.
+        :param int maxsize: The maximum number of results cached. Defaults to unbounded.
+        :param float ttl: The number of seconds a result is cached. Defaults to forever.
+        :param int concurrency: The maximum number of awaitables in flight.
+        :param bool ordered: Pass results in the order of the items if True, else as they complete.
+        :return: A new Riverbed of awaited results.
+        """
+        if not isinstance(action, AsyncCachedAction):
+            action = AsyncCachedAction(action, key, maxsize, ttl)
+        return self.dam(action, concurrency, ordered)
 
     def meter(self, time: float):
         """
@@ -119,6 +513,16 @@ class Riverbed(AsyncOperable):
         """
         return Riverbed(async_to_async_generator(self, time))
 
+    def metered(self, metrics: PipelineMetrics, name: str):
+        """
+        Record the items passed and time spent by the operations since the last metered point into a stage of
+        metrics. Times are wall clock, so stages are also charged for awaiting.
+        :param PipelineMetrics metrics: The metrics to record into.
+        :param str name: The name of the stage.
+        :return: A Riverbed measured by metrics.
+        """
+        return Riverbed(AsyncMeteredIterator(self, metrics, metrics.stage(name)))
+
     async def take(self, n: int):
         """
         Will compile the process for given amount of iterations. Will return less in event the Riverbed is terminated.
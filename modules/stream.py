@@ -1,10 +1,24 @@
-from itertools import chain
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain, islice
 from typing import Generator, Iterable, Iterator
 
-from modules.chunk import Chunk
+from modules.chunk import CHUNKS, Chunk, NumericChunk
 from modules.properties.callableStream import CallableStream
 from modules.properties.compilable import Compilable
 from modules.properties.operableChunkable import OperableChunkable
+from modules.utilities.aggregateTools import KeyedReducer, aggregator, grouper
+from modules.utilities.cacheTools import EXACT, CachedAction, first_seen
+from modules.utilities.fusionTools import (COLLECT, DRAIN, filter_stage,
+                                           fork_action, fork_by_stage,
+                                           fork_stage, fused, map_stage)
+from modules.utilities.metricsTools import MeteredIterator, PipelineMetrics
+from modules.utilities.poolTools import (executor_map, map_chunk,
+                                         shared_thread_pool)
+from modules.utilities.sortTools import external_sort
+from modules.utilities.summaryTools import HyperLogLog, Reservoir, TopK
 
 
 class Stream(OperableChunkable, Compilable):
@@ -14,22 +28,46 @@ class Stream(OperableChunkable, Compilable):
 
     def __init__(self, *args):
         if len(args) == 1 and isinstance(args[0], (Generator, Iterator, Iterable)):
-            self.__items = (i for i in args[0])
+            self.__source = iter(args[0])
         else:
-            self.__items = (i for i in args)
+            self.__source = iter(args)
+        self.__stages = ()
+        self.__items = None
 
     def __next__(self):
-        return next(self.__items)
+        return next(self.__compile())
 
     def __iter__(self):
-        for item in self.__items:
-            yield item
+        return self.__compile()
 
     def __add__(self, other):
         return Stream(chain(self, other))
 
+    def __compile(self) -> Iterator:
+        """
+        Fuse the logical plan of the Stream into a single loop over the source. Only done once per Stream.
+        :return: An iterator of the Stream output.
+        """
+        if self.__items is None:
+            self.__items = (
+                fused(self.__stages, self.__source) if self.__stages else self.__source
+            )
+        return self.__items
+
+    def __extend(self, stage: tuple):
+        """
+        Record a stage in the logical plan of a new Stream sharing this Stream's source.
+        :param tuple stage: The stage descriptor to append.
+        :return: A Stream with the stage appended to its plan.
+        """
+        child = Stream.__new__(Stream)
+        child.__source = self.__source
+        child.__stages = self.__stages + (stage,)
+        child.__items = None
+        return child
+
     def flat_map(self, action):
-        return action(self.__items)
+        return action(self.__compile())
 
     def through(self, action):
         """
@@ -39,18 +77,38 @@ class Stream(OperableChunkable, Compilable):
         """
         if isinstance(action, CallableStream):
             return self.flat_map(action)
-        return Stream((action(item) for item in self))
+        return self.__extend(map_stage(action))
 
-    def through_map_on_chunk(self, action):
+    def through_cached(self, action, key=None, maxsize: int = None, ttl: float = None):
+        """
+        Stream through a memoized action, evaluating it once per key until the key is evicted from the cache. Only
+        suited to pure actions. The cache built for a plain action cannot be reached afterwards, so pass a CachedAction
+        to read its counters with metrics() or to share its cache across stages.
+        :param action: A callable to evaluate on each item, or a CachedAction.
+        :param key: A function computing the cache key of an item. Defaults to the item.
+        :param int maxsize: The maximum number of results cached. Defaults to unbounded.
+        :param float ttl: The number of seconds a result is cached. Defaults to forever.
+        :return: A new Stream evaluated by the memoized action.
+        """
+        if not isinstance(action, CachedAction):
+            action = CachedAction(action, key, maxsize, ttl)
+        return self.through(action)
+
+    def through_map_on_chunk(self, action, vectorized: bool = False):
         """
         Append an action to the process. If items in stream are Chunks then map action to them.
         :param action: An executable action to append to the pipe.
+        :param bool vectorized: Evaluate the action once on the whole buffer of each Chunk.
         :return: A Stream with new action mapped to on Chunks.
         """
         if isinstance(action, CallableStream):
             return self.flat_map(action)
-        return Stream(
-            item.map(action) if isinstance(item, Chunk) else item for item in self
+        return self.__extend(
+            map_stage(
+                lambda item: (
+                    item.map(action, vectorized) if isinstance(item, CHUNKS) else item
+                )
+            )
         )
 
     def filter(self, condition):
@@ -59,73 +117,294 @@ class Stream(OperableChunkable, Compilable):
         :param condition: A function that will determine True to pass and False to discard.
         :return: A filtered Stream.
         """
-        return Stream((item for item in self if condition(item)))
+        return self.__extend(filter_stage(condition))
+
+    def distinct(
+        self,
+        key=None,
+        mode: str = EXACT,
+        capacity: int = None,
+        ttl: float = None,
+        error_rate: float = 0.01,
+    ):
+        """
+        Filter out items whose key has been seen before. Exact mode remembers keys in an LRU set holding at most
+        capacity keys for at most ttl seconds, so a key forgotten by either bound is passed again. Bloom mode remembers
+        keys in a fixed bit array sized for capacity keys, using about 1.2 bytes per key at the default error_rate,
+        but may discard a new item as a duplicate.
+        :param key: A function computing the key of an item. Defaults to the item.
+        :param str mode: "exact" to remember keys in an LRU set or "bloom" to remember them in a Bloom filter.
+        :param int capacity: The number of keys remembered. Defaults to 1,000,000.
+        :param float ttl: The number of seconds a key is remembered. Only accepted by exact.
+        :param float error_rate: The rate that new items are falsely discarded. Only used by bloom.
+        :return: A Stream of distinct items.
+        """
+        return self.filter(first_seen(key, mode, capacity, ttl, error_rate))
 
     def __chunker(self, n: int):
         """
-        Create an accumulator for source.
+        Create an accumulator for source. The final chunk may hold less than n items and is skipped if empty.
         :param int n: Accumulate this many items before returning.
         :return: An iterator of chunks.
         """
-        acc = []
-        cnt = 0
+        items = self.__compile()
+        while True:
+            chunk = Chunk.from_iterable(islice(items, n))
+            if not chunk:
+                break
+            yield chunk
 
-        for item in self:
-            acc.append(item)
-            cnt += 1
-            if cnt >= n:
-                yield Chunk(*acc)
-                cnt = 0
-                acc = []
-        yield Chunk(*acc)
+    def __numeric_chunker(self, n: int, dtype: str, use_numpy: bool):
+        """
+        Create an accumulator of numbers for source.
+        :param int n: Accumulate this many items before returning.
+        :param str dtype: An array typecode or numpy dtype for the buffers.
+        :param bool use_numpy: Back the chunks with numpy.ndarray rather than array.array.
+        :return: An iterator of NumericChunks.
+        """
+        items = self.__compile()
+        while True:
+            chunk = NumericChunk.from_iterable(islice(items, n), dtype, use_numpy)
+            if not len(chunk):
+                break
+            yield chunk
 
-    def chunk(self, n: int):
+    def chunk(self, n: int, dtype: str = None, use_numpy: bool = False):
         """
-        Add an accumulator to the pipeline.
+        Add an accumulator to the pipeline. Given a dtype the Stream must hold numbers which are accumulated into
+        NumericChunks backed by a contiguous buffer.
         :param int n: Accumulate this many items before passing.
+        :param str dtype: An array typecode or numpy dtype. Defaults to accumulating into Chunks.
+        :param bool use_numpy: Back NumericChunks with numpy.ndarray rather than array.array.
         :return: A Stream with a new accumulator.
         """
+        if dtype is not None:
+            return Stream(self.__numeric_chunker(n, dtype, use_numpy))
         return Stream(self.__chunker(n))
 
-    def __forker(self, condition, action, *args):
+    def __windower(self, size: int, step: int, aggregate):
         """
-        Will create a branch of the Stream to execute action on by emulating an if, elif, else sequence. A combination
-        of filter() and through() where will execute an action if condition is True, else nothing is done.
+        Create a sliding window over source.
+        :param int size: The number of items in a window.
+        :param int step: The number of items between windows.
+        :param aggregate: The aggregate to compute or None to pass window contents.
+        :return: An iterator of windows.
+        """
+        window = deque()
+        agg = aggregator(aggregate) if aggregate is not None else None
+        fresh = 0
+        skip = 0
 
-        This function can accept any number of conditions of actions after the first 2. It will always be parsed as
-        (condition1, action1, condition2, action2, . . ., conditionN, actionN). An odd number of arguments sets the
-        final argument as the else action.
-        :param condition: A function that will determine True to pass to action and False to skip.
-        :param action: An executable action to append to the pipe if condition is True.
-        :returns: An iterator of a fork.
+        for item in self:
+            if skip:
+                skip -= 1
+                continue
+
+            window.append(item)
+            if agg is not None:
+                agg.push(item)
+            if len(window) > size:
+                evicted = window.popleft()
+                if agg is not None:
+                    agg.pop(evicted)
+
+            fresh += 1
+            if len(window) == size and (step >= size or fresh >= step):
+                yield agg.value() if agg is not None else Chunk.from_iterable(window)
+                fresh = 0
+
+                # Windows that do not overlap start from scratch
+                if step >= size:
+                    window.clear()
+                    agg = aggregator(aggregate) if aggregate is not None else None
+                    skip = step - size
+
+        if window and (step >= size or fresh == len(window)):
+            yield agg.value() if agg is not None else Chunk.from_iterable(window)
+
+    def window(self, size: int, step: int = None, aggregate=None):
+        """
+        Add a window of the last size items to the pipeline, passed every step items. A step equal to size gives
+        tumbling windows and a smaller step gives sliding windows. Aggregates are updated as items enter and leave the
+        window rather than recomputed over it.
+
+        The final window is passed even if short when windows do not overlap or the source is shorter than size.
+        :param int size: The number of items in a window.
+        :param int step: The number of items between windows. Defaults to size.
+        :param aggregate: One of "sum", "count", "mean", "min" or "max", or an associative function of two items.
+        Defaults to passing the contents of each window as a Chunk.
+        :return: A Stream of windows.
+        """
+        return Stream(self.__windower(size, step or size, aggregate))
+
+    def __reducer(self, state: KeyedReducer, flush_every: int):
+        """
+        Reduce source by key.
+        :param KeyedReducer state: The per key state to reduce into.
+        :param int flush_every: The number of items between passing every reduction, or None.
+        :return: An iterator of (key, value) pairs.
+        """
+        for n, item in enumerate(self, 1):
+            evicted = state.push(item)
+            if evicted is not None:
+                yield evicted
+            if flush_every and n % flush_every == 0:
+                yield from state.flush()
+        yield from state.flush()
+
+    def reduce_by_key(
+        self, key, combine, flush_every: int = None, max_keys: int = None
+    ):
+        """
+        Add a reduction of the items sharing a key to the pipeline, passed as (key, value) pairs once the Stream is
+        exhausted. The first item of a key is its initial value and combine(value, item) folds in the rest.
+
+        Memory is bounded by max_keys: the least recently updated key is passed early with its partial value to make
+        room for a new key, as is every key each flush_every items. A key passed early starts over if seen again.
+        :param key: A function computing the key of an item.
+        :param combine: A function of the current value of a key and an item returning the new value.
+        :param int flush_every: The number of items between passing every reduction. Defaults to never.
+        :param int max_keys: The maximum number of keys held at once. Defaults to unbounded.
+        :return: A Stream of (key, value) pairs.
+        """
+        return Stream(self.__reducer(KeyedReducer(key, combine, max_keys), flush_every))
+
+    def group_by(self, key, flush_every: int = None, max_keys: int = None):
+        """
+        Add a grouping of the items sharing a key to the pipeline, passed as (key, Chunk) pairs with the bounds of
+        reduce_by_key().
+        :param key: A function computing the key of an item.
+        :param int flush_every: The number of items between passing every group. Defaults to never.
+        :param int max_keys: The maximum number of keys held at once. Defaults to unbounded.
+        :return: A Stream of (key, Chunk) pairs.
+        """
+        return Stream(self.__reducer(grouper(key, max_keys), flush_every)).through(
+            lambda pair: (pair[0], Chunk.from_iterable(pair[1]))
+        )
+
+    def sorted(
+        self,
+        key=None,
+        reverse: bool = False,
+        memory_limit: int = None,
+        spill_dir: str = None,
+    ):
+        """
+        Add a sort to the pipeline. With memory_limit set the Stream is sorted in runs of about that many bytes of
+        items that are spilled to temporary files and merged lazily, so Streams larger than memory can be sorted. The
+        sort is stable and spilled items must be picklable.
+        :param key: A function computing the sort key of an item. Defaults to the item.
+        :param bool reverse: Sort in descending order.
+        :param int memory_limit: The approximate number of bytes of items held in memory. Defaults to unbounded.
+        :param str spill_dir: The directory to write runs in. Defaults to the system temporary directory.
+        :return: A sorted Stream.
         """
-        prongs = [condition, action, *args]
+        return Stream(external_sort(self, key, reverse, memory_limit, spill_dir))
 
+    def __summarize(self, summary, unpack: bool):
+        """
+        Push every item of source into a summary and pass its value.
+        :param summary: A summary with push() and value() methods.
+        :param bool unpack: Pass the items of the value rather than the value itself.
+        :return: An iterator of the value or its items.
+        """
+        push = summary.push
         for item in self:
-            yielded = False
-
-            # Run loop to simulate if, elif, else
-            for i in range(0, len(prongs), 2):
-
-                # Catch if single last argument for else statement
-                if i == len(prongs) - 1:
-                    condition = lambda x: True
-                    action = prongs[i]
-                else:
-                    condition = prongs[i]
-                    action = prongs[i + 1]
-
-                if condition(item) and isinstance(action, CallableStream):
-                    yield next(action(item))
-                    yielded = True
-                    break
-                elif condition(item):
-                    yield action(item)
-                    yielded = True
-                    break
-            # If condition never satisfied yield item unchanged
-            if not yielded:
-                yield item
+            push(item)
+        if unpack:
+            yield from summary.value()
+        else:
+            yield summary.value()
+
+    def top_k(self, k: int, key=None):
+        """
+        Add a selection of the k largest items to the pipeline, holding only k items at a time. Items are passed in
+        descending order once the Stream is exhausted, and ties keep the item seen first.
+        :param int k: The number of items to keep.
+        :param key: A function computing the value to rank an item by. Defaults to the item.
+        :return: A Stream of at most k items.
+        """
+        return Stream(self.__summarize(TopK(k, key), unpack=True))
+
+    def sample(self, n: int, seed=None):
+        """
+        Add a uniform random sample of n items to the pipeline, holding only n items at a time. The sample is passed
+        once the Stream is exhausted.
+        :param int n: The number of items to sample.
+        :param seed: A seed for the random number generator.
+        :return: A Stream of at most n items.
+        """
+        return Stream(self.__summarize(Reservoir(n, seed), unpack=True))
+
+    def approx_distinct(self, precision: int = 12, key=None):
+        """
+        Add an estimate of the number of distinct items to the pipeline, computed with a HyperLogLog of 2**precision
+        bytes. The estimate is passed once the Stream is exhausted and is typically within 1.04 / sqrt(2**precision)
+        of the exact count.
+        :param int precision: The number of index bits, between 4 and 18.
+        :param key: A function computing the value to count an item by. Defaults to the item.
+        :return: A Stream of a single estimate.
+        """
+        return Stream(self.__summarize(HyperLogLog(precision, key), unpack=False))
+
+    def through_threaded(
+        self,
+        action,
+        max_workers: int = 8,
+        ordered: bool = True,
+        prefetch: int = None,
+    ):
+        """
+        Append a blocking action to the process that is evaluated on a shared thread pool.
+        :param action: An executable action to append to the pipe.
+        :param int max_workers: The number of threads evaluating the action.
+        :param bool ordered: Keep the order of the Stream if True, else yield items as they complete.
+        :param int prefetch: The maximum number of items in flight. Defaults to twice max_workers.
+        :return: A Stream with new action.
+        """
+        return Stream(
+            executor_map(
+                shared_thread_pool(max_workers),
+                action,
+                self,
+                in_flight=prefetch or 2 * max_workers,
+                ordered=ordered,
+            )
+        )
+
+    def __par_mapper(self, action, workers: int, ordered: bool, chunksize: int):
+        """
+        Evaluate an action on a pool of worker processes one Chunk at a time.
+        :param action: A picklable callable to evaluate on each item.
+        :param int workers: The number of worker processes.
+        :param bool ordered: Yield items in source order if True, else as batches complete.
+        :param int chunksize: The number of items sent to a worker at once.
+        :return: An iterator of evaluated items.
+        """
+        with ProcessPoolExecutor(workers) as executor:
+            for chunk in executor_map(
+                executor,
+                partial(map_chunk, action),
+                self.__chunker(chunksize),
+                in_flight=2 * workers,
+                ordered=ordered,
+            ):
+                yield from chunk
+
+    def par_through(
+        self, action, workers: int = None, ordered: bool = True, chunksize: int = 256
+    ):
+        """
+        Append an action to the process that is evaluated on a pool of worker processes. Items are sent to workers
+        in Chunks and at most two Chunks per worker are in flight at once.
+        :param action: A picklable executable action to append to the pipe.
+        :param int workers: The number of worker processes. Defaults to the number of CPUs.
+        :param bool ordered: Keep the order of the Stream if True, else yield items as they complete.
+        :param int chunksize: The number of items sent to a worker at once.
+        :return: A Stream with new action.
+        """
+        workers = workers or os.cpu_count() or 1
+        return Stream(self.__par_mapper(action, workers, ordered, chunksize))
 
     def fork(self, condition, action, *args):
         """
@@ -139,7 +418,31 @@ class Stream(OperableChunkable, Compilable):
         :param action: An executable action to append to the pipe if condition is True.
         :returns: A Stream with a new fork.
         """
-        return Stream(self.__forker(condition, action, *args))
+        prongs = (fork_action(prong) for prong in (condition, action, *args))
+        return self.__extend(fork_stage(*prongs))
+
+    def fork_by(self, key, branches: dict, default=None):
+        """
+        Will create a branch of the Stream that picks the action for each item with a single dictionary lookup of its
+        key, rather than testing a condition per branch as fork() does.
+        :param key: A function computing the key of an item.
+        :param dict branches: A mapping of keys to the action to execute for items with that key.
+        :param default: The action for keys not in branches. Defaults to passing the item unchanged.
+        :returns: A Stream with a new fork.
+        """
+        branches = {k: fork_action(branch) for k, branch in branches.items()}
+        default = default if default is None else fork_action(default)
+        return self.__extend(fork_by_stage(key, branches, default))
+
+    def metered(self, metrics: PipelineMetrics, name: str):
+        """
+        Record the items passed and time spent by the operations since the last metered point into a stage of
+        metrics. Operations between two metered points are measured together.
+        :param PipelineMetrics metrics: The metrics to record into.
+        :param str name: The name of the stage.
+        :return: A Stream measured by metrics.
+        """
+        return Stream(MeteredIterator(self, metrics, metrics.stage(name)))
 
     def take(self, n: int) -> list:
         """
@@ -147,27 +450,24 @@ class Stream(OperableChunkable, Compilable):
         :param int n: The number of iterations to compile.
         :return: A list containing pipe output.
         """
-        acc = []
-        cnt = 0
-
-        for item in self:
-            acc.append(item)
-            cnt += 1
-            if cnt >= n:
-                break
-        return acc
+        return list(islice(self.__compile(), n))
 
     def to_list(self):
         """
         Compiles the stream to a list.
         :return: A list containing pipe output.
         """
-        return list(self.__items)
+        if self.__items is not None or not self.__stages:
+            return list(self.__compile())
+        return fused(self.__stages, self.__source, COLLECT)
 
     def drain(self):
         """
         Complies a stream and drains output for each item.
         :return: None
         """
-        for _ in self.__items:
-            pass
+        if self.__items is not None or not self.__stages:
+            for _ in self.__compile():
+                pass
+        else:
+            fused(self.__stages, self.__source, DRAIN)
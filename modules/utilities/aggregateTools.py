@@ -0,0 +1,223 @@
+from collections import OrderedDict, deque
+from typing import Callable, Union
+
+# Marks an aggregate over no items.
+EMPTY = object()
+
+
+class Sum:
+    """
+    The running sum of a window.
+    """
+
+    def __init__(self):
+        self.__total = 0
+
+    def push(self, item):
+        self.__total += item
+
+    def pop(self, item):
+        self.__total -= item
+
+    def value(self):
+        return self.__total
+
+
+class Count:
+    """
+    The number of items in a window.
+    """
+
+    def __init__(self):
+        self.__count = 0
+
+    def push(self, item):
+        self.__count += 1
+
+    def pop(self, item):
+        self.__count -= 1
+
+    def value(self):
+        return self.__count
+
+
+class Mean:
+    """
+    The running mean of a window.
+    """
+
+    def __init__(self):
+        self.__total = 0
+        self.__count = 0
+
+    def push(self, item):
+        self.__total += item
+        self.__count += 1
+
+    def pop(self, item):
+        self.__total -= item
+        self.__count -= 1
+
+    def value(self):
+        return self.__total / self.__count if self.__count else None
+
+
+class Max:
+    """
+    The maximum of a window kept in a monotonic deque so each item is pushed and popped at most once.
+    """
+
+    def __init__(self):
+        self.__candidates = deque()
+        self.__pushed = 0
+        self.__popped = 0
+
+    def _dominates(self, new, old) -> bool:
+        return new >= old
+
+    def push(self, item):
+        candidates = self.__candidates
+        while candidates and self._dominates(item, candidates[-1][1]):
+            candidates.pop()
+        candidates.append((self.__pushed, item))
+        self.__pushed += 1
+
+    def pop(self, item):
+        if self.__candidates and self.__candidates[0][0] == self.__popped:
+            self.__candidates.popleft()
+        self.__popped += 1
+
+    def value(self):
+        return self.__candidates[0][1] if self.__candidates else None
+
+
+class Min(Max):
+    """
+    The minimum of a window kept in a monotonic deque so each item is pushed and popped at most once.
+    """
+
+    def _dominates(self, new, old) -> bool:
+        return new <= old
+
+
+class Combine:
+    """
+    The aggregate of a window under any associative combiner. Items are held on two stacks so evicting the oldest
+    item costs amortized O(1) combinations rather than recomputing the window.
+    """
+
+    def __init__(self, combine: Callable):
+        self.__combine = combine
+        self.__front = []
+        self.__back = []
+        self.__back_value = EMPTY
+
+    def __join(self, older, newer):
+        if older is EMPTY:
+            return newer
+        if newer is EMPTY:
+            return older
+        return self.__combine(older, newer)
+
+    def push(self, item):
+        self.__back.append(item)
+        self.__back_value = self.__join(self.__back_value, item)
+
+    def pop(self, item):
+        if not self.__front:
+            value = EMPTY
+            for back in reversed(self.__back):
+                value = self.__join(back, value)
+                self.__front.append(value)
+            self.__back.clear()
+            self.__back_value = EMPTY
+        self.__front.pop()
+
+    def value(self):
+        front = self.__front[-1] if self.__front else EMPTY
+        value = self.__join(front, self.__back_value)
+        return None if value is EMPTY else value
+
+
+AGGREGATES = {"sum": Sum, "count": Count, "mean": Mean, "min": Min, "max": Max}
+
+
+def aggregator(aggregate: Union[str, Callable]):
+    """
+    Create an incremental aggregator.
+    :param aggregate: One of "sum", "count", "mean", "min" or "max", or an associative function of two items.
+    :return: An aggregator with push(), pop() and value() methods.
+    """
+    if isinstance(aggregate, str):
+        if aggregate not in AGGREGATES:
+            raise ValueError(
+                f"aggregate must be one of {tuple(AGGREGATES)} or a callable, got {aggregate!r}."
+            )
+        return AGGREGATES[aggregate]()
+    return Combine(aggregate)
+
+
+class KeyedReducer:
+    """
+    Per key running reductions. With max_keys set the least recently updated key is evicted, along with its partial
+    reduction, to make room for a new key.
+    """
+
+    def __init__(
+        self,
+        key: Callable,
+        combine: Callable,
+        max_keys: int = None,
+        initial: Callable = None,
+    ):
+        self.__key = key
+        self.__combine = combine
+        self.__max_keys = max_keys
+        self.__initial = initial
+        self.__state = OrderedDict()
+
+    def __len__(self):
+        return len(self.__state)
+
+    def push(self, item):
+        """
+        Reduce an item into the state of its key.
+        :param item: The item to reduce.
+        :return: The (key, value) pair evicted to make room for the key of item, or None.
+        """
+        state = self.__state
+        k = self.__key(item)
+        if k in state:
+            state[k] = self.__combine(state[k], item)
+            state.move_to_end(k)
+            return None
+
+        evicted = None
+        if self.__max_keys is not None and len(state) >= self.__max_keys:
+            evicted = state.popitem(last=False)
+        state[k] = item if self.__initial is None else self.__initial(item)
+        return evicted
+
+    def flush(self) -> list:
+        """
+        Remove the state of every key.
+        :return: A list of (key, value) pairs in order of least recently updated.
+        """
+        pairs = list(self.__state.items())
+        self.__state.clear()
+        return pairs
+
+
+def _append(group: list, item) -> list:
+    group.append(item)
+    return group
+
+
+def grouper(key: Callable, max_keys: int = None) -> KeyedReducer:
+    """
+    Create a KeyedReducer collecting the items of each key into a list.
+    :param key: A function computing the key of an item.
+    :param int max_keys: The maximum number of keys held at once. Defaults to unbounded.
+    :return: A KeyedReducer of lists.
+    """
+    return KeyedReducer(key, _append, max_keys, initial=lambda item: [item])
@@ -1,33 +1,100 @@
 import asyncio
+from collections import deque
+from concurrent.futures import Executor
+from functools import partial
 from typing import AsyncGenerator, AsyncIterable, Callable, Generator, Iterable
 
+# Returned by TimedIterator.next() when no item arrived before the timeout.
+TIMEOUT = object()
+
+
+class TimedIterator:
+    """
+    Await the items of an async iterable with a timeout. A read that times out is kept pending rather than
+    cancelled so no item is lost and the source is not closed.
+    """
+
+    def __init__(self, items: AsyncIterable):
+        self.__iterator = items.__aiter__()
+        self.__pending = None
+
+    async def next(self, timeout: float = None):
+        """
+        Await the next item.
+        :param float timeout: The number of seconds to wait. Defaults to waiting indefinitely.
+        :return: The next item or TIMEOUT. Raises StopAsyncIteration once the source is exhausted.
+        """
+        if timeout is None and self.__pending is None:
+            return await self.__iterator.__anext__()
+        if self.__pending is None:
+            self.__pending = asyncio.ensure_future(self.__iterator.__anext__())
+
+        done, _ = await asyncio.wait((self.__pending,), timeout=timeout)
+        if not done:
+            return TIMEOUT
+        pending, self.__pending = self.__pending, None
+        return pending.result()
+
+    def close(self):
+        """
+        Cancel a pending read.
+        :return: None.
+        """
+        if self.__pending is not None:
+            self.__pending.cancel()
+            self.__pending = None
+
 
 async def to_async_generator(
-    items: Iterable, sleep_time: float = 0.0
+    items: Iterable, sleep_time: float = 0.0, yield_every: int = None
 ) -> AsyncGenerator:
     """
-    Convert any iterable into an async generator.
+    Convert any iterable into an async generator. Without a sleep time or yield_every no control is given back to
+    the event loop between items.
     :param items: An iterable to convert.
     :param sleep_time: Add a sleep time between yielding of items in number of seconds.
+    :param int yield_every: Cooperatively yield to the event loop once every this many items.
     :return: An async generator of the given iterable with possible delay time.
     """
-    for item in items:
-        await asyncio.sleep(sleep_time)
-        yield item
+    if sleep_time:
+        for item in items:
+            await asyncio.sleep(sleep_time)
+            yield item
+    elif yield_every:
+        for i, item in enumerate(items, 1):
+            if i % yield_every == 0:
+                await asyncio.sleep(0)
+            yield item
+    else:
+        for item in items:
+            yield item
 
 
 async def async_to_async_generator(
-    items: AsyncIterable, sleep_time: float = 0.0
+    items: AsyncIterable, sleep_time: float = 0.0, yield_every: int = None
 ) -> AsyncGenerator:
     """
-    Convert any async iterable into an async generator.
+    Convert any async iterable into an async generator. Without a sleep time or yield_every no additional control
+    is given back to the event loop between items.
     :param items: An async iterable to convert.
     :param sleep_time: Add a sleep time between yielding of items in number of seconds.
+    :param int yield_every: Cooperatively yield to the event loop once every this many items.
     :return: An async generator of the given iterable with possible delay time.
     """
-    async for item in items:
-        await asyncio.sleep(sleep_time)
-        yield item
+    if sleep_time:
+        async for item in items:
+            await asyncio.sleep(sleep_time)
+            yield item
+    elif yield_every:
+        i = 0
+        async for item in items:
+            i += 1
+            if i % yield_every == 0:
+                await asyncio.sleep(0)
+            yield item
+    else:
+        async for item in items:
+            yield item
 
 
 async def amap(action: Callable, items: AsyncIterable) -> AsyncGenerator:
@@ -35,17 +102,192 @@ async def amap(action: Callable, items: AsyncIterable) -> AsyncGenerator:
         yield action(item)
 
 
-async def async_amap(action: Callable, items: AsyncIterable) -> AsyncGenerator:
+async def serial_amap(action: Callable, items: AsyncIterable) -> AsyncGenerator:
     async for item in items:
         yield await action(item)
 
 
+async def ordered_amap(
+    action: Callable, items: AsyncIterable, concurrency: int
+) -> AsyncGenerator:
+    """
+    Await an async action on each item with several in flight, yielding results in the order of the items. The next
+    item is read while results are awaited, so each result is yielded as soon as the ones before it are.
+    :param action: An async callable to evaluate on each item.
+    :param items: The async iterable to evaluate.
+    :param int concurrency: The maximum number of awaitables in flight.
+    :return: An async generator of results.
+    """
+    iterator = items.__aiter__()
+    pending = deque()
+    read = None
+    exhausted = False
+    try:
+        while pending or not exhausted:
+            if not pending and read is None:
+                # Nothing else can finish first, so the source is awaited directly
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                pending.append(asyncio.ensure_future(action(item)))
+                continue
+
+            if read is None and not exhausted and len(pending) < concurrency:
+                read = asyncio.ensure_future(iterator.__anext__())
+            waiting = [pending[0]] if pending else []
+            if read is not None:
+                waiting.append(read)
+            await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+            if read is not None and read.done():
+                finished, read = read, None
+                try:
+                    pending.append(asyncio.ensure_future(action(finished.result())))
+                except StopAsyncIteration:
+                    exhausted = True
+            while pending and pending[0].done():
+                yield pending.popleft().result()
+    finally:
+        if read is not None:
+            read.cancel()
+        for future in pending:
+            future.cancel()
+
+
+async def unordered_amap(
+    action: Callable, items: AsyncIterable, concurrency: int
+) -> AsyncGenerator:
+    """
+    Await an async action on each item with several in flight, yielding results as they complete. The next item is
+    read while results are awaited, so each result is yielded as soon as it completes.
+    :param action: An async callable to evaluate on each item.
+    :param items: The async iterable to evaluate.
+    :param int concurrency: The maximum number of awaitables in flight.
+    :return: An async generator of results.
+    """
+    iterator = items.__aiter__()
+    pending = set()
+    read = None
+    exhausted = False
+    try:
+        while pending or not exhausted:
+            if not pending and read is None:
+                # Nothing else can finish first, so the source is awaited directly
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                pending.add(asyncio.ensure_future(action(item)))
+                continue
+
+            if read is None and not exhausted and len(pending) < concurrency:
+                read = asyncio.ensure_future(iterator.__anext__())
+            waiting = pending if read is None else pending | {read}
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+            if read in done:
+                done.discard(read)
+                finished, read = read, None
+                try:
+                    pending.add(asyncio.ensure_future(action(finished.result())))
+                except StopAsyncIteration:
+                    exhausted = True
+            pending -= done
+            for future in done:
+                yield future.result()
+    finally:
+        if read is not None:
+            read.cancel()
+        for future in pending:
+            future.cancel()
+
+
+def async_amap(
+    action: Callable, items: AsyncIterable, concurrency: int = 1, ordered: bool = True
+) -> AsyncGenerator:
+    """
+    Await an async action on each item keeping up to concurrency awaitables in flight.
+    :param action: An async callable to evaluate on each item.
+    :param items: The async iterable to evaluate.
+    :param int concurrency: The maximum number of awaitables in flight.
+    :param bool ordered: Yield results in the order of the items if True, else as they complete.
+    :return: An async generator of results.
+    """
+    if concurrency <= 1:
+        return serial_amap(action, items)
+    if ordered:
+        return ordered_amap(action, items, concurrency)
+    return unordered_amap(action, items, concurrency)
+
+
+async def executor_amap(
+    executor: Executor,
+    action: Callable,
+    items: AsyncIterable,
+    in_flight: int,
+    ordered: bool = True,
+) -> AsyncGenerator:
+    """
+    Evaluate a blocking action on each item using an executor without blocking the event loop.
+    :param executor: The executor to run the action on.
+    :param action: A callable to evaluate on each item.
+    :param items: The async iterable to evaluate.
+    :param int in_flight: The maximum number of pending evaluations.
+    :param bool ordered: Yield results in the order of the items if True, else as they complete.
+    :return: An async generator of results.
+    """
+    loop = asyncio.get_running_loop()
+    results = async_amap(
+        partial(loop.run_in_executor, executor, action), items, in_flight, ordered
+    )
+    async for result in results:
+        yield result
+
+
 async def afilter(condition: Callable, items: AsyncIterable) -> AsyncGenerator:
     async for item in items:
         if condition(item):
             yield item
 
 
+async def achunk(
+    items: AsyncIterable, n: int, max_wait: float = None
+) -> AsyncGenerator:
+    """
+    Accumulate items into lists of n. A partial list is yielded once max_wait seconds pass after its first item.
+    :param items: The async iterable to accumulate.
+    :param int n: Accumulate this many items before yielding.
+    :param float max_wait: The most seconds an item waits to be yielded. Defaults to waiting for n items.
+    :return: An async generator of lists.
+    """
+    loop = asyncio.get_running_loop()
+    reader = TimedIterator(items)
+    batch = []
+    deadline = None
+
+    try:
+        while True:
+            timeout = None if deadline is None else max(deadline - loop.time(), 0.0)
+            try:
+                item = await reader.next(timeout)
+            except StopAsyncIteration:
+                break
+
+            if item is not TIMEOUT:
+                if not batch and max_wait is not None:
+                    deadline = loop.time() + max_wait
+                batch.append(item)
+            if item is TIMEOUT or len(batch) >= n:
+                yield batch
+                batch = []
+                deadline = None
+        if batch:
+            yield batch
+    finally:
+        reader.close()
+
+
 def async_to_generator(items: AsyncIterable) -> Generator:
     it = items.__aiter__()
     loop = asyncio.new_event_loop()
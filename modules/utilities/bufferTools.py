@@ -0,0 +1,71 @@
+import time
+from typing import Callable
+
+from modules.chunk import CHUNKS
+
+
+def yield_buffered(
+    items, write: Callable, flush_size: int, flush_interval: float = None
+):
+    """
+    Gather each item, or the items of each Chunk, into a buffer handed to write() as a generator passing the items on.
+    The buffer is written once it holds flush_size items or flush_interval seconds have passed, checked as items
+    arrive, and what is left is written once the items end.
+    :param items: The items to buffer.
+    :param write: A callable taking a list of items. The list is not reused once written.
+    :param int flush_size: The number of items buffered before writing.
+    :param float flush_interval: The most seconds an item waits in the buffer. Defaults to waiting for flush_size items.
+    :return: A generator of the items.
+    """
+    buffer = []
+    deadline = None if flush_interval is None else time.monotonic() + flush_interval
+    try:
+        for item in items:
+            if isinstance(item, CHUNKS):
+                buffer.extend(item)
+            else:
+                buffer.append(item)
+            if len(buffer) >= flush_size or (
+                deadline is not None and time.monotonic() >= deadline
+            ):
+                write(buffer)
+                buffer = []
+                if deadline is not None:
+                    deadline = time.monotonic() + flush_interval
+            yield item
+    finally:
+        if buffer:
+            write(buffer)
+
+
+async def ayield_buffered(
+    items, write: Callable, flush_size: int, flush_interval: float = None
+):
+    """
+    Gather each item, or the items of each Chunk, into a buffer handed to write() as an async generator passing the
+    items on. Behaves as yield_buffered().
+    :param items: The async iterable of items to buffer.
+    :param write: An async callable taking a list of items. The list is not reused once written.
+    :param int flush_size: The number of items buffered before writing.
+    :param float flush_interval: The most seconds an item waits in the buffer. Defaults to waiting for flush_size items.
+    :return: An async generator of the items.
+    """
+    buffer = []
+    deadline = None if flush_interval is None else time.monotonic() + flush_interval
+    try:
+        async for item in items:
+            if isinstance(item, CHUNKS):
+                buffer.extend(item)
+            else:
+                buffer.append(item)
+            if len(buffer) >= flush_size or (
+                deadline is not None and time.monotonic() >= deadline
+            ):
+                await write(buffer)
+                buffer = []
+                if deadline is not None:
+                    deadline = time.monotonic() + flush_interval
+            yield item
+    finally:
+        if buffer:
+            await write(buffer)
@@ -0,0 +1,291 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Callable
+
+from modules.utilities.summaryTools import mix64
+
+EXACT = "exact"
+BLOOM = "bloom"
+MODES = (EXACT, BLOOM)
+
+# The default number of keys remembered by first_seen().
+CAPACITY = 1_000_000
+
+# Returned by LRUCache.get() for keys that are not cached.
+MISSING = object()
+
+
+class LRUCache:
+    """
+    A mapping holding at most maxsize entries, each for at most ttl seconds. Without a ttl the least recently used
+    entry is evicted first. With a ttl entries are evicted in the order they were written, so expired entries can be
+    pruned from the front of the cache.
+    """
+
+    def __init__(self, maxsize: int = None, ttl: float = None, clock: Callable = None):
+        self.__maxsize = maxsize
+        self.__ttl = ttl
+        self.__clock = clock or time.monotonic
+        self.__entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __prune(self, now: float):
+        """
+        Remove the expired entries at the front of the cache.
+        :param float now: The current time of the clock.
+        :return: None.
+        """
+        entries = self.__entries
+        while entries:
+            key, (expires, _) = next(iter(entries.items()))
+            if expires > now:
+                return
+            del entries[key]
+
+    def get(self, key, default=MISSING):
+        """
+        Get the value of a key.
+        :param key: The key to look up.
+        :param default: The value to return if key is not cached or expired.
+        :return: The cached value or default.
+        """
+        entry = self.__entries.get(key)
+        if entry is None:
+            return default
+        if self.__ttl is None:
+            self.__entries.move_to_end(key)
+        elif entry[0] <= self.__clock():
+            del self.__entries[key]
+            return default
+        return entry[1]
+
+    def put(self, key, value):
+        """
+        Cache the value of a key, evicting entries that are expired or beyond maxsize.
+        :param key: The key to cache.
+        :param value: The value to cache.
+        :return: None.
+        """
+        entries = self.__entries
+        if self.__ttl is None:
+            expires = math.inf
+        else:
+            now = self.__clock()
+            self.__prune(now)
+            expires = now + self.__ttl
+
+        entries[key] = (expires, value)
+        entries.move_to_end(key)
+        if self.__maxsize is not None and len(entries) > self.__maxsize:
+            entries.popitem(last=False)
+
+
+class CachedAction:
+    """
+    An action memoized in an LRUCache. Suited to pure but expensive actions on streams that repeat keys. Pass the same
+    CachedAction to several stages to share its cache, and read its counters with metrics().
+    """
+
+    def __init__(
+        self,
+        action: Callable,
+        key: Callable = None,
+        maxsize: int = None,
+        ttl: float = None,
+    ):
+        self.__action = action
+        self.__key = key
+        self.__cache = LRUCache(maxsize, ttl)
+        self.__hits = 0
+        self.__misses = 0
+
+    def __call__(self, item):
+        k = item if self.__key is None else self.__key(item)
+        value = self.__cache.get(k)
+        if value is not MISSING:
+            self.__hits += 1
+            return value
+
+        self.__misses += 1
+        value = self.__action(item)
+        self.__cache.put(k, value)
+        return value
+
+    def lookup(self, item) -> tuple:
+        """
+        Look up the cached result of an item, counting a hit if it is cached.
+        :param item: The item to look up.
+        :return: A tuple of the cache key of the item and its cached result, or MISSING.
+        """
+        k = item if self.__key is None else self.__key(item)
+        value = self.__cache.get(k)
+        if value is not MISSING:
+            self.__hits += 1
+        return k, value
+
+    def evaluate(self, item):
+        """
+        Evaluate the action on an item that is not cached, counting a miss.
+        :param item: The item to evaluate.
+        :return: The result of the action.
+        """
+        self.__misses += 1
+        return self.__action(item)
+
+    def store(self, k, value):
+        """
+        Cache the result of a key.
+        :param k: The cache key.
+        :param value: The result to cache.
+        :return: None.
+        """
+        self.__cache.put(k, value)
+
+    def metrics(self) -> dict:
+        """
+        Snapshot the counters of the cache.
+        :return: A dict of cache hits, misses and the number of cached keys.
+        """
+        return {
+            "hits": self.__hits,
+            "misses": self.__misses,
+            "size": len(self.__cache),
+        }
+
+
+class AsyncCachedAction(CachedAction):
+    """
+    An async action memoized in an LRUCache. Calls for a key already being awaited share the pending result rather
+    than awaiting the action again, and are counted as coalesced. Failed results are not cached.
+    """
+
+    def __init__(
+        self,
+        action: Callable,
+        key: Callable = None,
+        maxsize: int = None,
+        ttl: float = None,
+    ):
+        super().__init__(action, key, maxsize, ttl)
+        self.__in_flight = {}
+        self.__coalesced = 0
+
+    def __settle(self, k, task: asyncio.Future):
+        """
+        Cache the result of a finished call and stop sharing it.
+        :param k: The key of the call.
+        :param task: The finished call.
+        :return: None.
+        """
+        del self.__in_flight[k]
+        if not task.cancelled() and task.exception() is None:
+            self.store(k, task.result())
+
+    async def __call__(self, item):
+        k, value = self.lookup(item)
+        if value is not MISSING:
+            return value
+
+        task = self.__in_flight.get(k)
+        if task is None:
+            task = asyncio.ensure_future(self.evaluate(item))
+            self.__in_flight[k] = task
+            task.add_done_callback(partial(self.__settle, k))
+        else:
+            self.__coalesced += 1
+
+        # A cancelled caller must not cancel the call other callers are sharing
+        return await asyncio.shield(task)
+
+    def metrics(self) -> dict:
+        """
+        Snapshot the counters of the cache.
+        :return: A dict of cache hits, misses, coalesced calls, calls in flight and the number of cached keys.
+        """
+        metrics = super().metrics()
+        metrics["coalesced"] = self.__coalesced
+        metrics["in_flight"] = len(self.__in_flight)
+        return metrics
+
+
+class BloomFilter:
+    """
+    A set membership test in a fixed bit array. Keys that were added are always found, and keys that were not are
+    falsely found with probability of about error_rate until more than capacity keys are added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        if not 0 < error_rate < 1:
+            raise ValueError(f"error_rate must be between 0 and 1, got {error_rate}.")
+        self.__size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.__hashes = max(1, round(self.__size / max(capacity, 1) * math.log(2)))
+        self.__bits = bytearray((self.__size + 7) // 8)
+
+    def add(self, key) -> bool:
+        """
+        Add a key to the filter.
+        :param key: A hashable key.
+        :return: True if the key was not already in the filter.
+        """
+        h = mix64(hash(key))
+        step = (h >> 32) | 1
+        position = h & 0xFFFFFFFF
+        size = self.__size
+        bits = self.__bits
+
+        new = False
+        for _ in range(self.__hashes):
+            position = (position + step) % size
+            byte, bit = position >> 3, 1 << (position & 7)
+            if not bits[byte] & bit:
+                bits[byte] |= bit
+                new = True
+        return new
+
+
+def first_seen(
+    key: Callable = None,
+    mode: str = EXACT,
+    capacity: int = None,
+    ttl: float = None,
+    error_rate: float = 0.01,
+) -> Callable:
+    """
+    Create a condition that is True only the first time the key of an item is seen.
+    :param key: A function computing the key of an item. Defaults to the item.
+    :param str mode: "exact" to remember keys in an LRUCache or "bloom" to remember them in a BloomFilter.
+    :param int capacity: The number of keys remembered. Defaults to 1,000,000.
+    :param float ttl: The number of seconds a key is remembered. Only accepted by exact.
+    :param float error_rate: The rate that unseen keys are taken as seen. Only used by bloom.
+    :return: A function of an item returning True if its key is new.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}.")
+    capacity = CAPACITY if capacity is None else capacity
+
+    if mode == BLOOM:
+        if ttl is not None:
+            raise ValueError("ttl is only supported by the exact mode.")
+        add = BloomFilter(capacity, error_rate).add
+        if key is None:
+            return add
+        return lambda item: add(key(item))
+
+    seen = LRUCache(capacity, ttl)
+    get, put = seen.get, seen.put
+
+    def condition(item) -> bool:
+        k = item if key is None else key(item)
+        if get(k) is MISSING:
+            put(k, None)
+            return True
+        return False
+
+    return condition
@@ -0,0 +1,171 @@
+from functools import lru_cache
+from typing import Callable, Iterator
+
+from modules.properties.callableStream import CallableStream
+
+# Terminal modes a fused loop can be compiled for.
+ITERATE = "iterate"
+COLLECT = "collect"
+DRAIN = "drain"
+
+TERMINALS = {
+    ITERATE: ((), "yield item", ()),
+    COLLECT: (("out = []", "append = out.append"), "append(item)", ("return out",)),
+    DRAIN: ((), "pass", ()),
+}
+
+
+def map_stage(action: Callable) -> tuple:
+    """
+    Describe a stage that evaluates an action on each item.
+    :param action: A callable to evaluate on each item.
+    :return: A stage descriptor.
+    """
+    return ("map", action)
+
+
+def filter_stage(condition: Callable) -> tuple:
+    """
+    Describe a stage that discards items not satisfying a condition.
+    :param condition: A function that will determine True to pass and False to discard.
+    :return: A stage descriptor.
+    """
+    return ("filter", condition)
+
+
+def fork_stage(*prongs: Callable) -> tuple:
+    """
+    Describe a stage emulating an if, elif, else sequence. Prongs are parsed as
+    (condition1, action1, . . ., conditionN, actionN) with an optional trailing else action.
+    :param prongs: The conditions and actions of the fork.
+    :return: A stage descriptor.
+    """
+    return ("fork", *prongs)
+
+
+def fork_by_stage(key: Callable, branches: dict, default: Callable = None) -> tuple:
+    """
+    Describe a stage that picks the action for each item with a single lookup of its key.
+    :param key: A function computing the key of an item.
+    :param dict branches: A mapping of keys to actions.
+    :param default: The action for keys not in branches. Defaults to passing the item unchanged.
+    :return: A stage descriptor.
+    """
+    return ("fork_by", key, branches.get, default)
+
+
+def fork_action(action: Callable) -> Callable:
+    """
+    Adapt a fork action so a Pipe is evaluated on the single item it is given.
+    :param action: An action of a fork.
+    :return: A callable returning the evaluated item.
+    """
+    if isinstance(action, CallableStream):
+        return lambda item: next(action(item))
+    return action
+
+
+def _emit_stage(kind: str, n: int, name: str) -> list:
+    """
+    Generate the source lines for a single stage of a fused loop.
+    :param str kind: The kind of stage.
+    :param int n: The number of callables the stage holds.
+    :param str name: The prefix of the argument names holding the callables.
+    :return: A list of source lines.
+    """
+    if kind == "map":
+        return [f"item = {name}_0(item)"]
+    if kind == "filter":
+        return [f"if not {name}_0(item):", "    continue"]
+
+    if kind == "fork_by":
+        return [
+            f"branch = {name}_1({name}_0(item), {name}_2)",
+            "if branch is not None:",
+            "    item = branch(item)",
+        ]
+
+    lines = []
+    for i in range(0, n - n % 2, 2):
+        lines.append(f"{'if' if i == 0 else 'elif'} {name}_{i}(item):")
+        lines.append(f"    item = {name}_{i + 1}(item)")
+    if n % 2:
+        lines.append("else:")
+        lines.append(f"    item = {name}_{n - 1}(item)")
+    return lines
+
+
+@lru_cache(maxsize=None)
+def compile_loop(shape: tuple, terminal: str = ITERATE) -> Callable:
+    """
+    Compile a sequence of stage shapes into a single Python loop. Compiled loops are cached by shape so
+    pipelines of the same structure share code.
+    :param tuple shape: A tuple of (kind, number of callables) pairs.
+    :param str terminal: The terminal mode to compile for.
+    :return: A function accepting a source iterator followed by the stage callables.
+    """
+    setup, emit, finish = TERMINALS[terminal]
+    names = [f"s{i}" for i in range(len(shape))]
+    params = ["source"] + [
+        f"{name}_{j}" for name, (_, n) in zip(names, shape) for j in range(n)
+    ]
+
+    body = []
+    for name, (kind, n) in zip(names, shape):
+        body.extend(_emit_stage(kind, n, name))
+    body.append(emit)
+
+    lines = [f"def fused({', '.join(params)}):"]
+    lines.extend(f"    {line}" for line in setup)
+    lines.append("    for item in source:")
+    lines.extend(f"        {line}" for line in body)
+    lines.extend(f"    {line}" for line in finish)
+    source = "\n".join(lines) + "\n"
+
+    namespace = {}
+    exec(  # pylint: disable=exec-used
+        compile(source, f"<fused {terminal} loop>", "exec"), namespace
+    )
+    return namespace["fused"]
+
+
+@lru_cache(maxsize=None)
+def compile_step_factory(kind: str, n: int) -> Callable:
+    """
+    Compile a single map, fork or fork_by stage shape into a factory of single item functions.
+    :param str kind: The kind of stage.
+    :param int n: The number of callables the stage holds.
+    :return: A function accepting the stage callables and returning a function of one item.
+    """
+    params = [f"s0_{j}" for j in range(n)]
+    lines = [f"def make({', '.join(params)}):", "    def step(item):"]
+    lines.extend(f"        {line}" for line in _emit_stage(kind, n, "s0"))
+    lines.extend(["        return item", "    return step"])
+
+    namespace = {}
+    exec(  # pylint: disable=exec-used
+        compile("\n".join(lines) + "\n", f"<{kind} step>", "exec"), namespace
+    )
+    return namespace["make"]
+
+
+def compile_step(stage: tuple) -> Callable:
+    """
+    Compile a map, fork or fork_by stage into a function of one item. The dispatch of a fork is built once rather
+    than per item.
+    :param tuple stage: The stage descriptor.
+    :return: A function evaluating the stage on one item.
+    """
+    return compile_step_factory(stage[0], len(stage) - 1)(*stage[1:])
+
+
+def fused(stages: tuple, source: Iterator, terminal: str = ITERATE):
+    """
+    Run a source through a sequence of stages as a single compiled loop.
+    :param tuple stages: The stage descriptors to evaluate in order.
+    :param source: The iterator feeding the loop.
+    :param str terminal: The terminal mode. ITERATE returns a generator, COLLECT a list and DRAIN None.
+    :return: The output of the compiled loop.
+    """
+    loop = compile_loop(tuple((stage[0], len(stage) - 1) for stage in stages), terminal)
+    return loop(source, *(action for stage in stages for action in stage[1:]))
@@ -0,0 +1,197 @@
+import contextvars
+import time
+from collections import deque
+from typing import Callable
+
+# The default number of recent per-item latencies kept by each stage for percentiles.
+WINDOW = 1024
+
+
+class StageMetrics:
+    """
+    The counters of one stage of a pipeline. A stage is measured by the time taken to pull each item out of it, less
+    the time spent pulling from the metered stage it wraps, so each stage is charged only for its own work. The
+    wrapped stage is found as items are pulled, as the probe that runs within a pull of this one.
+    """
+
+    def __init__(self, name: str, window: int = WINDOW):
+        self.name = name
+        self.upstream = None
+        self.items_out = 0
+        self.time = 0.0
+        self.await_time = 0.0
+        self.latencies = deque(maxlen=window)
+
+    def record(self, elapsed: float, produced: bool):
+        """
+        Record a pull from the stage.
+        :param float elapsed: The seconds the pull took, less the time spent in the upstream stage.
+        :param bool produced: The pull produced an item rather than ending the stage.
+        :return: None.
+        """
+        self.time += elapsed
+        if produced:
+            self.items_out += 1
+            self.latencies.append(elapsed)
+
+    def snapshot(self) -> dict:
+        """
+        Snapshot the counters of the stage.
+        :return: A dict of items in and out, seconds spent, the p50 and p99 per-item latency in seconds and seconds
+        spent awaiting async actions. items_in is None until an upstream stage is metered.
+        """
+        latencies = sorted(self.latencies)
+        n = len(latencies)
+        return {
+            "items_in": None if self.upstream is None else self.upstream.items_out,
+            "items_out": self.items_out,
+            "time": self.time,
+            "p50": latencies[(n - 1) // 2] if n else None,
+            "p99": latencies[min(n - 1, int(n * 0.99))] if n else None,
+            "await_time": self.await_time,
+        }
+
+
+# The pull in progress in the current context, so a nested pull can charge its time to the pull it runs within.
+PULL = contextvars.ContextVar("PULL", default=None)
+
+
+class Pull:
+    """
+    A single pull of an item from a metered stage, timed as a context manager. Pulls run within it, by the stages it
+    wraps, add their time to nested and are taken as its upstream.
+    """
+
+    __slots__ = ("stage", "nested", "produced", "outer", "start")
+
+    def __init__(self, stage: StageMetrics):
+        self.stage = stage
+        self.nested = 0.0
+        self.produced = False
+
+    def __enter__(self):
+        self.outer = PULL.get()
+        PULL.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        # Restored rather than reset, as an abandoned async pull may be closed from another context
+        PULL.set(self.outer)
+        self.stage.record(elapsed - self.nested, self.produced)
+
+        outer = self.outer
+        if outer is not None:
+            outer.nested += elapsed
+            if outer.stage.upstream is None:
+                outer.stage.upstream = self.stage
+        return False
+
+
+class PipelineMetrics:
+    """
+    Per-stage counters of a pipeline, filled by the probes of Stream.metered(), Riverbed.metered() and
+    Pipe.instrument(). The callback is checked as items are pulled, so a stalled pipeline does not report until items
+    flow again.
+    """
+
+    def __init__(
+        self, callback: Callable = None, interval: float = 1.0, window: int = WINDOW
+    ):
+        self.__callback = callback
+        self.__interval = interval
+        self.__window = window
+        self.__stages = {}
+        self.__reported = time.perf_counter()
+
+    def stage(self, name: str) -> StageMetrics:
+        """
+        Get the counters of a stage, creating them if new.
+        :param str name: The name of the stage.
+        :return: The StageMetrics of the stage.
+        """
+        stage = self.__stages.get(name)
+        if stage is None:
+            stage = StageMetrics(name, self.__window)
+            self.__stages[name] = stage
+        return stage
+
+    def tick(self, now: float):
+        """
+        Call the callback with a snapshot if interval seconds have passed since it was last called.
+        :param float now: The current time of time.perf_counter().
+        :return: None.
+        """
+        if self.__callback is not None and now - self.__reported >= self.__interval:
+            self.__reported = now
+            self.__callback(self.snapshot())
+
+    def snapshot(self) -> dict:
+        """
+        Snapshot the counters of every stage.
+        :return: A dict of stage names to dicts of their counters, in the order the stages were created.
+        """
+        return {name: stage.snapshot() for name, stage in self.__stages.items()}
+
+
+class MeteredIterator:
+    """
+    An iterator recording each item pulled through it into a StageMetrics.
+    """
+
+    def __init__(self, items, metrics: PipelineMetrics, stage: StageMetrics):
+        self.__items = iter(items)
+        self.__metrics = metrics
+        self.__stage = stage
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with Pull(self.__stage) as pull:
+            item = next(self.__items)
+            pull.produced = True
+        self.__metrics.tick(time.perf_counter())
+        return item
+
+
+class AsyncMeteredIterator:
+    """
+    An async iterator recording each item pulled through it into a StageMetrics. Times are wall clock, so a stage
+    is also charged for the time the event loop spends elsewhere while it waits. Each task pulls in its own context,
+    so concurrent pulls are not charged to each other.
+    """
+
+    def __init__(self, items, metrics: PipelineMetrics, stage: StageMetrics):
+        self.__items = items.__aiter__()
+        self.__metrics = metrics
+        self.__stage = stage
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        with Pull(self.__stage) as pull:
+            item = await self.__items.__anext__()
+            pull.produced = True
+        self.__metrics.tick(time.perf_counter())
+        return item
+
+
+def timed_action(action: Callable, stage: StageMetrics) -> Callable:
+    """
+    Wrap an async action to add the seconds spent awaiting it to a stage. Calls in flight at once are each counted.
+    :param action: An async callable.
+    :param StageMetrics stage: The counters of the stage evaluating the action.
+    :return: An async callable.
+    """
+
+    async def timed(item):
+        start = time.perf_counter()
+        try:
+            return await action(item)
+        finally:
+            stage.await_time += time.perf_counter() - start
+
+    return timed
@@ -0,0 +1,105 @@
+from collections import deque
+from concurrent.futures import (FIRST_COMPLETED, Executor, ThreadPoolExecutor,
+                                wait)
+from typing import Callable, Generator, Iterable
+
+from modules.chunk import Chunk
+
+THREAD_POOLS = {}
+
+
+def shared_thread_pool(max_workers: int) -> ThreadPoolExecutor:
+    """
+    Get the thread pool shared by every threaded stage with the same number of workers.
+    :param int max_workers: The number of threads in the pool.
+    :return: A ThreadPoolExecutor.
+    """
+    pool = THREAD_POOLS.get(max_workers)
+    if pool is None:
+        pool = ThreadPoolExecutor(max_workers, thread_name_prefix="PyStream")
+        THREAD_POOLS[max_workers] = pool
+    return pool
+
+
+def map_chunk(action: Callable, chunk: Chunk) -> Chunk:
+    """
+    Map an action onto a chunk. Defined at module level so it can be sent to worker processes.
+    :param action: A callable to evaluate on each item.
+    :param Chunk chunk: The chunk to map onto.
+    :return: A Chunk with the data evaluated by the action.
+    """
+    return chunk.map(action)
+
+
+def _ordered_map(
+    executor: Executor, action: Callable, items: Iterable, in_flight: int
+) -> Generator:
+    """
+    Evaluate an action on an executor yielding results in the order of the items.
+    :param executor: The executor to submit to.
+    :param action: A callable to evaluate on each item.
+    :param items: The items to evaluate.
+    :param int in_flight: The maximum number of pending evaluations.
+    :return: A generator of results.
+    """
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(action, item))
+            if len(pending) >= in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _unordered_map(
+    executor: Executor, action: Callable, items: Iterable, in_flight: int
+) -> Generator:
+    """
+    Evaluate an action on an executor yielding results as they complete.
+    :param executor: The executor to submit to.
+    :param action: A callable to evaluate on each item.
+    :param items: The items to evaluate.
+    :param int in_flight: The maximum number of pending evaluations.
+    :return: A generator of results.
+    """
+    pending = set()
+    try:
+        for item in items:
+            pending.add(executor.submit(action, item))
+            if len(pending) >= in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def executor_map(
+    executor: Executor,
+    action: Callable,
+    items: Iterable,
+    in_flight: int,
+    ordered: bool = True,
+) -> Generator:
+    """
+    Evaluate an action on each item using an executor. Items are only pulled from the source while fewer than
+    in_flight evaluations are pending so memory stays bounded on infinite sources.
+    :param executor: The executor to submit to.
+    :param action: A callable to evaluate on each item.
+    :param items: The items to evaluate.
+    :param int in_flight: The maximum number of pending evaluations.
+    :param bool ordered: Yield results in the order of the items if True, else as they complete.
+    :return: A generator of results.
+    """
+    if ordered:
+        return _ordered_map(executor, action, items, in_flight)
+    return _unordered_map(executor, action, items, in_flight)
@@ -0,0 +1,287 @@
+import asyncio
+import pickle
+import tempfile
+import time
+from collections import deque
+
+BLOCK = "block"
+DROP_OLDEST = "drop-oldest"
+DROP_NEWEST = "drop-newest"
+SPILL = "spill"
+OVERFLOWS = (BLOCK, DROP_OLDEST, DROP_NEWEST, SPILL)
+
+# Returned by get() once the queue is closed and empty.
+CLOSED = object()
+
+
+class SpillFile:
+    """
+    A FIFO of pickled items on disk.
+    """
+
+    def __init__(self, directory: str = None):
+        self.__directory = directory
+        self.__fp = None
+        self.__read_position = 0
+        self.__count = 0
+
+    def __len__(self):
+        return self.__count
+
+    def push(self, item):
+        """
+        Write an item to the end of the file.
+        :param item: A picklable item.
+        :return: None.
+        """
+        if self.__fp is None:
+            self.__fp = tempfile.TemporaryFile(dir=self.__directory)
+        self.__fp.seek(0, 2)
+        pickle.dump(item, self.__fp, pickle.HIGHEST_PROTOCOL)
+        self.__count += 1
+
+    def pop(self):
+        """
+        Read the oldest item from the file. The file is truncated once every item has been read.
+        :return: The oldest item.
+        """
+        self.__fp.seek(self.__read_position)
+        item = pickle.load(self.__fp)
+        self.__read_position = self.__fp.tell()
+        self.__count -= 1
+
+        if self.__count == 0:
+            self.__fp.seek(0)
+            self.__fp.truncate()
+            self.__read_position = 0
+        return item
+
+    def close(self):
+        """
+        Close and remove the file.
+        :return: None.
+        """
+        if self.__fp is not None:
+            self.__fp.close()
+            self.__fp = None
+        self.__count = 0
+        self.__read_position = 0
+
+
+class BoundedQueue:
+    """
+    An asyncio FIFO queue with watermark backpressure and overflow strategies. A maxsize of 0 is unbounded.
+
+    Producers using the block strategy pause once the depth reaches the high watermark and resume once the consumer
+    drains it to the low watermark. The other strategies act once the depth reaches maxsize: drop-oldest discards the
+    head of the queue, drop-newest discards the incoming item and spill writes it to a temporary file on disk.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        high_watermark: int = None,
+        low_watermark: int = None,
+        overflow: str = BLOCK,
+        spill_dir: str = None,
+    ):
+        if overflow not in OVERFLOWS:
+            raise ValueError(f"overflow must be one of {OVERFLOWS}, got {overflow!r}.")
+        if maxsize and high_watermark is not None and high_watermark > maxsize:
+            raise ValueError(
+                f"high_watermark must be at most maxsize {maxsize}, got {high_watermark}."
+            )
+
+        self.__items = deque()
+        self.__maxsize = maxsize
+        self.__high = high_watermark or maxsize
+        self.__low = self.__high // 2 if low_watermark is None else low_watermark
+        if self.__high and not 0 <= self.__low < self.__high:
+            raise ValueError(
+                f"low_watermark must be below high_watermark {self.__high}, got {self.__low}."
+            )
+        self.__overflow = overflow
+        self.__spill = SpillFile(spill_dir) if overflow == SPILL else None
+        self.__closed = False
+        self.__paused = False
+        self.__resume = asyncio.Event()
+        self.__not_empty = asyncio.Event()
+
+        self.__max_depth = 0
+        self.__dropped = 0
+        self.__spilled = 0
+        self.__waits = 0
+        self.__wait_time = 0.0
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __full(self) -> bool:
+        """
+        Check if the in memory queue is at capacity.
+        :return: True if a bounded queue holds maxsize items.
+        """
+        return 0 < self.__maxsize <= len(self.__items)
+
+    async def __backpressure(self):
+        """
+        Wait while the queue is paused above the low watermark.
+        :return: None.
+        """
+        start = time.monotonic()
+        self.__waits += 1
+        while self.__paused:
+            await self.__resume.wait()
+        self.__wait_time += time.monotonic() - start
+
+    async def put(self, item):
+        """
+        Put an item into the queue applying the overflow strategy if it is full.
+        :param item: The item to enqueue.
+        :return: None.
+        """
+        if self.__paused:
+            await self.__backpressure()
+
+        if self.__spill is not None and (len(self.__spill) or self.__full()):
+            self.__spill.push(item)
+            self.__spilled += 1
+            self.__not_empty.set()
+            return
+        if self.__overflow == DROP_NEWEST and self.__full():
+            self.__dropped += 1
+            return
+        if self.__overflow == DROP_OLDEST and self.__full():
+            self.__items.popleft()
+            self.__dropped += 1
+
+        self.__items.append(item)
+        self.__not_empty.set()
+        self.__max_depth = max(self.__max_depth, len(self.__items))
+
+        if self.__overflow == BLOCK and 0 < self.__high <= len(self.__items):
+            self.__paused = True
+            self.__resume.clear()
+
+    async def __put_blocking(self, items: list):
+        """
+        Put a batch of items into a queue using the block strategy, waiting for the consumer whenever the depth
+        reaches the high watermark so the queue never holds more.
+        :param list items: The items to enqueue.
+        :return: None.
+        """
+        start = 0
+        while start < len(items):
+            if self.__paused:
+                await self.__backpressure()
+
+            room = self.__high - len(self.__items) if self.__high else len(items)
+            self.__items.extend(items[start : start + room])
+            start += room
+            self.__not_empty.set()
+            self.__max_depth = max(self.__max_depth, len(self.__items))
+
+            if 0 < self.__high <= len(self.__items):
+                self.__paused = True
+                self.__resume.clear()
+
+    async def put_many(self, items: list):
+        """
+        Put a batch of items into the queue with a single wakeup of the consumer, applying the overflow strategy to
+        the items that do not fit.
+        :param list items: The items to enqueue.
+        :return: None.
+        """
+        if self.__overflow == BLOCK:
+            await self.__put_blocking(items)
+            return
+        if self.__paused:
+            await self.__backpressure()
+
+        if self.__maxsize:
+            room = max(self.__maxsize - len(self.__items), 0)
+        else:
+            room = len(items)
+
+        if self.__spill is not None:
+            room = 0 if len(self.__spill) else room
+            for item in items[room:]:
+                self.__spill.push(item)
+            self.__spilled += max(len(items) - room, 0)
+            items = items[:room]
+        elif self.__overflow == DROP_NEWEST:
+            self.__dropped += max(len(items) - room, 0)
+            items = items[:room]
+
+        self.__items.extend(items)
+        while self.__overflow == DROP_OLDEST and 0 < self.__maxsize < len(self.__items):
+            self.__items.popleft()
+            self.__dropped += 1
+
+        self.__not_empty.set()
+        self.__max_depth = max(self.__max_depth, len(self.__items))
+
+    async def get(self):
+        """
+        Get the oldest item of the queue waiting for one if empty.
+        :return: The oldest item, or CLOSED once the queue is closed and empty.
+        """
+        while not self.__items:
+            if self.__spill is not None and len(self.__spill):
+                return self.__spill.pop()
+            if self.__closed:
+                if self.__spill is not None:
+                    self.__spill.close()
+                return CLOSED
+            self.__not_empty.clear()
+            await self.__not_empty.wait()
+
+        item = self.__items.popleft()
+        if self.__paused and len(self.__items) <= self.__low:
+            self.__paused = False
+            self.__resume.set()
+        return item
+
+    async def get_many(self, limit: int = None):
+        """
+        Get every item available in the queue, up to limit, waiting for at least one if empty.
+        :param int limit: The maximum number of items to get. Defaults to all available.
+        :return: A list of the oldest items, or CLOSED once the queue is closed and empty.
+        """
+        if not self.__items:
+            item = await self.get()
+            return item if item is CLOSED else [item]
+
+        if limit is None or limit >= len(self.__items):
+            items = list(self.__items)
+            self.__items.clear()
+        else:
+            items = [self.__items.popleft() for _ in range(limit)]
+
+        if self.__paused and len(self.__items) <= self.__low:
+            self.__paused = False
+            self.__resume.set()
+        return items
+
+    def close(self):
+        """
+        Mark that no more items will be put. Consumers receive CLOSED once the queue is drained.
+        :return: None.
+        """
+        self.__closed = True
+        self.__not_empty.set()
+
+    def metrics(self) -> dict:
+        """
+        Snapshot the state of the queue.
+        :return: A dict of queue depth, drops, spills and producer wait time in seconds.
+        """
+        return {
+            "depth": len(self.__items),
+            "max_depth": self.__max_depth,
+            "spilled": self.__spilled,
+            "spill_depth": len(self.__spill) if self.__spill is not None else 0,
+            "dropped": self.__dropped,
+            "producer_waits": self.__waits,
+            "producer_wait_time": self.__wait_time,
+        }
@@ -0,0 +1,83 @@
+import heapq
+import sys
+from typing import Callable, Iterable, Iterator
+
+from modules.utilities.queueTools import SpillFile
+
+# Items pickled together when writing a sorted run to disk.
+RUN_BLOCK_SIZE = 4096
+
+
+def spill_run(run: list, spill_dir: str = None) -> SpillFile:
+    """
+    Write a sorted run to a temporary file in blocks of items.
+    :param list run: The sorted items.
+    :param str spill_dir: The directory to write the file in. Defaults to the system temporary directory.
+    :return: A SpillFile of blocks of the run.
+    """
+    spill = SpillFile(spill_dir)
+    for i in range(0, len(run), RUN_BLOCK_SIZE):
+        spill.push(run[i : i + RUN_BLOCK_SIZE])
+    return spill
+
+
+def read_run(spill: SpillFile) -> Iterator:
+    """
+    Read a sorted run back from its temporary file a block at a time, removing the file once read.
+    :param SpillFile spill: The blocks of the run.
+    :return: An iterator of the items of the run.
+    """
+    try:
+        while len(spill):
+            yield from spill.pop()
+    finally:
+        spill.close()
+
+
+def external_sort(
+    items: Iterable,
+    key: Callable = None,
+    reverse: bool = False,
+    memory_limit: int = None,
+    spill_dir: str = None,
+) -> Iterator:
+    """
+    Sort items holding roughly memory_limit bytes of them at a time. Items are sorted in runs that are spilled to
+    temporary files once the shallow size of the run reaches memory_limit, and the runs are merged lazily. The sort is
+    stable. Items must be picklable if spilled.
+    :param items: The items to sort.
+    :param key: A function computing the sort key of an item. Defaults to the item.
+    :param bool reverse: Sort in descending order.
+    :param int memory_limit: The approximate number of bytes of items held in memory. Defaults to unbounded.
+    :param str spill_dir: The directory to write runs in. Defaults to the system temporary directory.
+    :return: An iterator of the sorted items.
+    """
+    if memory_limit is None:
+        yield from sorted(items, key=key, reverse=reverse)
+        return
+
+    runs = []
+    run = []
+    size = 0
+    try:
+        for item in items:
+            run.append(item)
+            size += sys.getsizeof(item)
+            if size >= memory_limit:
+                run.sort(key=key, reverse=reverse)
+                runs.append(spill_run(run, spill_dir))
+                run = []
+                size = 0
+
+        run.sort(key=key, reverse=reverse)
+        if not runs:
+            yield from run
+            return
+
+        # Ties resolve to the earliest run so the merge keeps the sort stable
+        yield from heapq.merge(
+            *map(read_run, runs), iter(run), key=key, reverse=reverse
+        )
+    finally:
+        for spill in runs:
+            spill.close()
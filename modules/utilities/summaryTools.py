@@ -0,0 +1,124 @@
+import heapq
+import math
+import random
+from itertools import count
+from typing import Callable
+
+from modules.chunk import Chunk
+
+MASK64 = (1 << 64) - 1
+
+
+def mix64(x: int) -> int:
+    """
+    Scramble the bits of an integer so nearby hashes land far apart, as the hashes of small ints are the ints.
+    :param int x: A hash.
+    :return: A well distributed 64 bit integer.
+    """
+    x &= MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+class TopK:
+    """
+    The k largest items seen, kept in a bounded min heap. Ties keep the item seen first.
+    """
+
+    def __init__(self, k: int, key: Callable = None):
+        self.__k = k
+        self.__key = key
+        self.__heap = []
+        self.__order = count()
+
+    def push(self, item):
+        if self.__k <= 0:
+            return
+        entry = (
+            item if self.__key is None else self.__key(item),
+            -next(self.__order),
+            item,
+        )
+        if len(self.__heap) < self.__k:
+            heapq.heappush(self.__heap, entry)
+        elif entry[0] > self.__heap[0][0]:
+            heapq.heapreplace(self.__heap, entry)
+
+    def value(self) -> Chunk:
+        return Chunk.from_iterable(
+            entry[2] for entry in sorted(self.__heap, reverse=True)
+        )
+
+
+class Reservoir:
+    """
+    A uniform sample of n of the items seen. Uses Algorithm L, which draws random numbers only when an item is
+    accepted rather than for every item.
+    """
+
+    def __init__(self, n: int, seed=None):
+        self.__n = n
+        self.__random = random.Random(seed)
+        self.__sample = []
+        self.__seen = 0
+        self.__weight = 1.0
+        self.__next = n - 1
+
+    def __skip(self):
+        self.__weight *= math.exp(math.log(self.__random.random()) / self.__n)
+        self.__next += (
+            math.floor(math.log(self.__random.random()) / math.log1p(-self.__weight))
+            + 1
+        )
+
+    def push(self, item):
+        if self.__n <= 0:
+            return
+        if self.__seen < self.__n:
+            self.__sample.append(item)
+            self.__seen += 1
+            if self.__seen == self.__n:
+                self.__skip()
+            return
+
+        if self.__seen == self.__next:
+            self.__sample[self.__random.randrange(self.__n)] = item
+            self.__skip()
+        self.__seen += 1
+
+    def value(self) -> Chunk:
+        return Chunk.from_iterable(self.__sample)
+
+
+class HyperLogLog:
+    """
+    An estimate of the number of distinct items seen in 2**precision bytes. The relative error is about
+    1.04 / sqrt(2**precision), 1.6% at the default precision of 12. Items must be hashable.
+    """
+
+    def __init__(self, precision: int = 12, key: Callable = None):
+        if not 4 <= precision <= 18:
+            raise ValueError(f"precision must be between 4 and 18, got {precision}.")
+        self.__key = key
+        self.__registers = bytearray(1 << precision)
+        self.__width = 64 - precision
+        self.__low = (1 << self.__width) - 1
+
+    def push(self, item):
+        h = mix64(hash(item if self.__key is None else self.__key(item)))
+        index = h >> self.__width
+        rank = self.__width - (h & self.__low).bit_length() + 1
+        if rank > self.__registers[index]:
+            self.__registers[index] = rank
+
+    def value(self) -> int:
+        m = len(self.__registers)
+        estimate = (0.7213 / (1 + 1.079 / m)) * m * m
+        estimate /= sum(2.0**-rank for rank in self.__registers)
+
+        # Small cardinalities are estimated more accurately by the share of empty registers
+        zeros = self.__registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
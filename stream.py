@@ -2,11 +2,13 @@
 A set of data structures for processing data utilizing lazy evaluation.
 """
 
-from modules.chunk import Chunk
+from modules.chunk import Chunk, NumericChunk
 from modules.confluence import Confluence
 from modules.pipe import Pipe
 from modules.riverbed import Riverbed
 from modules.spring import Spring
 from modules.stream import Stream
+from modules.utilities.cacheTools import AsyncCachedAction, CachedAction
+from modules.utilities.metricsTools import PipelineMetrics
 
 # A file to make top objects available with the call of stream vs the full class path.
@@ -1,6 +1,18 @@
 import sys
 
-from stream import Pipe, Stream
+from modules.chunk import Chunk
+from modules.utilities.bufferTools import ayield_buffered, yield_buffered
+from stream import Pipe, Riverbed, Stream
+
+LINES = "lines"
+BYTES = "bytes"
+MODES = (LINES, BYTES)
+
+# The default number of bytes read from stdin at once.
+BLOCK_SIZE = 1 << 16
+
+# The default number of items buffered by stdout and stderr writers.
+FLUSH_SIZE = 4096
 
 
 def yield_input():
@@ -8,36 +20,176 @@ def yield_input():
     Open the stdin and read lines to as a generator. Dies at EOF.
     :return: A generator taking in the stdin.
     """
-    while 1:
-        try:
-            content = input()
-        except EOFError:
+    for lines in yield_line_blocks(sys.stdin.buffer):
+        yield from lines
+
+
+def yield_blocks(buffer, block_size: int = BLOCK_SIZE):
+    """
+    Read a binary file in blocks as a generator. Returns whatever is available up to block_size bytes rather than
+    waiting for a full block. Dies at EOF.
+    :param buffer: The binary file to read.
+    :param int block_size: The most bytes in a block.
+    :return: A generator of bytes.
+    """
+    read = buffer.read1 if hasattr(buffer, "read1") else buffer.read
+    while True:
+        block = read(block_size)
+        if not block:
             break
-        except Exception as e:
-            raise e
+        yield block
+
 
-        yield content
+def yield_line_blocks(buffer, block_size: int = BLOCK_SIZE, encoding: str = "utf-8"):
+    """
+    Read a binary file in blocks and split each block into lines at once, as a generator of lists of lines without
+    their newline, which is "\n" or "\r\n". A line cut by the end of a block is carried into the next. Dies at EOF.
+    :param buffer: The binary file to read.
+    :param int block_size: The most bytes read at once.
+    :param str encoding: The encoding to decode lines with.
+    :return: A generator of lists of lines.
+    """
+    parts = []
+    for block in yield_blocks(buffer, block_size):
+        end = block.rfind(b"\n")
+        if end < 0:
+            parts.append(block)
+            continue
+        parts.append(block[: end + 1])
+        lines = b"".join(parts).decode(encoding).replace("\r\n", "\n").split("\n")
+        lines.pop()
+        parts = [block[end + 1 :]]
+        yield lines
 
+    last = b"".join(parts).decode(encoding)
+    if last:
+        yield [last[:-1] if last.endswith("\r") else last]
 
-def stream_stdin() -> Stream:
+
+def stream_stdin(
+    mode: str = LINES,
+    block_size: int = BLOCK_SIZE,
+    chunked: bool = False,
+    encoding: str = "utf-8",
+    buffer=None,
+) -> Stream:
     """
-    Open the stdin and read lines to a Stream. Dies at EOF.
+    Open the stdin and read it to a Stream in blocks of up to block_size bytes. Dies at EOF.
+    :param str mode: "lines" to pass each line without its newline or "bytes" to pass each block as bytes.
+    :param int block_size: The most bytes read at once.
+    :param bool chunked: Pass the lines of each block as a Chunk rather than one at a time. Only used by lines.
+    :param str encoding: The encoding to decode lines with. Only used by lines.
+    :param buffer: A binary file to read instead of stdin.
     :return: A stream taking in the stdin.
     """
-    return Stream(yield_input())
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}.")
+
+    buffer = sys.stdin.buffer if buffer is None else buffer
+    if mode == BYTES:
+        return Stream(yield_blocks(buffer, block_size))
+
+    blocks = yield_line_blocks(buffer, block_size, encoding)
+    if chunked:
+        return Stream(map(Chunk.from_iterable, blocks))
+    return Stream(line for lines in blocks for line in lines)
+
+
+def yield_printed(items, file, end: str, flush_size: int, flush_interval: float = None):
+    """
+    Print each item, or the items of each Chunk, to a text file as a generator passing the items on. Items are
+    gathered into a buffer written and flushed with one write() call.
+    :param items: The items to print.
+    :param file: The text file to print to, or a callable returning it when each buffer is written.
+    :param str end: The string written after each item.
+    :param int flush_size: The number of items buffered before writing.
+    :param float flush_interval: The most seconds an item waits in the buffer, checked as items arrive.
+    :return: A generator of the items.
+    """
+    get_file = file if callable(file) else lambda: file
+
+    def write(buffer: list):
+        out = get_file()
+        out.write(end.join(map(str, buffer)) + end)
+        out.flush()
+
+    return yield_buffered(items, write, flush_size, flush_interval)
+
+
+def ayield_printed(
+    items, file, end: str, flush_size: int, flush_interval: float = None
+):
+    """
+    Print each item, or the items of each Chunk, to a text file as an async generator passing the items on. Behaves
+    as yield_printed().
+    :param items: The async iterable of items to print.
+    :param file: The text file to print to, or a callable returning it when each buffer is written.
+    :param str end: The string written after each item.
+    :param int flush_size: The number of items buffered before writing.
+    :param float flush_interval: The most seconds an item waits in the buffer, checked as items arrive.
+    :return: An async generator of the items.
+    """
+    get_file = file if callable(file) else lambda: file
+
+    async def write(buffer: list):
+        out = get_file()
+        out.write(end.join(map(str, buffer)) + end)
+        out.flush()
+
+    return ayield_buffered(items, write, flush_size, flush_interval)
+
+
+def pipe_print(
+    file, end: str = "\n", flush_size: int = FLUSH_SIZE, flush_interval: float = None
+) -> Pipe:
+    """
+    Opens a pipe that prints each item, or the items of Chunks, to a text file in batches of flush_size.
+    :param file: The text file to print to, or a callable returning it when each buffer is written.
+    :param str end: The string written after each item.
+    :param int flush_size: The number of items buffered before writing. 1 writes and flushes every item.
+    :param float flush_interval: The most seconds an item waits in the buffer, checked as items arrive. Defaults to
+    waiting for flush_size items.
+    :return: A pipe to the file.
+    """
+
+    def write(items):
+        """
+        Helper function to print the items of a Stream or Riverbed.
+        :param items: The iterator, or async iterator, of the items.
+        :return: A Stream or Riverbed of the printed items.
+        """
+        if hasattr(items, "__aiter__"):
+            return Riverbed(
+                ayield_printed(items, file, end, flush_size, flush_interval)
+            )
+        return Stream(yield_printed(items, file, end, flush_size, flush_interval))
+
+    return Pipe().flat_map(write)
 
 
-def pipe_stdout() -> Pipe:
+def pipe_stdout(
+    end: str = "\n", flush_size: int = FLUSH_SIZE, flush_interval: float = None
+) -> Pipe:
     """
-    Opens a pipe that writes to stdout.
+    Opens a pipe that writes to stdout in batches of flush_size items. sys.stdout is looked up as each buffer is
+    written, so the pipe follows any redirection made after it is built.
+    :param str end: The string written after each item.
+    :param int flush_size: The number of items buffered before writing. 1 writes and flushes every item.
+    :param float flush_interval: The most seconds an item waits in the buffer, checked as items arrive.
     :return: A pipe to stdout.
     """
-    return Pipe().through(lambda x: print(x, file=sys.stdout))
+    return pipe_print(lambda: sys.stdout, end, flush_size, flush_interval)
 
 
-def pipe_stderr() -> Pipe:
+def pipe_stderr(
+    end: str = "\n", flush_size: int = 1, flush_interval: float = None
+) -> Pipe:
     """
-    Opens a pipe that writes to stderr.
+    Opens a pipe that writes to stderr. Writes every item as it arrives by default. sys.stderr is looked up as each
+    buffer is written, so the pipe follows any redirection made after it is built.
+    :param str end: The string written after each item.
+    :param int flush_size: The number of items buffered before writing.
+    :param float flush_interval: The most seconds an item waits in the buffer, checked as items arrive.
     :return: A pipe to stderr.
     """
-    return Pipe().through(lambda x: print(x, file=sys.stderr))
+    return pipe_print(lambda: sys.stderr, end, flush_size, flush_interval)
@@ -0,0 +1,187 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import queue
+import threading
+import zlib
+from functools import partial
+
+AUTO = "auto"
+GZIP = "gzip"
+BZ2 = "bz2"
+XZ = "xz"
+
+COMPRESSIONS = {GZIP: gzip, BZ2: bz2, XZ: lzma}
+EXTENSIONS = {".gz": GZIP, ".bz2": BZ2, ".xz": XZ, ".lzma": XZ}
+MAGIC = ((b"\x1f\x8b", GZIP), (b"BZh", BZ2), (b"\xfd7zXZ\x00", XZ))
+DECOMPRESSORS = {
+    GZIP: partial(zlib.decompressobj, 31),
+    BZ2: bz2.BZ2Decompressor,
+    XZ: partial(lzma.LZMADecompressor, lzma.FORMAT_XZ),
+}
+
+# The number of leading bytes of a file without a known extension test decompressed before it is read as compressed.
+SNIFF_SIZE = 4096
+
+# The default number of decompressed blocks read ahead by a BackgroundReader.
+PREFETCH = 4
+
+
+def sniff_compression(path: str):
+    """
+    Resolve the compression of a file from its leading magic bytes, confirmed by decompressing the start of the file
+    so plain files that happen to start with the same bytes are not taken as compressed.
+    :param str path: The path to the file.
+    :return: The name of the compression, or None.
+    """
+    with open(path, "rb") as fp:
+        head = fp.read(SNIFF_SIZE)
+    name = next((name for magic, name in MAGIC if head.startswith(magic)), None)
+    if name is None:
+        return None
+    try:
+        DECOMPRESSORS[name]().decompress(head, SNIFF_SIZE)
+    except (OSError, EOFError, zlib.error, lzma.LZMAError):
+        return None
+    return name
+
+
+def detect_compression(path: str, compression: str = AUTO, sniff: bool = True):
+    """
+    Resolve the compression of a file from its extension, then its leading magic bytes confirmed by a trial
+    decompression.
+    :param str path: The path to the file.
+    :param str compression: "auto" to detect, None for no compression, or one of "gzip", "bz2" or "xz".
+    :param bool sniff: Read the start of the file if the extension is not recognized.
+    :return: The compression module to open the file with, or None.
+    """
+    if compression is None:
+        return None
+    if compression != AUTO:
+        if compression not in COMPRESSIONS:
+            raise ValueError(
+                f"compression must be one of {(AUTO, None, *COMPRESSIONS)}, got {compression!r}."
+            )
+        return COMPRESSIONS[compression]
+
+    name = EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if name is None and sniff and os.path.isfile(path):
+        name = sniff_compression(path)
+    return None if name is None else COMPRESSIONS[name]
+
+
+class BackgroundReader(io.RawIOBase):
+    """
+    A binary file read ahead in blocks on a background thread so reading, and decompressing, the next blocks overlaps
+    with processing the current one. zlib, bz2 and lzma release the GIL while decompressing.
+    """
+
+    def __init__(self, fp, block_size: int, prefetch: int = PREFETCH):
+        super().__init__()
+        self.__fp = fp
+        self.__blocks = queue.Queue(prefetch)
+        self.__stopped = threading.Event()
+        self.__block = memoryview(b"")
+        self.__eof = False
+        self.__thread = threading.Thread(
+            target=self.__read_ahead, args=(block_size,), daemon=True
+        )
+        self.__thread.start()
+
+    def __put(self, block) -> bool:
+        """
+        Put a block into the queue unless the reader is closed first.
+        :param block: The block, an exception or b"" at EOF.
+        :return: True if the block was put.
+        """
+        while not self.__stopped.is_set():
+            try:
+                self.__blocks.put(block, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __read_ahead(self, block_size: int):
+        """
+        Read blocks from the file into the queue until EOF, an error or the reader is closed.
+        :param int block_size: The number of bytes read at once.
+        :return: None.
+        """
+        try:
+            while True:
+                block = self.__fp.read(block_size)
+                if not self.__put(block) or not block:
+                    return
+        except Exception as e:  # pylint: disable=broad-except
+            self.__put(e)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self.__block:
+            if self.__eof:
+                return 0
+            block = self.__blocks.get()
+            if isinstance(block, Exception):
+                raise block
+            if not block:
+                self.__eof = True
+                return 0
+            self.__block = memoryview(block)
+
+        n = min(len(buffer), len(self.__block))
+        buffer[:n] = self.__block[:n]
+        self.__block = self.__block[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.__stopped.set()
+            self.__thread.join()
+            self.__fp.close()
+        super().close()
+
+
+def open_binary(
+    path: str,
+    compression: str = AUTO,
+    threaded: bool = False,
+    block_size: int = io.DEFAULT_BUFFER_SIZE,
+    prefetch: int = PREFETCH,
+):
+    """
+    Open a file for reading bytes, decompressing it if compressed.
+    :param str path: The path to the file to open.
+    :param str compression: "auto" to detect, None for no compression, or one of "gzip", "bz2" or "xz".
+    :param bool threaded: Read and decompress the file ahead on a background thread.
+    :param int block_size: The number of bytes read at once.
+    :param int prefetch: The number of blocks read ahead by the background thread.
+    :return: A binary file.
+    """
+    module = detect_compression(path, compression)
+    fp = open(path, "rb") if module is None else module.open(path, "rb")
+    if not threaded:
+        return fp
+    return io.BufferedReader(BackgroundReader(fp, block_size, prefetch), block_size)
+
+
+def open_writer(path: str, mode: str = "w", compression: str = AUTO):
+    """
+    Open a file for writing, compressing it if its compression is given or detected from its extension.
+    :param str path: The path to the file to open.
+    :param str mode: The mode to open the file in.
+    :param str compression: "auto" to detect, None for no compression, or one of "gzip", "bz2" or "xz".
+    :return: A tuple of the file to write to and the underlying file on disk, which are the same if uncompressed.
+    Closing the file written to leaves the file on disk open.
+    """
+    module = detect_compression(path, compression, sniff=False)
+    if module is None:
+        fp = open(path, mode)
+        return fp, fp
+
+    raw = open(path, mode.replace("t", "").replace("b", "") + "b")
+    return module.open(raw, mode if "b" in mode else mode + "t"), raw
@@ -1,57 +1,643 @@
-from stream import Pipe, Stream
+import asyncio
+import glob
+import io
+import locale
+import mmap
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
+from modules.utilities.bufferTools import ayield_buffered, yield_buffered
+from stream import Confluence, Pipe, Riverbed, Stream
+from streamio.compression import (AUTO, detect_compression, open_binary,
+                                  open_writer)
 
-def yield_lines(path: str):
+LINES = "lines"
+BLOCKS = "blocks"
+MMAP = "mmap"
+RECORDS = "records"
+MODES = (LINES, BLOCKS, MMAP, RECORDS)
+
+# The default number of bytes read at once by the binary modes.
+BLOCK_SIZE = 1 << 20
+
+# The default number of items buffered by file writers.
+FLUSH_SIZE = 4096
+
+# The default number of lines read at once by multi-file readers.
+BATCH_SIZE = 1024
+
+# Marks the end of a file read by a multi-file reader.
+DONE = object()
+
+
+def yield_lines(
+    path: str, compression: str = None, threaded: bool = False, encoding: str = None
+):
     """
     Will open a file and read the lines as a generator.
     :param str path: The path to the file to open.
+    :param str compression: "auto" to detect, None for no compression, or one of "gzip", "bz2" or "xz".
+    :param bool threaded: Read and decompress the file ahead on a background thread.
+    :param str encoding: The encoding to decode lines with. Defaults to the locale encoding.
     :return: A generator of the file lines.
     """
-    with open(path, "r") as fp:
+    if compression is None and not threaded:
+        with open(path, "r", encoding=encoding) as fp:
+            for line in fp:
+                yield line
+        return
+
+    binary = open_binary(path, compression, threaded, BLOCK_SIZE)
+    with io.TextIOWrapper(binary, encoding=encoding) as fp:
         for line in fp:
             yield line
 
 
-def file_writer(path: str, mode: str = "w"):
+def yield_line_range(path: str, start: int, end: int = None, encoding: str = None):
     """
-    Opens a file and operates as a generator for writing files.
-    :param str path: The path of the file to write to.
-    :param str mode: The mode to open the file in. Defaults to "w".
-    :return: A generator for writing files.
+    Will open a file and read the lines starting within a byte range as a generator. A line cut by start belongs to the
+    range before it, so ranges that tile a file read every line exactly once. Lines end at "\n", and "\r\n" is
+    translated to "\n" as yield_lines() does.
+    :param str path: The path to the file to open.
+    :param int start: The byte offset of the range.
+    :param int end: The byte offset past the range. Defaults to the end of the file.
+    :param str encoding: The encoding to decode lines with. Defaults to the locale encoding.
+    :return: A generator of the lines in the range.
+    """
+    encoding = encoding or locale.getpreferredencoding(False)
+    with open(path, "rb") as fp:
+        position = start
+        if start > 0:
+            fp.seek(start - 1)
+            if fp.read(1) != b"\n":
+                position += len(fp.readline())
+
+        for line in fp:
+            if end is not None and position >= end:
+                break
+            position += len(line)
+            if line.endswith(b"\r\n"):
+                line = line[:-2] + b"\n"
+            yield line.decode(encoding)
+
+
+def read_full(fp, view: memoryview) -> int:
+    """
+    Read from a binary file until a buffer is full or the file is exhausted.
+    :param fp: The binary file to read.
+    :param memoryview view: The buffer to read into.
+    :return: The number of bytes read.
+    """
+    n = fp.readinto(view)
+    while n and n < len(view):
+        more = fp.readinto(view[n:])
+        if not more:
+            break
+        n += more
+    return n
+
+
+def yield_blocks(
+    path: str,
+    block_size: int = BLOCK_SIZE,
+    start: int = 0,
+    end: int = None,
+    reuse_buffer: bool = False,
+    compression: str = None,
+    threaded: bool = False,
+):
+    """
+    Will open a file and read blocks of bytes into buffers as a generator of memoryviews. Compressed files are read
+    decompressed and from the start.
+    :param str path: The path to the file to open.
+    :param int block_size: The number of bytes in a block. The final block may be shorter.
+    :param int start: The byte offset to start reading at.
+    :param int end: The byte offset to stop reading at. Defaults to the end of the file.
+    :param bool reuse_buffer: Read every block into the same buffer, which is overwritten once the next block is
+    requested, rather than a new one.
+    :param str compression: "auto" to detect, None for no compression, or one of "gzip", "bz2" or "xz".
+    :param bool threaded: Read and decompress the file ahead on a background thread.
+    :return: A generator of memoryviews of the blocks.
+    """
+    if compression is None and not threaded:
+        fp = open(path, "rb", buffering=0)
+    else:
+        fp = open_binary(path, compression, threaded, block_size)
+
+    with fp:
+        if start:
+            fp.seek(start)
+        remaining = None if end is None else end - start
+        buffer = bytearray(block_size)
+
+        while remaining is None or remaining > 0:
+            if not reuse_buffer:
+                buffer = bytearray(block_size)
+            view = memoryview(buffer)
+            if remaining is not None and remaining < block_size:
+                view = view[:remaining]
+
+            n = read_full(fp, view)
+            if not n:
+                break
+            if remaining is not None:
+                remaining -= n
+            yield view[:n]
+
+
+def yield_mmap(
+    path: str, block_size: int = BLOCK_SIZE, start: int = 0, end: int = None
+):
+    """
+    Will map a file into memory and slice it into blocks as a generator of memoryviews. No bytes are copied, and the
+    mapping is released once every view of it is.
+    :param str path: The path to the file to open.
+    :param int block_size: The number of bytes in a block. The final block may be shorter.
+    :param int start: The byte offset to start reading at.
+    :param int end: The byte offset to stop reading at. Defaults to the end of the file.
+    :return: A generator of memoryviews of the blocks.
+    """
+    with open(path, "rb") as fp:
+        size = os.fstat(fp.fileno()).st_size
+        if size == 0:
+            return
+        mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    view = memoryview(mapped)
+    stop = size if end is None else min(end, size)
+    for offset in range(start, stop, block_size):
+        yield view[offset : min(offset + block_size, stop)]
+
+
+def yield_records(
+    path: str,
+    record_size: int,
+    block_size: int = BLOCK_SIZE,
+    start: int = 0,
+    end: int = None,
+    compression: str = None,
+    threaded: bool = False,
+):
+    """
+    Will open a file and read fixed size records as a generator of memoryviews. Records are read in blocks of whole
+    records and sliced without copying. A trailing partial record is passed short.
+    :param str path: The path to the file to open.
+    :param int record_size: The number of bytes in a record.
+    :param int block_size: The approximate number of bytes read at once.
+    :param int start: The byte offset to start reading at.
+    :param int end: The byte offset to stop reading at. Defaults to the end of the file.
+    :param str compression: "auto" to detect, None for no compression, or one of "gzip", "bz2" or "xz".
+    :param bool threaded: Read and decompress the file ahead on a background thread.
+    :return: A generator of memoryviews of the records.
+    """
+    records_per_block = max(block_size // record_size, 1)
+    blocks = yield_blocks(
+        path,
+        records_per_block * record_size,
+        start,
+        end,
+        compression=compression,
+        threaded=threaded,
+    )
+    for block in blocks:
+        for offset in range(0, len(block), record_size):
+            yield block[offset : offset + record_size]
+
+
+def split_ranges(path: str, n: int) -> list:
+    """
+    Split a file into about n byte ranges that start at the start of a line, for readers working on one file in
+    parallel.
+    :param str path: The path to the file to split.
+    :param int n: The number of ranges to split into.
+    :return: A list of (start, end) byte offsets tiling the file. Fewer than n if the file has too few lines.
+    """
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as fp:
+        for i in range(1, n):
+            target = max(size * i // n, bounds[-1])
+            if target == 0:
+                continue
+            fp.seek(target - 1)
+            fp.readline()
+            position = fp.tell()
+            if bounds[-1] < position < size:
+                bounds.append(position)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def list_files(pattern) -> list:
     """
-    with open(path, mode) as fp:
+    List the files matched by a glob pattern, in a directory or given as paths.
+    :param pattern: A glob pattern, where ** matches any number of directories, a directory or an iterable of paths.
+    :return: A sorted list of file paths, or the paths in the order given.
+    """
+    if not isinstance(pattern, str):
+        return list(pattern)
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*")
+    return sorted(
+        path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path)
+    )
+
+
+def yield_files(
+    paths: list,
+    workers: int,
+    ordered: bool,
+    batch_size: int = BATCH_SIZE,
+    prefetch: int = 4,
+    compression: str = AUTO,
+):
+    """
+    Read the lines of many files on a pool of threads as a generator of Chunks of lines. At most prefetch Chunks per
+    file in flight are held, so files are read ahead only as fast as they are consumed.
+    :param list paths: The paths to the files to read.
+    :param int workers: The number of files read at once.
+    :param bool ordered: Pass the lines of each file in turn, in the order of paths, if True, else as they are read.
+    :param int batch_size: The number of lines in a Chunk.
+    :param int prefetch: The number of Chunks read ahead per file being read.
+    :param str compression: "auto" to detect, None for no compression, or one of "gzip", "bz2" or "xz".
+    :return: A generator of Chunks of lines.
+    """
+    stopped = threading.Event()
+
+    def put(batches: queue.Queue, batch) -> bool:
+        while not stopped.is_set():
+            try:
+                batches.put(batch, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read(path: str, batches: queue.Queue):
+        try:
+            for batch in stream_file(path, compression=compression).chunk(batch_size):
+                if not put(batches, batch):
+                    return
+        except Exception as e:  # pylint: disable=broad-except
+            put(batches, e)
+        put(batches, DONE)
+
+    def drain(batches: queue.Queue):
         while True:
-            content = yield
-            fp.write(content)
-            yield content
+            batch = batches.get()
+            if batch is DONE:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            yield batch
+
+    def work():
+        while True:
+            job = jobs.get()
+            if job is None or stopped.is_set():
+                return
+            read(*job)
+
+    # Daemon threads, as a partly consumed generator is only closed after non-daemon threads are joined at exit
+    jobs = queue.SimpleQueue()
+    threads = [
+        threading.Thread(target=work, name=f"PyStream-files-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        if not ordered:
+            shared = queue.Queue(prefetch * workers)
+            for path in paths:
+                jobs.put((path, shared))
+            for _ in paths:
+                yield from drain(shared)
+            return
 
+        # Keep the next files read ahead, each into its own queue
+        paths = iter(paths)
+        pending = deque()
+        for path in paths:
+            pending.append(queue.Queue(prefetch))
+            jobs.put((path, pending[-1]))
+            if len(pending) >= workers:
+                break
+        while pending:
+            yield from drain(pending.popleft())
+            path = next(paths, None)
+            if path is not None:
+                pending.append(queue.Queue(prefetch))
+                jobs.put((path, pending[-1]))
+    finally:
+        stopped.set()
+        for thread in threads:
+            jobs.put(None)
+        for thread in threads:
+            thread.join()
 
-def stream_file(path: str):
+
+async def ayield_files(
+    paths: list,
+    workers: int,
+    chunked: bool,
+    batch_size: int = BATCH_SIZE,
+    prefetch: int = 4,
+    compression: str = AUTO,
+):
+    """
+    Read the lines of many files on a pool of threads into a Confluence as an async generator, passed as they are
+    read. At most prefetch Chunks per worker are queued.
+    :param list paths: The paths to the files to read.
+    :param int workers: The number of files read at once.
+    :param bool chunked: Pass Chunks of lines rather than one line at a time.
+    :param int batch_size: The number of lines in a Chunk.
+    :param int prefetch: The number of Chunks queued per worker.
+    :param str compression: "auto" to detect, None for no compression, or one of "gzip", "bz2" or "xz".
+    :return: An async generator of lines or Chunks of lines.
+    """
+    loop = asyncio.get_running_loop()
+    pool = ThreadPoolExecutor(workers, thread_name_prefix="PyStream-files")
+    paths = iter(paths)
+
+    async def feed():
+        try:
+            for path in paths:
+                batches = iter(
+                    stream_file(path, compression=compression).chunk(batch_size)
+                )
+                while True:
+                    batch = await loop.run_in_executor(pool, next, batches, None)
+                    if batch is None:
+                        break
+                    yield batch
+        except Exception as e:  # pylint: disable=broad-except
+            # Hand the error to the consumer rather than leaving it in the feeding task
+            yield e
+
+    confluence = Confluence(maxsize=prefetch * workers)
+    tasks = [confluence.feed(feed()) for _ in range(workers)]
+    confluence.start()
+    try:
+        async for batch in confluence:
+            if isinstance(batch, Exception):
+                raise batch
+            if chunked:
+                yield batch
+            else:
+                for line in batch:
+                    yield line
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def stream_files(
+    pattern,
+    workers: int = 4,
+    ordered: bool = False,
+    asynchronous: bool = False,
+    chunked: bool = False,
+    batch_size: int = BATCH_SIZE,
+    prefetch: int = 4,
+    compression: str = AUTO,
+):
+    """
+    Open many files as a single Stream of their lines, reading several at once on a pool of threads. Reading is
+    bounded by prefetch, so it only runs ahead of the consumer by a few Chunks per file.
+    :param pattern: A glob pattern, where ** matches any number of directories, a directory or an iterable of paths.
+    :param int workers: The number of files read at once.
+    :param bool ordered: Pass the lines of each file in turn, in sorted order of path, if True, else interleave lines
+    as they are read. Not accepted by asynchronous.
+    :param bool asynchronous: Merge the files through a Confluence into a Riverbed rather than a Stream.
+    :param bool chunked: Pass Chunks of batch_size lines rather than one line at a time.
+    :param int batch_size: The number of lines read at once.
+    :param int prefetch: The number of Chunks read ahead per file being read.
+    :param str compression: "auto" to detect, None for no compression, or one of "gzip", "bz2" or "xz".
+    :return: A Stream, or Riverbed, of the lines of the files.
     """
-    Open a file as a Stream reading each line of the file.
+    paths = list_files(pattern)
+    if asynchronous:
+        if ordered:
+            raise ValueError("ordered is not supported by asynchronous.")
+        return Riverbed(
+            ayield_files(paths, workers, chunked, batch_size, prefetch, compression)
+        )
+
+    batches = yield_files(paths, workers, ordered, batch_size, prefetch, compression)
+    if chunked:
+        return Stream(batches)
+    return Stream(line for batch in batches for line in batch)
+
+
+def close_writer(fp, raw, fsync: bool):
+    """
+    Flush, sync and close a file opened by open_writer().
+    :param fp: The file written to.
+    :param raw: The underlying file on disk.
+    :param bool fsync: Sync the file to disk before closing it.
+    :return: None.
+    """
+    try:
+        if fp is not raw:
+            fp.close()
+        raw.flush()
+        if fsync:
+            os.fsync(raw.fileno())
+    finally:
+        raw.close()
+
+
+def yield_written(
+    items,
+    path: str,
+    mode: str = "w",
+    flush_size: int = FLUSH_SIZE,
+    flush_interval: float = None,
+    fsync: bool = True,
+    compression: str = AUTO,
+):
+    """
+    Will open a file and write each item, or the items of each Chunk, as a generator passing the items on. Writes are
+    gathered into a buffer written with one writelines() call. The file is flushed, synced and closed once the items
+    are exhausted.
+    :param items: The items to write.
+    :param str path: The path of the file to write to.
+    :param str mode: The mode to open the file in.
+    :param int flush_size: The number of items buffered before writing.
+    :param float flush_interval: The most seconds an item waits in the buffer, checked as items arrive.
+    :param bool fsync: Sync the file to disk before closing it.
+    :param str compression: "auto" to detect from the extension, None for no compression, or one of "gzip", "bz2" or
+    "xz".
+    :return: A generator of the items.
+    """
+    fp, raw = open_writer(path, mode, compression)
+    try:
+        yield from yield_buffered(items, fp.writelines, flush_size, flush_interval)
+    finally:
+        close_writer(fp, raw, fsync)
+
+
+async def ayield_written(
+    items,
+    path: str,
+    mode: str = "w",
+    flush_size: int = FLUSH_SIZE,
+    flush_interval: float = None,
+    fsync: bool = True,
+    compression: str = AUTO,
+):
+    """
+    Will open a file and write each item, or the items of each Chunk, as an async generator passing the items on.
+    Behaves as yield_written(), with the file opened, written, synced and closed on a thread so the event loop is not
+    blocked by the disk.
+    :param items: The async iterable of items to write.
+    :param str path: The path of the file to write to.
+    :param str mode: The mode to open the file in.
+    :param int flush_size: The number of items buffered before writing.
+    :param float flush_interval: The most seconds an item waits in the buffer, checked as items arrive.
+    :param bool fsync: Sync the file to disk before closing it.
+    :param str compression: "auto" to detect from the extension, None for no compression, or one of "gzip", "bz2" or
+    "xz".
+    :return: An async generator of the items.
+    """
+    loop = asyncio.get_running_loop()
+    fp, raw = await loop.run_in_executor(None, open_writer, path, mode, compression)
+
+    async def write(buffer: list):
+        await loop.run_in_executor(None, fp.writelines, buffer)
+
+    buffered = ayield_buffered(items, write, flush_size, flush_interval)
+    try:
+        async for item in buffered:
+            yield item
+    finally:
+        await buffered.aclose()
+        await loop.run_in_executor(None, close_writer, fp, raw, fsync)
+
+
+def stream_file(
+    path: str,
+    mode: str = LINES,
+    block_size: int = BLOCK_SIZE,
+    record_size: int = None,
+    start: int = 0,
+    end: int = None,
+    compression: str = AUTO,
+    threaded: bool = False,
+    reuse_buffer: bool = False,
+    encoding: str = None,
+):
+    """
+    Open a file as a Stream. Lines are passed as strings, while the binary modes pass memoryviews that can be sliced
+    or handed to bytes(), struct or numpy without copying. Files compressed with gzip, bz2 or xz are detected by their
+    extension or leading bytes and decompressed as they are read.
     :param str path: The path to the file to open.
-    :return: A Stream of the file lines.
+    :param str mode: "lines" to read each line, "blocks" to read blocks of block_size bytes, "mmap" to slice a memory
+    mapping of the file into blocks of block_size bytes or "records" to read records of record_size bytes.
+    :param int block_size: The number of bytes read at once by the binary modes.
+    :param int record_size: The number of bytes in a record. Required by records.
+    :param int start: The byte offset to start reading at. For lines, reading starts at the next full line.
+    :param int end: The byte offset to stop reading at. For lines, the last line read is the one containing end - 1.
+    Defaults to the end of the file.
+    :param str compression: "auto" to detect, None for no compression, or one of "gzip", "bz2" or "xz".
+    :param bool threaded: Read and decompress the file ahead on a background thread, overlapping it with the stages
+    consuming the Stream.
+    :param bool reuse_buffer: Read every block into the same buffer, which is overwritten once the next block is
+    requested, rather than a new one. Only used by blocks.
+    :param str encoding: The encoding to decode lines with. Defaults to the locale encoding. Only used by lines.
+    :return: A Stream of the file contents.
     """
-    return Stream(yield_lines(path))
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}.")
+    if mode == RECORDS and record_size is None:
+        raise ValueError("record_size is required by the records mode.")
+
+    if detect_compression(path, compression) is None:
+        compression = None
+    if compression is not None or threaded:
+        if start or end is not None or mode == MMAP:
+            raise ValueError(
+                "Byte ranges and mmap are not supported on compressed or threaded files."
+            )
+        if mode == LINES:
+            return Stream(yield_lines(path, compression, threaded, encoding))
+        if mode == BLOCKS:
+            return Stream(
+                yield_blocks(
+                    path,
+                    block_size,
+                    reuse_buffer=reuse_buffer,
+                    compression=compression,
+                    threaded=threaded,
+                )
+            )
+        return Stream(
+            yield_records(
+                path,
+                record_size,
+                block_size,
+                compression=compression,
+                threaded=threaded,
+            )
+        )
+
+    if mode == LINES:
+        if start or end is not None:
+            return Stream(yield_line_range(path, start, end, encoding))
+        return Stream(yield_lines(path, encoding=encoding))
+    if mode == BLOCKS:
+        return Stream(yield_blocks(path, block_size, start, end, reuse_buffer))
+    if mode == MMAP:
+        return Stream(yield_mmap(path, block_size, start, end))
+    return Stream(yield_records(path, record_size, block_size, start, end))
 
 
-def pipe_file(path: str, mode: str = "w"):
+def pipe_file(
+    path: str,
+    mode: str = "w",
+    flush_size: int = FLUSH_SIZE,
+    flush_interval: float = None,
+    fsync: bool = True,
+    compression: str = AUTO,
+):
     """
-    Opens a pipe to write a file.
+    Opens a pipe to write a file. Items, or the items of Chunks, are written in batches of flush_size and passed on
+    unchanged. The file is opened when a Stream or Riverbed is fed through the Pipe, and is flushed, synced and closed
+    once it is exhausted, as by drain(). Paths ending in .gz, .bz2 or .xz are compressed.
     :param str path: The path of the file to write to.
     :param str mode: The mode to open the file in. Defaults to "w".
+    :param int flush_size: The number of items buffered before writing.
+    :param float flush_interval: The most seconds an item waits in the buffer, checked as items arrive. Defaults to
+    waiting for flush_size items.
+    :param bool fsync: Sync the file to disk before closing it.
+    :param str compression: "auto" to compress by the extension of path, None for no compression, or one of "gzip",
+    "bz2" or "xz".
     :return: A Pipe for writing to a file.
     """
-    writer = file_writer(path, mode)
-    next(writer)
 
-    def run_writer(content: str):
+    def write(items):
         """
-        Helper function to properly run the file_write() generator.
-        :param str content: The content to pass to the writer.
-        :return: The content writen by the file_write() generator.
+        Helper function to write the items of a Stream or Riverbed.
+        :param items: The iterator, or async iterator, of the items.
+        :return: A Stream or Riverbed of the written items.
         """
-        writer.send(content)
-        return next(writer)
+        if hasattr(items, "__aiter__"):
+            return Riverbed(
+                ayield_written(
+                    items, path, mode, flush_size, flush_interval, fsync, compression
+                )
+            )
+        return Stream(
+            yield_written(
+                items, path, mode, flush_size, flush_interval, fsync, compression
+            )
+        )
 
-    return Pipe().through(run_writer)
+    return Pipe().flat_map(write)
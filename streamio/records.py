@@ -0,0 +1,244 @@
+import csv
+import json
+from itertools import islice
+from operator import itemgetter
+
+from modules.chunk import Chunk
+from stream import Stream
+from streamio.compression import AUTO
+from streamio.file import stream_file
+
+# The default number of lines parsed at once.
+BATCH_SIZE = 1024
+
+# Parses one JSON value starting at an index of a string, returning it and the index past it.
+SCAN = json.JSONDecoder().scan_once
+
+
+def projector(fields):
+    """
+    Create a function selecting fields of a record as a tuple.
+    :param fields: The keys, or indices, of the fields to select.
+    :return: A function of a record returning a tuple of the fields.
+    """
+    if len(fields) == 1:
+        field = fields[0]
+        return lambda record: (record[field],)
+    return itemgetter(*fields)
+
+
+def project_present(project, records):
+    """
+    Select fields of the records holding every field, skipping the rest.
+    :param project: A function of a record returning a tuple of the fields.
+    :param records: The records to select from.
+    :return: A generator of tuples.
+    """
+    for record in records:
+        try:
+            yield project(record)
+        except (KeyError, IndexError, TypeError):
+            continue
+
+
+def tolerant_rows(rows):
+    """
+    Pass the rows of a csv.reader, skipping rows it fails to parse.
+    :param rows: A csv.reader.
+    :return: A generator of rows.
+    """
+    while True:
+        try:
+            yield next(rows)
+        except StopIteration:
+            return
+        except csv.Error:
+            continue
+
+
+def iter_with(first, rows):
+    """
+    Pass an item followed by the rest of an iterator.
+    :param first: The first item.
+    :param rows: The rest of the items.
+    :return: A generator of the items.
+    """
+    yield first
+    yield from rows
+
+
+def parse_json_lines(lines: list, skip_malformed: bool) -> list:
+    """
+    Parse a batch of JSON lines. Each line is parsed on its own by the C scanner of the json module, skipping the
+    per-call overhead of json.loads(), which only handles the lines the scanner does not parse whole. Blank lines are
+    skipped.
+    :param list lines: The lines to parse.
+    :param bool skip_malformed: Skip lines that are not valid JSON rather than raising.
+    :return: A list of the parsed values.
+    """
+    values = []
+    append = values.append
+    for line in lines:
+        try:
+            value, end = SCAN(line, 0)
+            if end == len(line) or line[end:].isspace():
+                append(value)
+                continue
+        except (StopIteration, ValueError):
+            pass
+
+        # Leading whitespace, blank lines and malformed lines
+        if not line.strip():
+            continue
+        try:
+            append(json.loads(line))
+        except ValueError:
+            if not skip_malformed:
+                raise
+    return values
+
+
+def yield_json_batches(
+    lines, fields, batch_size: int = BATCH_SIZE, skip_malformed: bool = False
+):
+    """
+    Parse lines of JSON in batches as a generator of Chunks of records.
+    :param lines: The lines to parse.
+    :param fields: The keys of the fields to select from each record as a tuple, or None to keep whole records.
+    :param int batch_size: The number of lines parsed at once.
+    :param bool skip_malformed: Skip malformed lines, and records missing a field, rather than raising.
+    :return: A generator of Chunks of records.
+    """
+    project = None if fields is None else projector(fields)
+    lines = iter(lines)
+
+    while True:
+        batch = list(islice(lines, batch_size))
+        if not batch:
+            return
+
+        records = parse_json_lines(batch, skip_malformed)
+        if project is not None:
+            try:
+                records = list(map(project, records))
+            except (KeyError, IndexError, TypeError):
+                if not skip_malformed:
+                    raise
+                records = list(project_present(project, records))
+        if records:
+            yield Chunk.from_iterable(records)
+
+
+def yield_csv_batches(
+    lines,
+    fields,
+    header: bool = True,
+    batch_size: int = BATCH_SIZE,
+    skip_malformed: bool = False,
+    **fmtparams,
+):
+    """
+    Parse lines of CSV in batches as a generator of Chunks of records. Rows are split by a single csv.reader so quoted
+    fields may span lines.
+    :param lines: The lines to parse.
+    :param fields: The names, or indices without a header, of the fields to select from each row, or None to keep
+    whole rows.
+    :param bool header: Take the first row as the names of the fields.
+    :param int batch_size: The number of rows parsed at once.
+    :param bool skip_malformed: Skip rows with a different number of fields than the first row, or that the csv module
+    cannot parse, rather than raising.
+    :param fmtparams: Formatting parameters of csv.reader, such as delimiter or quotechar.
+    :return: A generator of Chunks of tuples.
+    """
+    rows = csv.reader(lines, **fmtparams)
+    if skip_malformed:
+        rows = tolerant_rows(rows)
+    # Blank lines are read as empty rows, which are skipped as csv.DictReader does
+    rows = filter(None, rows)
+
+    first = next(rows, None)
+    if first is None:
+        return
+    width = len(first)
+    if header:
+        names = first
+        if fields is not None:
+            fields = [names.index(field) for field in fields]
+    else:
+        rows = iter_with(first, rows)
+
+    project = tuple if fields is None else projector(fields)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+
+        if skip_malformed:
+            batch = [row for row in batch if len(row) == width]
+        elif any(len(row) != width for row in batch):
+            raise ValueError(f"CSV rows must have {width} fields.")
+        if batch:
+            yield Chunk.from_iterable(map(project, batch))
+
+
+def stream_jsonl(
+    path: str,
+    fields=None,
+    chunked: bool = False,
+    batch_size: int = BATCH_SIZE,
+    skip_malformed: bool = False,
+    compression: str = AUTO,
+    threaded: bool = False,
+) -> Stream:
+    """
+    Open a file of JSON lines as a Stream of records. Lines are parsed batch_size at a time by the C scanner of the
+    json module.
+    :param str path: The path to the file to open.
+    :param fields: The keys of the fields to select from each record as a tuple. Defaults to whole records.
+    :param bool chunked: Pass Chunks of up to batch_size records rather than one record at a time.
+    :param int batch_size: The number of lines parsed at once.
+    :param bool skip_malformed: Skip malformed lines, and records missing a field, rather than raising.
+    :param str compression: "auto" to detect, None for no compression, or one of "gzip", "bz2" or "xz".
+    :param bool threaded: Read and decompress the file ahead on a background thread.
+    :return: A Stream of records.
+    """
+    lines = stream_file(path, compression=compression, threaded=threaded)
+    batches = yield_json_batches(lines, fields, batch_size, skip_malformed)
+    if chunked:
+        return Stream(batches)
+    return Stream(record for batch in batches for record in batch)
+
+
+def stream_csv(
+    path: str,
+    fields=None,
+    header: bool = True,
+    chunked: bool = False,
+    batch_size: int = BATCH_SIZE,
+    skip_malformed: bool = False,
+    compression: str = AUTO,
+    threaded: bool = False,
+    **fmtparams,
+) -> Stream:
+    """
+    Open a CSV file as a Stream of tuples, one per row after the header. Rows are parsed batch_size at a time.
+    :param str path: The path to the file to open.
+    :param fields: The names, or indices without a header, of the fields to select from each row. Defaults to whole
+    rows.
+    :param bool header: Take the first row as the names of the fields rather than a record.
+    :param bool chunked: Pass Chunks of up to batch_size rows rather than one row at a time.
+    :param int batch_size: The number of rows parsed at once.
+    :param bool skip_malformed: Skip rows with a different number of fields than the first row, or that the csv module
+    cannot parse, rather than raising.
+    :param str compression: "auto" to detect, None for no compression, or one of "gzip", "bz2" or "xz".
+    :param bool threaded: Read and decompress the file ahead on a background thread.
+    :param fmtparams: Formatting parameters of csv.reader, such as delimiter or quotechar.
+    :return: A Stream of tuples.
+    """
+    lines = stream_file(path, compression=compression, threaded=threaded)
+    batches = yield_csv_batches(
+        lines, fields, header, batch_size, skip_malformed, **fmtparams
+    )
+    if chunked:
+        return Stream(batches)
+    return Stream(record for batch in batches for record in batch)
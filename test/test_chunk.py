@@ -1,6 +1,12 @@
+import pickle
 import unittest
 
-from stream import Chunk
+from stream import Chunk, NumericChunk
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 TEST_VALUES = range(100)
 TEST_FUNCTION = lambda x: x * -1
@@ -25,6 +31,11 @@ class TestChunk(unittest.TestCase):
         c = Chunk(*TEST_VALUES)
         self.assertEqual(c[TEST_INDEX], list(TEST_VALUES)[TEST_INDEX])
 
+    def test_from_iterable(self):
+        c = Chunk.from_iterable(iter(TEST_VALUES))
+        self.assertTrue(isinstance(c, Chunk))
+        self.assertEqual(c, tuple(TEST_VALUES))
+
     def test_map(self):
         c = Chunk(*TEST_VALUES)
         c = c.map(TEST_FUNCTION)
@@ -37,6 +48,68 @@ class TestChunk(unittest.TestCase):
         for t1, t2 in zip(c, TEST_VALUES):
             self.assertEqual(t1, TEST_FUNCTION(TEST_FUNCTION(t2)))
 
+    def test_pickle(self):
+        c = Chunk(*TEST_VALUES)
+        self.assertEqual(pickle.loads(pickle.dumps(c)), c)
+
+    def test_map_vectorized(self):
+        c = Chunk(*TEST_VALUES)
+        c = c.map(lambda xs: [TEST_FUNCTION(x) for x in xs], vectorized=True)
+        self.assertEqual(c, tuple(map(TEST_FUNCTION, TEST_VALUES)))
+
+
+class TestNumericChunk(unittest.TestCase):
+    def test_init(self):
+        c = NumericChunk(TEST_VALUES)
+        self.assertEqual(len(c), len(TEST_VALUES))
+        self.assertEqual(c.dtype, "d")
+
+    def test_indexing(self):
+        c = NumericChunk(TEST_VALUES)
+        self.assertEqual(c[TEST_INDEX], list(TEST_VALUES)[TEST_INDEX])
+        self.assertEqual(c[:TEST_INDEX], list(TEST_VALUES)[:TEST_INDEX])
+
+    def test_map(self):
+        c = NumericChunk(TEST_VALUES, "l").map(TEST_FUNCTION)
+        self.assertEqual(c, tuple(map(TEST_FUNCTION, TEST_VALUES)))
+        self.assertEqual(c.dtype, "l")
+
+    def test_map_vectorized(self):
+        c = NumericChunk(TEST_VALUES).map(lambda xs: xs[::-1], vectorized=True)
+        self.assertEqual(c, list(TEST_VALUES)[::-1])
+
+    def test_map_widens(self):
+        c = NumericChunk(TEST_VALUES, "l").map(lambda x: x / 2)
+        self.assertEqual(c, [t / 2 for t in TEST_VALUES])
+        self.assertEqual(c.dtype, "d")
+
+    def test_map_not_numeric(self):
+        c = NumericChunk(TEST_VALUES, "l").map(str)
+        self.assertTrue(isinstance(c, Chunk))
+        self.assertEqual(c, tuple(map(str, TEST_VALUES)))
+
+    def test_map_vectorized_list(self):
+        c = NumericChunk(TEST_VALUES, "l").map(lambda xs: [x / 2 for x in xs], True)
+        self.assertEqual(c, [t / 2 for t in TEST_VALUES])
+
+    def test_pickle(self):
+        c = NumericChunk(TEST_VALUES)
+        self.assertEqual(pickle.loads(pickle.dumps(c)), c)
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_numpy(self):
+        c = NumericChunk.from_iterable(TEST_VALUES, "float64", use_numpy=True)
+        c = c.map(numpy.negative, vectorized=True)
+        self.assertTrue(isinstance(c.data, numpy.ndarray))
+        self.assertEqual(c, tuple(map(TEST_FUNCTION, TEST_VALUES)))
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_numpy_vectorized_list(self):
+        c = NumericChunk.from_iterable(TEST_VALUES, "int64", use_numpy=True)
+        c = c.map(lambda xs: [x / 2 for x in xs], vectorized=True)
+        self.assertEqual(c.dtype.kind, "f")
+        self.assertEqual(c, [t / 2 for t in TEST_VALUES])
+
 
 if __name__ == "__main__":
     unittest.main()
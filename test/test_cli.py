@@ -0,0 +1,73 @@
+import asyncio
+import contextlib
+import io
+import unittest
+
+from stream import Stream
+from streamio.cli import pipe_print, pipe_stderr, pipe_stdout, stream_stdin
+
+TEST_VALUES = list(range(100))
+N_TO_TAKE = 2
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.content = "".join(f"{t}\n" for t in TEST_VALUES).encode()
+
+    def test_stdin_lines(self):
+        s = stream_stdin(block_size=7, buffer=io.BytesIO(self.content))
+        self.assertEqual(s.to_list(), list(map(str, TEST_VALUES)))
+
+    def test_stdin_lines_unterminated(self):
+        s = stream_stdin(block_size=7, buffer=io.BytesIO(self.content + b"tail"))
+        self.assertEqual(s.to_list(), list(map(str, TEST_VALUES)) + ["tail"])
+
+    def test_stdin_lines_crlf(self):
+        content = self.content.replace(b"\n", b"\r\n") + b"tail\r"
+        s = stream_stdin(block_size=7, buffer=io.BytesIO(content))
+        self.assertEqual(s.to_list(), list(map(str, TEST_VALUES)) + ["tail"])
+
+    def test_stdin_long_line(self):
+        line = "x" * 1000
+        s = stream_stdin(block_size=7, buffer=io.BytesIO(f"{line}\n{line}".encode()))
+        self.assertEqual(s.to_list(), [line, line])
+
+    def test_stdin_lines_chunked(self):
+        s = stream_stdin(block_size=64, chunked=True, buffer=io.BytesIO(self.content))
+        chunks = s.to_list()
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(sum(chunks, ()), tuple(map(str, TEST_VALUES)))
+
+    def test_stdin_bytes(self):
+        s = stream_stdin(mode="bytes", block_size=7, buffer=io.BytesIO(self.content))
+        self.assertEqual(b"".join(s), self.content)
+
+    def test_print(self):
+        out = io.StringIO()
+        s = Stream(*TEST_VALUES).chunk(N_TO_TAKE).through(pipe_print(out, flush_size=7))
+        s.drain()
+        self.assertEqual(out.getvalue(), self.content.decode())
+
+    def test_print_riverbed(self):
+        out = io.StringIO()
+        r = pipe_print(out, end=",")(*TEST_VALUES, asynchronous=True)
+        self.assertEqual(asyncio.run(r.take(len(TEST_VALUES) + 1)), TEST_VALUES)
+        self.assertEqual(out.getvalue(), "".join(f"{t}," for t in TEST_VALUES))
+
+    def test_stdout_redirected(self):
+        p = pipe_stdout(flush_size=7)
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            p(*TEST_VALUES).drain()
+        self.assertEqual(out.getvalue(), self.content.decode())
+
+    def test_stderr_redirected(self):
+        p = pipe_stderr()
+        out = io.StringIO()
+        with contextlib.redirect_stderr(out):
+            asyncio.run(p(*TEST_VALUES, asynchronous=True).take(len(TEST_VALUES)))
+        self.assertEqual(out.getvalue(), self.content.decode())
+
+
+if __name__ == "__main__":
+    unittest.main()
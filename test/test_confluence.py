@@ -0,0 +1,156 @@
+import asyncio
+import unittest
+
+from stream import Confluence, Riverbed
+
+TEST_VALUES = list(range(100))
+MAXSIZE = 10
+
+
+async def collect(confluence: Confluence, delay: float = 0.0) -> list:
+    """
+    Start a Confluence and collect its items, optionally letting the feeds run first.
+    """
+    await asyncio.sleep(delay)
+    confluence.start()
+    return [item async for item in confluence]
+
+
+class TestConfluence(unittest.TestCase):
+    def test_feed(self):
+        async def run():
+            c = Confluence()
+            c.feed(TEST_VALUES)
+            c.feed(TEST_VALUES)
+            return await collect(c)
+
+        self.assertEqual(sorted(asyncio.run(run())), sorted(TEST_VALUES * 2))
+
+    def test_none_items(self):
+        async def run():
+            c = Confluence()
+            c.feed([None, 1])
+            return await collect(c)
+
+        self.assertEqual(asyncio.run(run()), [None, 1])
+
+    def test_block(self):
+        async def run():
+            c = Confluence(maxsize=MAXSIZE)
+            c.feed(TEST_VALUES)
+            return await collect(c, 0.01), c.metrics
+
+        values, metrics = asyncio.run(run())
+        self.assertEqual(values, TEST_VALUES)
+        self.assertEqual(metrics["max_depth"], MAXSIZE)
+        self.assertGreater(metrics["producer_waits"], 0)
+
+    def test_drop_newest(self):
+        async def run():
+            c = Confluence(maxsize=MAXSIZE, overflow="drop-newest")
+            c.feed(TEST_VALUES)
+            return await collect(c, 0.01), c.metrics
+
+        values, metrics = asyncio.run(run())
+        self.assertEqual(values, TEST_VALUES[:MAXSIZE])
+        self.assertEqual(metrics["dropped"], len(TEST_VALUES) - MAXSIZE)
+
+    def test_drop_oldest(self):
+        async def run():
+            c = Confluence(maxsize=MAXSIZE, overflow="drop-oldest")
+            c.feed(TEST_VALUES)
+            return await collect(c, 0.01)
+
+        self.assertEqual(asyncio.run(run()), TEST_VALUES[-MAXSIZE:])
+
+    def test_spill(self):
+        async def run():
+            c = Confluence(maxsize=MAXSIZE, overflow="spill")
+            c.feed(TEST_VALUES)
+            return await collect(c, 0.01), c.metrics
+
+        values, metrics = asyncio.run(run())
+        self.assertEqual(values, TEST_VALUES)
+        self.assertEqual(metrics["spilled"], len(TEST_VALUES) - MAXSIZE)
+        self.assertEqual(metrics["spill_depth"], 0)
+
+    def test_batched(self):
+        async def run():
+            c = Confluence(batch_size=MAXSIZE)
+            c.feed(TEST_VALUES)
+            c.feed(Riverbed(TEST_VALUES))
+            return await collect(c)
+
+        self.assertEqual(sorted(asyncio.run(run())), sorted(TEST_VALUES * 2))
+
+    def test_batched_order(self):
+        async def run():
+            c = Confluence(maxsize=MAXSIZE, batch_size=MAXSIZE // 2 + 1)
+            c.feed(TEST_VALUES)
+            return await collect(c)
+
+        self.assertEqual(asyncio.run(run()), TEST_VALUES)
+
+    def test_batched_spill(self):
+        async def run():
+            c = Confluence(maxsize=MAXSIZE, overflow="spill", batch_size=MAXSIZE - 1)
+            c.feed(TEST_VALUES)
+            return await collect(c, 0.01)
+
+        self.assertEqual(asyncio.run(run()), TEST_VALUES)
+
+    def test_batched_block(self):
+        async def run():
+            c = Confluence(maxsize=MAXSIZE, batch_size=MAXSIZE * 3)
+            c.feed(TEST_VALUES)
+            c.feed(TEST_VALUES)
+            return await collect(c, 0.01), c.metrics
+
+        values, metrics = asyncio.run(run())
+        self.assertEqual(sorted(values), sorted(TEST_VALUES * 2))
+        self.assertEqual(metrics["max_depth"], MAXSIZE)
+
+    def test_max_latency(self):
+        async def slow_feed():
+            yield TEST_VALUES[0]
+            await asyncio.sleep(1)
+            yield TEST_VALUES[1]
+
+        async def run():
+            c = Confluence(batch_size=MAXSIZE, max_latency=0.01)
+            c.feed(slow_feed())
+            c.start()
+            return await asyncio.wait_for(c.__anext__(), 0.5)
+
+        self.assertEqual(asyncio.run(run()), TEST_VALUES[0])
+
+    def test_batched_block_max_latency(self):
+        async def bursty_feed():
+            for i in range(0, len(TEST_VALUES), MAXSIZE):
+                for item in TEST_VALUES[i : i + MAXSIZE]:
+                    yield item
+                await asyncio.sleep(0.003)
+
+        async def run():
+            c = Confluence(
+                maxsize=MAXSIZE // 2, batch_size=MAXSIZE * 5, max_latency=0.005
+            )
+            c.feed(bursty_feed())
+            # The consumer starts late, so flushes block on the full queue
+            return await collect(c, 0.01)
+
+        self.assertEqual(asyncio.run(run()), TEST_VALUES)
+
+    def test_invalid_overflow(self):
+        with self.assertRaises(ValueError):
+            Confluence(maxsize=MAXSIZE, overflow="explode")
+
+    def test_invalid_watermarks(self):
+        with self.assertRaises(ValueError):
+            Confluence(maxsize=MAXSIZE, high_watermark=MAXSIZE + 1)
+        with self.assertRaises(ValueError):
+            Confluence(maxsize=MAXSIZE, low_watermark=MAXSIZE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,206 @@
+import asyncio
+import bz2
+import gzip
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from stream import Stream
+from streamio.file import pipe_file, split_ranges, stream_file, stream_files
+
+TEST_VALUES = list(range(100))
+N_TO_TAKE = 2
+
+
+class TestFile(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as fp:
+            fp.writelines(f"{t}\n" for t in TEST_VALUES)
+        with open(self.path, "rb") as fp:
+            self.content = fp.read()
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_lines(self):
+        s = stream_file(self.path)
+        self.assertEqual(s.to_list(), [f"{t}\n" for t in TEST_VALUES])
+
+    def test_blocks(self):
+        s = stream_file(self.path, mode="blocks", block_size=7)
+        blocks = s.to_list()
+        self.assertTrue(all(len(b) == 7 for b in blocks[:-1]))
+        self.assertEqual(b"".join(blocks), self.content)
+
+    def test_blocks_reuse_buffer(self):
+        s = stream_file(self.path, mode="blocks", block_size=7, reuse_buffer=True)
+        blocks = [bytes(b) for b in s]
+        self.assertEqual(b"".join(blocks), self.content)
+
+    def test_mmap(self):
+        s = stream_file(self.path, mode="mmap", block_size=7, start=3, end=50)
+        self.assertEqual(b"".join(s.to_list()), self.content[3:50])
+
+    def test_records(self):
+        s = stream_file(self.path, mode="records", record_size=3, block_size=8)
+        records = [bytes(r) for r in s]
+        self.assertEqual(records[:N_TO_TAKE], [b"0\n1", b"\n2\n"])
+        self.assertEqual(b"".join(records), self.content)
+
+    def test_records_size_required(self):
+        with self.assertRaises(ValueError):
+            stream_file(self.path, mode="records")
+
+    def test_split_ranges(self):
+        ranges = split_ranges(self.path, 7)
+        self.assertEqual(len(ranges), 7)
+        lines = []
+        for start, end in ranges:
+            self.assertTrue(start == 0 or self.content[start - 1 : start] == b"\n")
+            lines.extend(stream_file(self.path, start=start, end=end))
+        self.assertEqual(lines, [f"{t}\n" for t in TEST_VALUES])
+
+    def test_line_range_unaligned(self):
+        lines = []
+        for start in range(0, len(self.content), 11):
+            lines.extend(stream_file(self.path, start=start, end=start + 11))
+        self.assertEqual(lines, [f"{t}\n" for t in TEST_VALUES])
+
+    def test_line_range_crlf(self):
+        with open(self.path, "wb") as fp:
+            fp.writelines(f"{t}\r\n".encode() for t in TEST_VALUES)
+        whole = stream_file(self.path).to_list()
+        ranged = stream_file(self.path, start=0, end=os.path.getsize(self.path))
+        self.assertEqual(ranged.to_list(), whole)
+        self.assertEqual(whole, [f"{t}\n" for t in TEST_VALUES])
+
+    def test_pipe_file(self):
+        lines = [f"{t}\n" for t in TEST_VALUES]
+        s = Stream(*lines).through(pipe_file(self.path, flush_size=7))
+        self.assertEqual(s.to_list(), lines)
+        with open(self.path) as fp:
+            self.assertEqual(fp.read(), "".join(lines))
+
+    def test_pipe_file_chunks(self):
+        lines = [f"{t}\n" for t in TEST_VALUES]
+        Stream(*lines).chunk(N_TO_TAKE * 3).through(
+            pipe_file(self.path, mode="a")
+        ).drain()
+        with open(self.path, "rb") as fp:
+            self.assertEqual(fp.read(), self.content * 2)
+
+    def test_pipe_file_riverbed(self):
+        lines = [f"{t}\n" for t in TEST_VALUES]
+        r = pipe_file(self.path, flush_interval=0)(*lines, asynchronous=True)
+        self.assertEqual(asyncio.run(r.take(len(lines) + 1)), lines)
+        with open(self.path) as fp:
+            self.assertEqual(fp.read(), "".join(lines))
+
+    def test_compressed(self):
+        lines = [f"{t}\n" for t in TEST_VALUES]
+        for extension in (".gz", ".bz2", ".xz"):
+            path = self.path + extension
+            try:
+                Stream(*lines).through(pipe_file(path)).drain()
+                self.assertEqual(stream_file(path).to_list(), lines)
+                self.assertEqual(stream_file(path, threaded=True).to_list(), lines)
+            finally:
+                os.remove(path)
+
+    def test_compressed_detected(self):
+        with gzip.open(self.path, "wb") as fp:
+            fp.write(self.content)
+        s = stream_file(
+            self.path, mode="records", record_size=3, block_size=8, threaded=True
+        )
+        self.assertEqual(b"".join(bytes(r) for r in s), self.content)
+
+    def test_magic_bytes_plain(self):
+        with open(self.path, "w") as fp:
+            fp.write("BZh is not bzip2\n")
+        self.assertEqual(stream_file(self.path).to_list(), ["BZh is not bzip2\n"])
+
+    def test_magic_bytes_bz2(self):
+        with bz2.open(self.path, "wb") as fp:
+            fp.write(self.content)
+        s = stream_file(self.path, mode="blocks", block_size=7)
+        self.assertEqual(b"".join(s), self.content)
+
+    def test_compressed_range(self):
+        path = self.path + ".gz"
+        try:
+            with gzip.open(path, "wb") as fp:
+                fp.write(self.content)
+            with self.assertRaises(ValueError):
+                stream_file(path, start=N_TO_TAKE)
+        finally:
+            os.remove(path)
+
+    def write_shards(self, directory: str, n: int) -> list:
+        lines = []
+        for i in range(n):
+            shard = [f"{i}:{t}\n" for t in TEST_VALUES]
+            extension = ".gz" if i % 2 else ".log"
+            Stream(*shard).through(
+                pipe_file(os.path.join(directory, f"{i:02}{extension}"))
+            ).drain()
+            lines.extend(shard)
+        return lines
+
+    def test_stream_files_ordered(self):
+        with tempfile.TemporaryDirectory() as directory:
+            lines = self.write_shards(directory, 10)
+            s = stream_files(
+                directory, workers=3, ordered=True, batch_size=7, prefetch=1
+            )
+            self.assertEqual(s.to_list(), lines)
+
+    def test_stream_files_unordered(self):
+        with tempfile.TemporaryDirectory() as directory:
+            lines = self.write_shards(directory, 10)
+            s = stream_files(
+                os.path.join(directory, "*"), workers=3, chunked=True, batch_size=7
+            )
+            chunks = s.to_list()
+            self.assertTrue(all(len(c) <= 7 for c in chunks))
+            self.assertEqual(sorted(sum(chunks, ())), sorted(lines))
+
+    def test_stream_files_asynchronous(self):
+        with tempfile.TemporaryDirectory() as directory:
+            lines = self.write_shards(directory, 10)
+            r = stream_files(directory, workers=3, asynchronous=True, batch_size=7)
+            self.assertEqual(sorted(asyncio.run(r.take(len(lines) + 1))), sorted(lines))
+
+    def test_stream_files_missing(self):
+        s = stream_files([self.path, self.path + ".missing"], ordered=True)
+        with self.assertRaises(FileNotFoundError):
+            s.to_list()
+
+    def test_stream_files_asynchronous_missing(self):
+        paths = [self.path, self.path + ".missing"]
+        r = stream_files(paths, workers=2, asynchronous=True)
+        with self.assertRaises(FileNotFoundError):
+            asyncio.run(r.take(len(TEST_VALUES) + 1))
+
+    def test_stream_files_partly_consumed_at_exit(self):
+        script = (
+            "import sys\n"
+            "from streamio.file import stream_files\n"
+            "s = stream_files(sys.argv[1], workers=2, batch_size=2, prefetch=1)\n"
+            "s.take(3)\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=root)
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_shards(directory, 4)
+            result = subprocess.run(
+                [sys.executable, "-c", script, directory], env=env, timeout=10
+            )
+        self.assertEqual(result.returncode, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
+import asyncio
 import unittest
 
-from stream import Pipe, Riverbed, Stream
+from stream import CachedAction, Pipe, PipelineMetrics, Riverbed, Stream
 
 TEST_VALUES = range(100)
 TEST_FUNCTION = lambda x: x * 2
@@ -92,6 +93,134 @@ class TestPipe(unittest.TestCase):
                 t2 = TEST_FUNCTION(TEST_FUNCTION(t2))
             self.assertEqual(t1, t2)
 
+    def test_stages(self):
+        p = Pipe().through(TEST_FUNCTION).filter(TEST_FILTER)
+        self.assertEqual([stage.operation for stage in p.stages], ["through", "filter"])
+        self.assertEqual(p.stages[0].args, (TEST_FUNCTION,))
+
+    def test_immutable(self):
+        p = Pipe().through(TEST_FUNCTION)
+        p.filter(TEST_FILTER)
+        self.assertEqual(len(p.stages), 1)
+
+    def test_call_twice(self):
+        p = Pipe().through(TEST_FUNCTION)
+        self.assertEqual(p(*TEST_VALUES).to_list(), p(*TEST_VALUES).to_list())
+
+    def test_long_pipe(self):
+        p = Pipe()
+        for _ in range(5000):
+            p = p.through(lambda x: x + 1)
+        self.assertEqual(p(*TEST_VALUES).take(N_TO_TAKE), [5000, 5001])
+
+    def test_par_through(self):
+        p = Pipe().par_through(str, workers=2, chunksize=7)
+        s = Stream(*TEST_VALUES).through(p)
+        self.assertEqual(s.to_list(), list(map(str, TEST_VALUES)))
+
+    def test_chunking_riverbed(self):
+        p = Pipe().chunk(N_TO_TAKE, max_wait=1)
+        r = p(*TEST_VALUES, asynchronous=True)
+        chunks = asyncio.run(r.take(1))
+        self.assertEqual(chunks[0], tuple(TEST_VALUES[:N_TO_TAKE]))
+
+    def test_fork_by(self):
+        p = Pipe().fork_by(TEST_FILTER, {True: Pipe().through(TEST_FUNCTION)})
+        s = Stream(*TEST_VALUES).through(p)
+        for t1, t2 in zip(s, TEST_VALUES):
+            self.assertEqual(t1, TEST_FUNCTION(t2) if TEST_FILTER(t2) else t2)
+
+    def test_window(self):
+        p = Pipe().window(N_TO_TAKE, aggregate="sum")
+        s = Stream(*TEST_VALUES).through(p)
+        self.assertEqual(s.take(1), [sum(TEST_VALUES[:N_TO_TAKE])])
+
+    def test_reduce_by_key(self):
+        p = Pipe().reduce_by_key(TEST_FILTER, lambda a, b: a + b)
+        s = Stream(*TEST_VALUES).through(p)
+        self.assertEqual(dict(s.to_list()), {True: 2450, False: 2500})
+
+    def test_sorted(self):
+        p = Pipe().sorted(key=lambda x: -x, memory_limit=256)
+        s = Stream(*TEST_VALUES).through(p)
+        self.assertEqual(s.take(N_TO_TAKE), list(reversed(TEST_VALUES))[:N_TO_TAKE])
+
+    def test_top_k(self):
+        p = Pipe().top_k(N_TO_TAKE)
+        s = Stream(*TEST_VALUES).through(p)
+        self.assertEqual(s.to_list(), sorted(TEST_VALUES, reverse=True)[:N_TO_TAKE])
+
+    def test_sample_riverbed(self):
+        p = Pipe().sample(N_TO_TAKE, seed=0, snapshot_every=N_TO_TAKE)
+        r = p(*TEST_VALUES, asynchronous=True)
+        self.assertEqual(asyncio.run(r.take(1)), [tuple(TEST_VALUES[:N_TO_TAKE])])
+
+    def test_distinct(self):
+        p = Pipe().distinct(mode="bloom", capacity=len(TEST_VALUES), error_rate=1e-6)
+        s = Stream(*TEST_VALUES, *TEST_VALUES).through(p)
+        self.assertEqual(s.to_list(), list(TEST_VALUES))
+
+    def test_through_cached(self):
+        cached = CachedAction(TEST_FUNCTION, key=TEST_FILTER)
+        p = Pipe().through_cached(cached)
+        s = Stream(*TEST_VALUES).through(p)
+        self.assertEqual(s.to_list(), [TEST_FUNCTION(t % 2) for t in TEST_VALUES])
+        self.assertEqual(cached.metrics()["misses"], 2)
+
+    def test_through_cached_shared(self):
+        p = Pipe().through_cached(TEST_FUNCTION)
+        self.assertEqual(
+            p(*TEST_VALUES).to_list(), list(map(TEST_FUNCTION, TEST_VALUES))
+        )
+        self.assertEqual(
+            p(*TEST_VALUES).to_list(), list(map(TEST_FUNCTION, TEST_VALUES))
+        )
+        metrics = p.stages[-1].args[0].metrics()
+        self.assertEqual((metrics["hits"], metrics["misses"]), (len(TEST_VALUES),) * 2)
+
+    def test_dam_cached_shared(self):
+        async def action(x):
+            return TEST_FUNCTION(x)
+
+        p = Pipe().dam_cached(action, concurrency=N_TO_TAKE)
+        for _ in range(2):
+            r = p(*TEST_VALUES, asynchronous=True)
+            values = asyncio.run(r.take(len(TEST_VALUES)))
+            self.assertEqual(values, list(map(TEST_FUNCTION, TEST_VALUES)))
+        metrics = p.stages[-1].args[0].metrics()
+        self.assertEqual((metrics["hits"], metrics["misses"]), (len(TEST_VALUES),) * 2)
+
+    def test_instrument(self):
+        metrics = PipelineMetrics()
+        p = Pipe().through(TEST_FUNCTION).filter(TEST_FILTER).instrument(metrics)
+        results = Stream(*TEST_VALUES).through(p).to_list()
+        self.assertEqual(
+            results, list(filter(TEST_FILTER, map(TEST_FUNCTION, TEST_VALUES)))
+        )
+        snapshot = metrics.snapshot()
+        self.assertEqual(list(snapshot), ["source", "0:through", "1:filter"])
+        self.assertEqual(snapshot["1:filter"]["items_in"], len(TEST_VALUES))
+        self.assertEqual(snapshot["1:filter"]["items_out"], len(results))
+        self.assertLessEqual(snapshot["1:filter"]["p50"], snapshot["1:filter"]["p99"])
+
+    def test_instrument_dam(self):
+        async def sleep(x):
+            await asyncio.sleep(0.01)
+            return x
+
+        metrics = PipelineMetrics()
+        p = Pipe().dam(sleep, concurrency=N_TO_TAKE).instrument(metrics)
+        r = p(*TEST_VALUES[:N_TO_TAKE], asynchronous=True)
+        self.assertEqual(asyncio.run(r.take(N_TO_TAKE)), list(TEST_VALUES[:N_TO_TAKE]))
+        self.assertGreaterEqual(metrics.snapshot()["0:dam"]["await_time"], 0.02)
+
+    def test_instrument_off(self):
+        metrics = PipelineMetrics()
+        p = Pipe().through(TEST_FUNCTION)
+        p.instrument(metrics)
+        Stream(*TEST_VALUES).through(p).drain()
+        self.assertEqual(metrics.snapshot(), {})
+
 
 if __name__ == "__main__":
     unittest.main()
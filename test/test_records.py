@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+import unittest
+
+from streamio.records import stream_csv, stream_jsonl
+
+TEST_VALUES = list(range(100))
+N_TO_TAKE = 2
+
+
+class TestRecords(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.records = [
+            {"id": t, "name": f"n{t}", "even": t % 2 == 0} for t in TEST_VALUES
+        ]
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write(self, lines):
+        with open(self.path, "w") as fp:
+            fp.writelines(f"{line}\n" for line in lines)
+
+    def test_jsonl(self):
+        self.write(map(json.dumps, self.records))
+        s = stream_jsonl(self.path, batch_size=7)
+        self.assertEqual(s.to_list(), self.records)
+
+    def test_jsonl_fields(self):
+        self.write(map(json.dumps, self.records))
+        s = stream_jsonl(self.path, fields=["name", "id"], chunked=True, batch_size=7)
+        chunks = s.to_list()
+        self.assertEqual(chunks[0], tuple((f"n{t}", t) for t in TEST_VALUES[:7]))
+        self.assertEqual(sum(chunks, ()), tuple((f"n{t}", t) for t in TEST_VALUES))
+
+    def test_jsonl_malformed(self):
+        lines = list(map(json.dumps, self.records))
+        lines[3] = "{broken"
+        lines[5] = ""
+        lines[8] = '{"id": 8}'
+        self.write(lines)
+        with self.assertRaises(ValueError):
+            stream_jsonl(self.path).to_list()
+
+        s = stream_jsonl(
+            self.path, fields=["id", "name"], skip_malformed=True, batch_size=7
+        )
+        self.assertEqual(
+            [t for t, _ in s], [t for t in TEST_VALUES if t not in (3, 5, 8)]
+        )
+
+    def test_jsonl_multiple_values(self):
+        lines = list(map(json.dumps, self.records[:N_TO_TAKE]))
+        self.write([lines[0] + ", " + lines[1], "{broken"])
+        s = stream_jsonl(self.path, skip_malformed=True)
+        self.assertEqual(s.to_list(), [])
+
+    def test_jsonl_split_values(self):
+        self.write(["[1", "2],[3]"])
+        with self.assertRaises(ValueError):
+            stream_jsonl(self.path).to_list()
+        self.assertEqual(stream_jsonl(self.path, skip_malformed=True).to_list(), [])
+
+    def test_csv(self):
+        self.write(["id,name"] + [f'{t},"n {t}"' for t in TEST_VALUES])
+        s = stream_csv(self.path, batch_size=7)
+        self.assertEqual(s.to_list(), [(str(t), f"n {t}") for t in TEST_VALUES])
+
+    def test_csv_fields(self):
+        self.write(["id,name,even"] + [f"{t},n{t},{t % 2 == 0}" for t in TEST_VALUES])
+        s = stream_csv(self.path, fields=["even"], chunked=True)
+        self.assertEqual(s.to_list()[0][:N_TO_TAKE], (("True",), ("False",)))
+
+    def test_csv_blank_lines(self):
+        self.write(["", "id,name", "1,a", "", "2,b", ""])
+        s = stream_csv(self.path)
+        self.assertEqual(s.to_list(), [("1", "a"), ("2", "b")])
+
+    def test_csv_malformed(self):
+        self.write(["id,name", "0,a", "1", "2,b,c", '3,"multi', 'line"'])
+        with self.assertRaises(ValueError):
+            stream_csv(self.path).to_list()
+
+        s = stream_csv(self.path, header=False, skip_malformed=True)
+        self.assertEqual(
+            s.to_list(), [("id", "name"), ("0", "a"), ("3", "multi\nline")]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
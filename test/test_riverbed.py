@@ -1,6 +1,7 @@
+import asyncio
 import unittest
 
-from stream import Riverbed
+from stream import AsyncCachedAction, CachedAction, PipelineMetrics, Riverbed
 
 TEST_VALUES = list(range(100))
 TEST_FUNCTION = lambda x: x * 2
@@ -78,6 +79,234 @@ class TestRiverbed(unittest.TestCase):
                 t2 = TEST_FUNCTION(TEST_FUNCTION(t2))
             self.assertEqual(t1, t2)
 
+    def test_through_threaded(self):
+        r = Riverbed(TEST_VALUES).through_threaded(TEST_FUNCTION, max_workers=4)
+        values = asyncio.run(r.take(len(TEST_VALUES)))
+        self.assertEqual(values, list(map(TEST_FUNCTION, TEST_VALUES)))
+
+    def test_through_threaded_unordered(self):
+        r = Riverbed(TEST_VALUES).through_threaded(
+            TEST_FUNCTION, max_workers=4, ordered=False
+        )
+        values = asyncio.run(r.take(len(TEST_VALUES)))
+        self.assertEqual(sorted(values), list(map(TEST_FUNCTION, TEST_VALUES)))
+
+    def test_yield_every(self):
+        r = Riverbed(TEST_VALUES, yield_every=N_TO_TAKE + 1)
+        values = asyncio.run(r.take(len(TEST_VALUES)))
+        self.assertEqual(values, TEST_VALUES)
+
+    def test_meter(self):
+        r = Riverbed(TEST_VALUES).meter(0.0001)
+        values = asyncio.run(r.take(N_TO_TAKE))
+        self.assertEqual(values, TEST_VALUES[:N_TO_TAKE])
+
+    def test_chunking_values(self):
+        r = Riverbed(TEST_VALUES).chunk(N_TO_TAKE)
+        chunks = asyncio.run(r.take(len(TEST_VALUES)))
+        self.assertEqual(chunks[0], tuple(TEST_VALUES[:N_TO_TAKE]))
+        self.assertEqual(sum(chunks, ()), tuple(TEST_VALUES))
+
+    def test_chunking_max_wait(self):
+        async def slow_source():
+            for t in TEST_VALUES[:N_TO_TAKE]:
+                yield t
+            await asyncio.sleep(1)
+            yield TEST_VALUES[N_TO_TAKE]
+
+        async def run():
+            r = Riverbed(slow_source()).chunk(N_TO_TAKE + 1, max_wait=0.01)
+            return await asyncio.wait_for(r.__anext__(), 0.5)
+
+        self.assertEqual(asyncio.run(run()), tuple(TEST_VALUES[:N_TO_TAKE]))
+
+    def test_map_on_chunk(self):
+        r = Riverbed(TEST_VALUES).chunk(N_TO_TAKE).through_map_on_chunk(TEST_FUNCTION)
+        chunks = asyncio.run(r.take(1))
+        self.assertEqual(chunks[0], tuple(map(TEST_FUNCTION, TEST_VALUES[:N_TO_TAKE])))
+
+    def test_fork_else(self):
+        r = Riverbed(TEST_VALUES).fork(TEST_FILTER, TEST_FUNCTION, lambda x: -x)
+        values = asyncio.run(r.take(len(TEST_VALUES)))
+        for t1, t2 in zip(values, TEST_VALUES):
+            self.assertEqual(t1, TEST_FUNCTION(t2) if TEST_FILTER(t2) else -t2)
+
+    def test_fork_by(self):
+        r = Riverbed(TEST_VALUES).fork_by(TEST_FILTER, {True: TEST_FUNCTION})
+        values = asyncio.run(r.take(len(TEST_VALUES)))
+        for t1, t2 in zip(values, TEST_VALUES):
+            self.assertEqual(t1, TEST_FUNCTION(t2) if TEST_FILTER(t2) else t2)
+
+    def test_dam(self):
+        async def action(x):
+            return TEST_FUNCTION(x)
+
+        r = Riverbed(TEST_VALUES).dam(action)
+        values = asyncio.run(r.take(len(TEST_VALUES)))
+        self.assertEqual(values, list(map(TEST_FUNCTION, TEST_VALUES)))
+
+    def test_dam_concurrency(self):
+        active = []
+        peak = []
+
+        async def action(x):
+            active.append(x)
+            peak.append(len(active))
+            await asyncio.sleep(0.001 * (1 + x % 3))
+            active.remove(x)
+            return x
+
+        r = Riverbed(TEST_VALUES).dam(action, concurrency=N_TO_TAKE * 4)
+        values = asyncio.run(r.take(len(TEST_VALUES)))
+        self.assertEqual(values, TEST_VALUES)
+        self.assertEqual(max(peak), N_TO_TAKE * 4)
+
+    def test_dam_unordered(self):
+        async def action(x):
+            await asyncio.sleep(0.001 * (1 + x % 3))
+            return x
+
+        r = Riverbed(TEST_VALUES).dam(action, concurrency=N_TO_TAKE * 4, ordered=False)
+        values = asyncio.run(r.take(len(TEST_VALUES)))
+        self.assertEqual(sorted(values), TEST_VALUES)
+
+    def test_dam_slow_source(self):
+        emitted = []
+
+        async def source():
+            for x in TEST_VALUES[:10]:
+                await asyncio.sleep(0.01)
+                emitted.append(x)
+                yield x
+
+        async def action(x):
+            return x
+
+        async def run(r):
+            emitted.clear()
+            return [(x, len(emitted)) async for x in r]
+
+        # Each result is yielded before the next item arrives, without waiting for concurrency items
+        expected = [(x, x + 1) for x in TEST_VALUES[:10]]
+        for ordered in (True, False):
+            r = Riverbed(source()).dam(
+                action, concurrency=N_TO_TAKE * 4, ordered=ordered
+            )
+            self.assertEqual(asyncio.run(run(r)), expected)
+        r = Riverbed(source()).through_threaded(TEST_FUNCTION, max_workers=4)
+        self.assertEqual(
+            asyncio.run(run(r)), [(TEST_FUNCTION(x), n) for x, n in expected]
+        )
+
+    def test_window_time(self):
+        r = Riverbed(TEST_VALUES).window_time(1, aggregate="sum")
+        self.assertEqual(asyncio.run(r.take(len(TEST_VALUES))), [sum(TEST_VALUES)])
+
+    def test_window_time_gaps(self):
+        async def bursts():
+            for t in TEST_VALUES[:6]:
+                yield t
+                if t % 3 == 2:
+                    await asyncio.sleep(0.1)
+
+        r = Riverbed(bursts()).window_time(0.05)
+        windows = asyncio.run(r.take(len(TEST_VALUES)))
+        self.assertEqual(windows, [tuple(TEST_VALUES[:3]), tuple(TEST_VALUES[3:6])])
+
+    def test_reduce_by_key(self):
+        r = Riverbed(TEST_VALUES).reduce_by_key(
+            lambda x: x % 7, lambda a, b: a + b, max_keys=3
+        )
+        totals = {}
+        for k, v in asyncio.run(r.take(len(TEST_VALUES))):
+            totals[k] = totals.get(k, 0) + v
+        self.assertEqual(
+            totals, {k: sum(t for t in TEST_VALUES if t % 7 == k) for k in range(7)}
+        )
+
+    def test_reduce_by_key_flush_interval(self):
+        async def bursts():
+            for t in TEST_VALUES[:6]:
+                yield t
+                if t == 2:
+                    await asyncio.sleep(0.2)
+
+        r = Riverbed(bursts()).reduce_by_key(
+            TEST_FILTER, lambda a, b: a + b, flush_interval=0.15
+        )
+        pairs = asyncio.run(r.take(len(TEST_VALUES)))
+        self.assertEqual(pairs, [(False, 1), (True, 2), (True, 4), (False, 8)])
+
+    def test_group_by(self):
+        r = Riverbed(TEST_VALUES).group_by(TEST_FILTER, flush_every=N_TO_TAKE)
+        groups = asyncio.run(r.take(1))
+        self.assertEqual(groups, [(True, (TEST_VALUES[0],))])
+
+    def test_top_k(self):
+        r = Riverbed(TEST_VALUES).top_k(N_TO_TAKE, snapshot_every=len(TEST_VALUES) // 2)
+        snapshots = asyncio.run(r.take(len(TEST_VALUES)))
+        half = len(TEST_VALUES) // 2
+        self.assertEqual(
+            snapshots,
+            [
+                tuple(TEST_VALUES[half - N_TO_TAKE : half][::-1]),
+                tuple(TEST_VALUES[-N_TO_TAKE:][::-1]),
+                tuple(TEST_VALUES[-N_TO_TAKE:][::-1]),
+            ],
+        )
+
+    def test_approx_distinct(self):
+        r = Riverbed(TEST_VALUES).approx_distinct(snapshot_every=N_TO_TAKE)
+        snapshots = asyncio.run(r.take(len(TEST_VALUES)))
+        self.assertEqual(snapshots[0], N_TO_TAKE)
+        self.assertAlmostEqual(
+            snapshots[-1], len(TEST_VALUES), delta=len(TEST_VALUES) * 0.05
+        )
+
+    def test_distinct(self):
+        r = Riverbed(TEST_VALUES * 2).distinct(key=lambda x: x % 10)
+        self.assertEqual(asyncio.run(r.take(len(TEST_VALUES))), TEST_VALUES[:10])
+
+    def test_through_cached(self):
+        cached = CachedAction(TEST_FUNCTION)
+        r = Riverbed(TEST_VALUES * 2).through_cached(cached)
+        self.assertEqual(
+            asyncio.run(r.take(len(TEST_VALUES) * 2)),
+            list(map(TEST_FUNCTION, TEST_VALUES)) * 2,
+        )
+        self.assertEqual(cached.metrics()["hits"], len(TEST_VALUES))
+
+    def test_dam_cached_coalesced(self):
+        calls = []
+
+        async def lookup(x):
+            calls.append(x)
+            await asyncio.sleep(0.01)
+            return TEST_FUNCTION(x)
+
+        cached = AsyncCachedAction(lookup, key=lambda x: x % 5)
+        r = Riverbed(TEST_VALUES[:20]).dam_cached(cached, concurrency=10)
+        results = asyncio.run(r.take(20))
+        self.assertEqual(results, [TEST_FUNCTION(t % 5) for t in TEST_VALUES[:20]])
+        self.assertEqual(calls, TEST_VALUES[:5])
+        metrics = cached.metrics()
+        self.assertEqual(metrics["misses"], 5)
+        self.assertEqual(metrics["hits"] + metrics["coalesced"], 15)
+        self.assertEqual(metrics["in_flight"], 0)
+
+    def test_metered(self):
+        metrics = PipelineMetrics()
+        r = (
+            Riverbed(TEST_VALUES[:N_TO_TAKE])
+            .metered(metrics, "source")
+            .meter(0.01)
+            .metered(metrics, "meter")
+        )
+        self.assertEqual(asyncio.run(r.take(N_TO_TAKE)), TEST_VALUES[:N_TO_TAKE])
+        snapshot = metrics.snapshot()["meter"]
+        self.assertEqual(snapshot["items_out"], N_TO_TAKE)
+        self.assertGreaterEqual(snapshot["time"], 0.01 * N_TO_TAKE)
+
 
 if __name__ == "__main__":
     unittest.main()
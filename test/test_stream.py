@@ -1,7 +1,9 @@
+import time
 import unittest
 from typing import Iterator
+from unittest import mock
 
-from stream import Stream
+from stream import CachedAction, PipelineMetrics, Spring, Stream
 
 TEST_VALUES = list(range(100))
 TEST_FUNCTION = lambda x: x * 2
@@ -95,6 +97,26 @@ class TestStream(unittest.TestCase):
             next(s), tuple(map(TEST_FUNCTION, TEST_VALUES[N_TO_TAKE : N_TO_TAKE * 2]))
         )
 
+    def test_chunking_tail(self):
+        chunks = Stream(*TEST_VALUES).chunk(N_TO_TAKE * 3).to_list()
+        self.assertEqual(sum(chunks, ()), tuple(TEST_VALUES))
+        self.assertTrue(all(chunks))
+
+    def test_chunking_no_empty_tail(self):
+        chunks = Stream(*TEST_VALUES).chunk(N_TO_TAKE).to_list()
+        self.assertEqual(len(chunks), len(TEST_VALUES) // N_TO_TAKE)
+
+    def test_numeric_chunking(self):
+        s = Stream(*TEST_VALUES).chunk(N_TO_TAKE, dtype="d")
+        c = next(s)
+        self.assertEqual(c, tuple(TEST_VALUES[:N_TO_TAKE]))
+        self.assertEqual(c.dtype, "d")
+
+    def test_map_on_numeric_chunk(self):
+        s = Stream(*TEST_VALUES).chunk(N_TO_TAKE, dtype="l")
+        s = s.through_map_on_chunk(TEST_FUNCTION)
+        self.assertEqual(next(s), tuple(map(TEST_FUNCTION, TEST_VALUES[:N_TO_TAKE])))
+
     def test_to_list(self):
         s = Stream(*TEST_VALUES)
         self.assertEqual(s.to_list(), list(TEST_VALUES))
@@ -122,6 +144,255 @@ class TestStream(unittest.TestCase):
                 t2 = TEST_FUNCTION(TEST_FUNCTION(t2))
             self.assertEqual(t1, t2)
 
+    def test_fused_chain(self):
+        s = Stream(*TEST_VALUES)
+        s = (
+            s.through(TEST_FUNCTION)
+            .filter(TEST_FILTER)
+            .fork(TEST_FILTER, TEST_FUNCTION)
+        )
+        expected = [TEST_FUNCTION(TEST_FUNCTION(t)) for t in TEST_VALUES]
+        self.assertEqual(s.to_list(), expected)
+
+    def test_fused_long_chain(self):
+        s = Stream(*TEST_VALUES)
+        for _ in range(50):
+            s = s.through(lambda x: x + 1)
+        self.assertEqual(s.to_list(), [t + 50 for t in TEST_VALUES])
+
+    def test_to_list_after_take(self):
+        s = Stream(*TEST_VALUES).through(TEST_FUNCTION)
+        s.take(N_TO_TAKE)
+        self.assertEqual(s.to_list(), list(map(TEST_FUNCTION, TEST_VALUES[N_TO_TAKE:])))
+
+    def test_shared_source(self):
+        s = Stream(iter(TEST_VALUES))
+        child = s.through(TEST_FUNCTION)
+        next(s)
+        self.assertEqual(next(child), TEST_FUNCTION(TEST_VALUES[1]))
+
+    def test_drain(self):
+        seen = []
+        Stream(*TEST_VALUES).through(seen.append).drain()
+        self.assertEqual(seen, TEST_VALUES)
+
+    def test_par_through(self):
+        s = Stream(*TEST_VALUES).par_through(str, workers=2, chunksize=7)
+        self.assertEqual(s.to_list(), list(map(str, TEST_VALUES)))
+
+    def test_par_through_unordered(self):
+        s = Stream(*TEST_VALUES).par_through(str, workers=2, ordered=False, chunksize=7)
+        self.assertEqual(sorted(s.to_list()), sorted(map(str, TEST_VALUES)))
+
+    def test_par_through_infinite(self):
+        s = Spring(TEST_VALUES).par_through(str, workers=2, chunksize=7)
+        self.assertEqual(s.take(len(TEST_VALUES) * 2), list(map(str, TEST_VALUES * 2)))
+
+    def test_through_threaded(self):
+        s = Stream(*TEST_VALUES).through_threaded(TEST_FUNCTION, max_workers=4)
+        self.assertEqual(s.to_list(), list(map(TEST_FUNCTION, TEST_VALUES)))
+
+    def test_through_threaded_unordered(self):
+        s = Stream(*TEST_VALUES).through_threaded(
+            TEST_FUNCTION, max_workers=4, ordered=False
+        )
+        self.assertEqual(sorted(s.to_list()), list(map(TEST_FUNCTION, TEST_VALUES)))
+
+    def test_fork_by(self):
+        branches = {k: (lambda x, k=k: x * k) for k in range(25)}
+        s = Stream(*TEST_VALUES).fork_by(lambda x: x % 30, branches)
+        for t1, t2 in zip(s, TEST_VALUES):
+            self.assertEqual(t1, t2 * (t2 % 30) if t2 % 30 < 25 else t2)
+
+    def test_fork_by_default(self):
+        s = Stream(*TEST_VALUES).fork_by(
+            TEST_FILTER, {True: TEST_FUNCTION}, default=lambda x: -x
+        )
+        for t1, t2 in zip(s, TEST_VALUES):
+            self.assertEqual(t1, TEST_FUNCTION(t2) if TEST_FILTER(t2) else -t2)
+
+    def test_window_sliding(self):
+        s = Stream(*TEST_VALUES).window(5, 1)
+        expected = [tuple(TEST_VALUES[i : i + 5]) for i in range(len(TEST_VALUES) - 4)]
+        self.assertEqual(s.to_list(), expected)
+
+    def test_window_aggregates(self):
+        windows = [TEST_VALUES[i : i + 7] for i in range(0, len(TEST_VALUES) - 6, 3)]
+        for aggregate, expected in [
+            ("sum", sum),
+            ("min", min),
+            ("max", max),
+            ("mean", lambda w: sum(w) / len(w)),
+        ]:
+            s = Stream(*TEST_VALUES).window(7, 3, aggregate=aggregate)
+            self.assertEqual(s.to_list(), list(map(expected, windows)))
+
+    def test_window_combiner(self):
+        s = Stream(*map(str, TEST_VALUES)).window(7, 3, aggregate=lambda a, b: a + b)
+        windows = [TEST_VALUES[i : i + 7] for i in range(0, len(TEST_VALUES) - 6, 3)]
+        self.assertEqual(s.to_list(), ["".join(map(str, w)) for w in windows])
+
+    def test_window_tumbling(self):
+        s = Stream(*TEST_VALUES).window(N_TO_TAKE * 3)
+        chunks = s.to_list()
+        self.assertEqual(sum(chunks, ()), tuple(TEST_VALUES))
+        self.assertEqual(len(chunks[-1]), len(TEST_VALUES) % (N_TO_TAKE * 3))
+
+    def test_window_hopping(self):
+        s = Stream(*TEST_VALUES).window(3, 10, aggregate="count")
+        self.assertEqual(s.to_list(), [3] * 10)
+
+    def test_window_unknown_aggregate(self):
+        with self.assertRaises(ValueError):
+            Stream(*TEST_VALUES).window(3, aggregate="median").to_list()
+
+    def test_reduce_by_key(self):
+        s = Stream(*TEST_VALUES).reduce_by_key(lambda x: x % 7, lambda a, b: a + b)
+        expected = {k: sum(t for t in TEST_VALUES if t % 7 == k) for k in range(7)}
+        self.assertEqual(dict(s.to_list()), expected)
+
+    def test_reduce_by_key_bounded(self):
+        s = Stream(*TEST_VALUES).reduce_by_key(
+            lambda x: x % 7, lambda a, b: a + b, flush_every=10, max_keys=3
+        )
+        totals = {}
+        for k, v in s:
+            totals[k] = totals.get(k, 0) + v
+        self.assertEqual(
+            totals, {k: sum(t for t in TEST_VALUES if t % 7 == k) for k in range(7)}
+        )
+
+    def test_group_by(self):
+        s = Stream(*TEST_VALUES).group_by(TEST_FILTER)
+        self.assertEqual(
+            s.to_list(),
+            [
+                (True, tuple(filter(TEST_FILTER, TEST_VALUES))),
+                (False, tuple(t for t in TEST_VALUES if not TEST_FILTER(t))),
+            ],
+        )
+
+    def test_sorted(self):
+        s = Stream(*reversed(TEST_VALUES)).sorted()
+        self.assertEqual(s.to_list(), TEST_VALUES)
+
+    def test_sorted_spilled(self):
+        values = [(t * 37) % 101 for t in TEST_VALUES]
+        s = Stream(*values).sorted(reverse=True, memory_limit=256)
+        self.assertEqual(s.to_list(), sorted(values, reverse=True))
+
+    def test_sorted_stable(self):
+        s = Stream(*TEST_VALUES).sorted(key=lambda x: x % 3, memory_limit=256)
+        self.assertEqual(s.to_list(), sorted(TEST_VALUES, key=lambda x: x % 3))
+
+    def test_top_k(self):
+        s = Stream(*TEST_VALUES).top_k(N_TO_TAKE * 3, key=lambda x: x % 10)
+        self.assertEqual(s.to_list(), [9, 19, 29, 39, 49, 59])
+
+    def test_sample(self):
+        s = Stream(*TEST_VALUES).sample(N_TO_TAKE * 5, seed=0)
+        sample = s.to_list()
+        self.assertEqual(len(sample), N_TO_TAKE * 5)
+        self.assertEqual(len(set(sample)), len(sample))
+        self.assertTrue(set(sample) <= set(TEST_VALUES))
+
+    def test_sample_short(self):
+        s = Stream(*TEST_VALUES).sample(len(TEST_VALUES) * 2)
+        self.assertEqual(s.to_list(), TEST_VALUES)
+
+    def test_approx_distinct(self):
+        s = Stream(*(TEST_VALUES * 3)).approx_distinct()
+        self.assertAlmostEqual(
+            s.to_list()[0], len(TEST_VALUES), delta=len(TEST_VALUES) * 0.05
+        )
+
+    def test_distinct(self):
+        s = Stream(*(TEST_VALUES * 2)).distinct()
+        self.assertEqual(s.to_list(), TEST_VALUES)
+
+    def test_distinct_key(self):
+        s = Stream(*TEST_VALUES).distinct(key=TEST_FILTER)
+        self.assertEqual(s.to_list(), TEST_VALUES[:2])
+
+    def test_distinct_capacity(self):
+        s = Stream(1, 2, 1, 3, 2, 1).distinct(capacity=2)
+        self.assertEqual(s.to_list(), [1, 2, 3, 2, 1])
+
+    def test_distinct_default_capacity(self):
+        with mock.patch("modules.utilities.cacheTools.CAPACITY", 2):
+            s = Stream(1, 2, 1, 3, 2, 1).distinct()
+        self.assertEqual(s.to_list(), [1, 2, 3, 2, 1])
+
+    def test_distinct_ttl(self):
+        def slow():
+            yield from TEST_VALUES[:N_TO_TAKE]
+            time.sleep(0.05)
+            yield from TEST_VALUES[:N_TO_TAKE]
+
+        s = Stream(slow()).distinct(ttl=0.01)
+        self.assertEqual(s.to_list(), TEST_VALUES[:N_TO_TAKE] * 2)
+
+    def test_distinct_bloom(self):
+        s = Stream(*(TEST_VALUES * 2)).distinct(
+            mode="bloom", capacity=len(TEST_VALUES), error_rate=1e-6
+        )
+        self.assertEqual(s.to_list(), TEST_VALUES)
+
+    def test_distinct_bloom_ttl(self):
+        with self.assertRaises(ValueError):
+            Stream(*TEST_VALUES).distinct(mode="bloom", ttl=1)
+
+    def test_through_cached(self):
+        cached = CachedAction(TEST_FUNCTION, key=lambda x: x % 10)
+        s = Stream(*TEST_VALUES).through_cached(cached)
+        self.assertEqual(s.to_list(), [TEST_FUNCTION(t % 10) for t in TEST_VALUES])
+        self.assertEqual(cached.metrics(), {"hits": 90, "misses": 10, "size": 10})
+
+    def test_through_cached_shared(self):
+        cached = CachedAction(TEST_FUNCTION)
+        s = Stream(*TEST_VALUES).through_cached(cached).through_cached(cached)
+        self.assertEqual(
+            s.to_list(), [TEST_FUNCTION(TEST_FUNCTION(t)) for t in TEST_VALUES]
+        )
+        self.assertEqual(
+            cached.metrics()["misses"],
+            len(set(TEST_VALUES + [TEST_FUNCTION(t) for t in TEST_VALUES])),
+        )
+
+    def test_through_cached_maxsize(self):
+        calls = []
+        s = Stream(1, 2, 1, 3, 1, 2).through_cached(
+            lambda x: calls.append(x) or x, maxsize=2
+        )
+        self.assertEqual(s.to_list(), [1, 2, 1, 3, 1, 2])
+        self.assertEqual(calls, [1, 2, 3, 2])
+
+    def test_metered(self):
+        reports = []
+        metrics = PipelineMetrics(callback=reports.append, interval=0)
+        s = (
+            Stream(*TEST_VALUES)
+            .metered(metrics, "source")
+            .through(lambda x: time.sleep(0.001) or x)
+            .metered(metrics, "sleep")
+        )
+        self.assertEqual(s.to_list(), TEST_VALUES)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["sleep"]["items_in"], len(TEST_VALUES))
+        self.assertEqual(snapshot["sleep"]["items_out"], len(TEST_VALUES))
+        self.assertGreaterEqual(snapshot["sleep"]["p50"], 0.001)
+        self.assertLess(snapshot["source"]["time"], snapshot["sleep"]["time"])
+        self.assertEqual(len(reports), 2 * len(TEST_VALUES))
+
+    def test_metered_shared(self):
+        metrics = PipelineMetrics()
+        Stream(*TEST_VALUES).metered(metrics, "a").metered(metrics, "b").drain()
+        Stream(*TEST_VALUES[:N_TO_TAKE]).metered(metrics, "c").drain()
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["b"]["items_in"], len(TEST_VALUES))
+        self.assertIsNone(snapshot["c"]["items_in"])
+        self.assertEqual(snapshot["c"]["items_out"], N_TO_TAKE)
+
 
 if __name__ == "__main__":
     unittest.main()